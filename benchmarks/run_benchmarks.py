@@ -0,0 +1,377 @@
+### ECE143 Final Project Group 4
+### Waymo E2E Driving Analysis - Pipeline Benchmarks
+
+# Times every stage of the pipeline on synthetic shards and writes the results
+# (throughput, per-item latency percentiles, peak RSS) to JSON:
+#
+#   python -m benchmarks.run_benchmarks --records 2000 --image-size 1920x1280 --output bench.json
+#   python -m benchmarks.run_benchmarks --compare bench.json      # new run vs. a previous one
+#   python -m benchmarks.run_benchmarks --frames-per-segment 20   # sliding windows, see analyze_incremental
+#   python -m benchmarks.run_benchmarks --data-dir bench_shards/  # keep the generated shards
+#
+# Run from the repository root. Stages that need an optional dependency
+# (the Waymo protos for full parsing and the event figure) are reported as skipped.
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from benchmarks.synthetic_data import write_synthetic_shards
+from data.fast_parse import parse_kinematics
+from data.incremental_analysis import IncrementalAnalyzer
+from data.ingestion import ingest_shards
+from data.metrics_table import MetricsTable
+from data.scenario_classification import (analyze_driving_behavior, analyze_driving_behavior_batch,
+                                          classify_scenario, classify_scenarios, stack_past_states)
+from data.tfrecord import iter_records
+from src.streaming_stats import ScoreSummary, TopKEvents
+
+try:
+    import resource
+except ImportError:
+    # Windows: no getrusage, peak RSS is not reported
+    resource = None
+
+PERCENTILES = [50, 90, 99]
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process so far (MB), or None if unavailable.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS bytes
+    return peak / (1024.0 ** 2) if sys.platform == 'darwin' else peak / 1024.0
+
+def summarize_latencies(latencies, num_bytes=None, num_items=None):
+    """
+    Throughput and latency percentiles of one stage.
+
+    :param latencies: Per-call durations in seconds (one entry for a single batch call)
+    :param num_bytes: Bytes processed by the stage, for bytes/s
+    :param num_items: Frames/records processed by the stage (defaults to one per call);
+                      pass it for batch stages so items_per_s stays comparable to the per-frame ones
+    :return: dict with 'count' (items), 'calls', 'total_s', 'items_per_s', 'latency_ms' (per call)
+             (+ 'mb_per_s', 'peak_rss_mb')
+    """
+    latencies = np.asarray(latencies, dtype=np.float64)
+    total = float(latencies.sum())
+    num_items = len(latencies) if num_items is None else num_items
+    result = {
+        'count': int(num_items),
+        'calls': int(len(latencies)),
+        'total_s': total,
+        'items_per_s': num_items / total if total > 0 else None,
+        'latency_ms': {f"p{p}": float(np.percentile(latencies, p) * 1e3) for p in PERCENTILES},
+    }
+    result['latency_ms']['max'] = float(latencies.max() * 1e3)
+    if num_bytes is not None:
+        result['mb_per_s'] = num_bytes / total / 1e6 if total > 0 else None
+    result['peak_rss_mb'] = peak_rss_mb()
+    return result
+
+def time_each(func, items):
+    """
+    Calls func on every item and records the per-item latency.
+
+    :return: (list of outputs, list of latencies in seconds)
+    """
+    outputs = []
+    latencies = []
+    clock = time.perf_counter
+    for item in items:
+        start = clock()
+        outputs.append(func(item))
+        latencies.append(clock() - start)
+    return outputs, latencies
+
+def time_once(func, *args, **kwargs):
+    """
+    Times a single call.
+
+    :return: (output, [latency in seconds])
+    """
+    start = time.perf_counter()
+    output = func(*args, **kwargs)
+    return output, [time.perf_counter() - start]
+
+def _aggregate(rows):
+    scenario_counts = defaultdict(int)
+    score_summary = ScoreSummary()
+    top_events = TopKEvents(100)
+    for metrics in rows:
+        scenario_counts[metrics['scenario']] += 1
+        score_summary.update(metrics)
+        top_events.push(metrics)
+    table = MetricsTable.from_rows(rows)
+    table.to_frame()
+    return table, score_summary, top_events
+
+def bench_core(shard_paths, stages):
+    """
+    Reading, parsing, analysis, classification and aggregation, stage by stage.
+    Each stage consumes the output of the previous one, so only its own work is timed.
+    """
+    results = {}
+
+    # --- Read ---
+    records = []
+    latencies = []
+    for path in shard_paths:
+        clock = time.perf_counter
+        start = clock()
+        for _, record in iter_records(path):
+            # Copied so the later stages can run after the mapping is closed
+            records.append(bytes(record))
+            now = clock()
+            latencies.append(now - start)
+            start = now
+    num_bytes = sum(len(record) for record in records)
+    results['read'] = summarize_latencies(latencies, num_bytes)
+
+    # --- Parse ---
+    frames, latencies = time_each(lambda r: parse_kinematics(r, include_future=False), records)
+    results['parse_fast'] = summarize_latencies(latencies, num_bytes)
+
+    try:
+        from waymo_open_dataset.protos import end_to_end_driving_data_pb2 as wod_e2ed_pb2
+
+        def parse_full(record):
+            data = wod_e2ed_pb2.E2EDFrame()
+            data.ParseFromString(record)
+            return data
+
+        _, latencies = time_each(parse_full, records)
+        results['parse_full'] = summarize_latencies(latencies, num_bytes)
+    except ImportError as e:
+        results['parse_full'] = {'skipped': str(e)}
+
+    # --- Analyze / classify (per frame, as in process_shard) ---
+    rows, latencies = time_each(analyze_driving_behavior, frames)
+    results['analyze'] = summarize_latencies(latencies)
+    rows = [metrics for metrics in rows if metrics]
+
+    # Same frames through the segment-aware analyzer; it only reuses history when consecutive
+    # frames share their past_states (frames_per_segment > 1)
+    incremental = IncrementalAnalyzer()
+    _, latencies = time_each(incremental.analyze, frames)
+    results['analyze_incremental'] = summarize_latencies(latencies)
+    results['analyze_incremental']['reused_steps'] = incremental.stats['reused_steps']
+    results['analyze_incremental']['computed_steps'] = incremental.stats['computed_steps']
+
+    scenarios, latencies = time_each(classify_scenario, rows)
+    results['classify'] = summarize_latencies(latencies)
+    for metrics, scenario in zip(rows, scenarios):
+        metrics['scenario'] = scenario
+
+    # --- Vectorized variants ---
+    stacked, latencies = time_once(stack_past_states, frames)
+    batch, batch_latencies = time_once(analyze_driving_behavior_batch, **stacked)
+    results['analyze_batch'] = summarize_latencies([latencies[0] + batch_latencies[0]], num_items=len(frames))
+    _, latencies = time_once(classify_scenarios, batch)
+    results['classify_batch'] = summarize_latencies(latencies, num_items=len(frames))
+
+    # --- Aggregation: counts, streaming summaries, top-K, columnar table ---
+    (table, score_summary, _), latencies = time_once(_aggregate, rows)
+    results['aggregate'] = summarize_latencies(latencies, num_items=len(rows))
+
+    if 'ingest' in stages:
+        _, latencies = time_once(ingest_shards, shard_paths, num_workers=stages['ingest'])
+        results['ingest_shards'] = summarize_latencies(latencies, num_bytes, num_items=len(records))
+
+    return results, records, table, score_summary
+
+def bench_plots(records, table, score_summary, out_dir):
+    """
+    Dashboards and the event figure, rendered to files on the Agg backend.
+    """
+    import matplotlib
+    matplotlib.use('Agg', force=True)
+
+    from src.baseline_plots import plot_kinematic_statics, plot_scenario_distribution
+    from src.interaction_validation import plot_interaction
+    from src.score_distribution import interaction_stats_table, plot_interaction_score
+
+    path = lambda name: os.path.join(out_dir, name + '.png')
+    plots = {
+        'plot_kinematic_statics': lambda: plot_kinematic_statics(table, save_path=path('kinematic_statics')),
+        'plot_scenario_distribution': lambda: plot_scenario_distribution(table, save_path=path('scenarios')),
+        'plot_interaction_score': lambda: plot_interaction_score(table, save_path=path('interaction_score')),
+        'plot_interaction': lambda: plot_interaction(table, score_summary, save_path=path('interaction')),
+        'interaction_stats_table': lambda: interaction_stats_table(score_summary, save_path=os.path.join(out_dir, 'stats.md')),
+    }
+
+    results = {}
+    for name, plot in plots.items():
+        _, latencies = time_once(plot)
+        results[name] = summarize_latencies(latencies)
+
+    try:
+        from waymo_open_dataset.protos import end_to_end_driving_data_pb2 as wod_e2ed_pb2
+        from src.figure_output import show_or_save
+        from src.visualization import render_event_figure
+
+        data = wod_e2ed_pb2.E2EDFrame()
+        data.ParseFromString(records[0])
+        row = table.to_frame().iloc[0]
+
+        def render_event():
+            show_or_save(render_event_figure(data, row), path('event'))
+
+        _, latencies = time_once(render_event)
+        results['render_event_figure'] = summarize_latencies(latencies)
+    except ImportError as e:
+        results['render_event_figure'] = {'skipped': str(e)}
+
+    return results
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(num_records=1000, num_shards=1, past_len=16, image_size=None, frames_per_segment=1,
+                   seed=0, plots=True, ingest_workers=None, data_dir=None):
+    """
+    Generates synthetic shards and benchmarks every stage.
+
+    :param num_records: Total number of records
+    :param num_shards: Number of shards they are split into
+    :param past_len: past_states length per frame
+    :param image_size: (width, height) of the camera JPEGs, or None for kinematics-only records
+    :param frames_per_segment: Frames per simulated drive
+    :param seed: Random seed of the generator
+    :param plots: Also time the plotting/visualization functions
+    :param ingest_workers: Also time ingest_shards end to end with this many workers (None = skip)
+    :param data_dir: Where to write the shards (None = temporary directory)
+    :return: dict (JSON-serializable) with 'config', 'environment', 'dataset', 'stages', 'peak_rss_mb'
+    """
+    config = {
+        'num_records': num_records, 'num_shards': num_shards, 'past_len': past_len,
+        'image_size': list(image_size) if image_size else None,
+        'frames_per_segment': frames_per_segment, 'seed': seed,
+        'plots': plots, 'ingest_workers': ingest_workers,
+    }
+    stages = {'ingest': ingest_workers} if ingest_workers else {}
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        shard_dir = data_dir or os.path.join(tmp_dir, 'shards')
+        start = time.perf_counter()
+        shard_paths = write_synthetic_shards(
+            shard_dir, num_shards, -(-num_records // num_shards), seed=seed,
+            past_len=past_len, image_size=image_size, frames_per_segment=frames_per_segment)
+        generate_s = time.perf_counter() - start
+
+        results, records, table, score_summary = bench_core(shard_paths, stages)
+        if plots:
+            results.update(bench_plots(records, table, score_summary, tmp_dir))
+
+    return {
+        'created': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'config': config,
+        'environment': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'git_commit': _git_commit(),
+        },
+        'dataset': {
+            'num_records': len(records),
+            'num_bytes': sum(len(record) for record in records),
+            'generate_s': generate_s,
+        },
+        'stages': results,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+def compare_runs(current, baseline):
+    """
+    Throughput and p50 latency of each stage relative to a previous run.
+
+    :param current: Result of run_benchmarks
+    :param baseline: Previous result (e.g. loaded from its JSON file)
+    :return: pd.DataFrame, one row per stage present in both runs
+    """
+    import pandas as pd
+
+    rows = []
+    for stage, new in current['stages'].items():
+        old = baseline['stages'].get(stage)
+        if not old or 'skipped' in old or 'skipped' in new:
+            continue
+        rows.append({
+            'stage': stage,
+            'items_per_s': new['items_per_s'],
+            'baseline_items_per_s': old['items_per_s'],
+            'speedup': new['items_per_s'] / old['items_per_s'] if old['items_per_s'] else None,
+            'p50_ms': new['latency_ms']['p50'],
+            'baseline_p50_ms': old['latency_ms']['p50'],
+        })
+    return pd.DataFrame(rows)
+
+def _print_summary(report):
+    rss = report['peak_rss_mb']
+    print(f"\n{report['dataset']['num_records']} records, {report['dataset']['num_bytes'] / 1e6:.1f} MB, "
+          f"peak RSS {'n/a' if rss is None else f'{rss:.0f} MB'}")
+    print(f"{'stage':<28}{'items/s':>12}{'p50 ms':>10}{'p99 ms':>10}")
+    for stage, result in report['stages'].items():
+        if 'skipped' in result:
+            print(f"{stage:<28}{'skipped':>12}")
+            continue
+        print(f"{stage:<28}{result['items_per_s'] or 0:>12.1f}"
+              f"{result['latency_ms']['p50']:>10.3f}{result['latency_ms']['p99']:>10.3f}")
+
+def _parse_size(text):
+    width, height = text.lower().split('x')
+    return int(width), int(height)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the Waymo E2E analysis pipeline on synthetic data.')
+    parser.add_argument('--records', type=int, default=1000, help='Total number of synthetic records')
+    parser.add_argument('--shards', type=int, default=1, help='Number of shards')
+    parser.add_argument('--past-len', type=int, default=16, help='past_states length per frame')
+    parser.add_argument('--image-size', type=_parse_size, default=None,
+                        help="Camera JPEG size, e.g. 1920x1280 (default: no images)")
+    parser.add_argument('--frames-per-segment', type=int, default=1, help='Frames per simulated drive')
+    parser.add_argument('--seed', type=int, default=0, help='Generator seed')
+    parser.add_argument('--no-plots', action='store_true', help='Skip the plotting stages')
+    parser.add_argument('--ingest-workers', type=int, default=None,
+                        help='Also time ingest_shards with this many workers')
+    parser.add_argument('--data-dir', default=None,
+                        help='Write the synthetic shards here and keep them (default: temporary directory)')
+    parser.add_argument('--output', default='bench_results.json', help='JSON output path')
+    parser.add_argument('--compare', default=None, help='Previous JSON result to compare against')
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args.records, args.shards, args.past_len, args.image_size,
+                            args.frames_per_segment, args.seed, not args.no_plots, args.ingest_workers,
+                            args.data_dir)
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    _print_summary(report)
+    print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"\nCompared to {args.compare} ({baseline.get('created')}):")
+        if baseline.get('config') != report['config']:
+            print("Warning: the runs used different configurations")
+        print(compare_runs(report, baseline).to_markdown(index=False, floatfmt='.3f'))
+
+if __name__ == '__main__':
+    main()
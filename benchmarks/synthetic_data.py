@@ -0,0 +1,216 @@
+### ECE143 Final Project Group 4
+### Waymo E2E Driving Analysis - Synthetic E2EDFrame Generator
+
+# Seeded generator of E2EDFrame-shaped records for benchmarks and CI, where the real
+# dataset cannot be downloaded. Records are encoded directly in the protobuf wire
+# format (field numbers of end_to_end_driving_data.proto / dataset.proto), so neither
+# TensorFlow nor the Waymo package is needed to produce them, and both the Waymo
+# protos and data.fast_parse can parse them.
+
+import os
+
+import numpy as np
+
+from data.tfrecord import FAST_CRC32C, write_records
+
+DT = 0.25  # seconds between states (4 Hz, as in the dataset)
+NUM_CAMERAS = 8
+
+# Intent enum of E2EDFrame
+INTENT_UNKNOWN, INTENT_GO_STRAIGHT, INTENT_GO_LEFT, INTENT_GO_RIGHT = 0, 1, 2, 3
+
+# --- Protobuf wire encoding ---
+
+def _varint(value):
+    value &= 0xFFFFFFFFFFFFFFFF  # negative int64 -> two's complement
+    out = bytearray()
+    while True:
+        bits = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(bits | 0x80)
+        else:
+            out.append(bits)
+            return bytes(out)
+
+def _varint_field(number, value):
+    return _varint(number << 3) + _varint(value)
+
+def _bytes_field(number, payload):
+    return _varint((number << 3) | 2) + _varint(len(payload)) + payload
+
+def _packed_floats_field(number, values):
+    return _bytes_field(number, np.asarray(values, dtype='<f4').tobytes())
+
+def encode_states(states):
+    """
+    Encodes an EgoTrajectoryStates message.
+
+    :param states: dict field name -> float array ('pos_x', 'pos_y', 'pos_z', 'vel_x', 'vel_y', 'accel_x', 'accel_y')
+    :return: Serialized message bytes
+    """
+    numbers = {'pos_x': 1, 'pos_y': 2, 'pos_z': 3, 'vel_x': 4, 'vel_y': 5, 'accel_x': 6, 'accel_y': 7}
+    return b''.join(_packed_floats_field(numbers[name], states[name])
+                    for name in numbers if name in states)
+
+def encode_e2ed_frame(scene_id, timestamp_micros, past_states, future_states, intent, images=()):
+    """
+    Encodes an E2EDFrame message.
+
+    :param scene_id: Frame.context.name
+    :param timestamp_micros: Frame.timestamp_micros
+    :param past_states: dict of state arrays (see encode_states)
+    :param future_states: dict of state arrays
+    :param intent: Intent enum value
+    :param images: Iterable of (camera name enum, image bytes)
+    :return: Serialized E2EDFrame bytes
+    """
+    context = _bytes_field(1, scene_id.encode('utf-8'))
+    frame = _bytes_field(1, context) + _varint_field(2, timestamp_micros)
+    for camera, image in images:
+        frame += _bytes_field(4, _varint_field(1, camera) + _bytes_field(2, image))
+
+    return (_bytes_field(1, frame) +
+            _bytes_field(5, encode_states(future_states)) +
+            _bytes_field(6, encode_states(past_states)) +
+            _varint_field(7, intent))
+
+# --- Kinematics ---
+
+def _segment_trajectory(rng, num_steps):
+    """
+    Simulates one drive with a bicycle-like model: a speed profile with occasional
+    hard braking / launches and a yaw-rate profile with occasional swerves and turns.
+    Accelerations are the true derivatives of the velocities, so the analysis sees
+    consistent physics.
+    """
+    kind = rng.choice(['cruise', 'brake', 'swerve', 'turn', 'stationary'], p=[0.45, 0.15, 0.1, 0.2, 0.1])
+
+    speed0 = 0.0 if kind == 'stationary' else rng.uniform(3.0, 25.0)
+    long_accel = rng.normal(0.0, 0.4, num_steps)
+    yaw_rate = rng.normal(0.0, 0.01, num_steps)
+
+    event_start = rng.integers(0, max(1, num_steps - 4))
+    event = slice(event_start, event_start + rng.integers(2, 6))
+    if kind == 'brake':
+        long_accel[event] = -rng.uniform(2.0, 7.0)
+    elif kind == 'swerve':
+        swerve = rng.uniform(0.1, 0.3) * rng.choice([-1, 1])
+        yaw_rate[event] = swerve * np.sign(np.sin(np.linspace(0, 2 * np.pi, len(yaw_rate[event]))))
+    elif kind == 'turn':
+        yaw_rate[event] = rng.uniform(0.2, 0.5) * rng.choice([-1, 1])
+        speed0 = min(speed0, 12.0)
+    elif kind == 'stationary':
+        long_accel[:] = 0.0
+        yaw_rate[:] = 0.0
+
+    speed = np.maximum(speed0 + np.cumsum(long_accel) * DT, 0.0)
+    long_accel = np.gradient(speed, DT)
+    heading = rng.uniform(-np.pi, np.pi) + np.cumsum(yaw_rate) * DT
+
+    vel_x = speed * np.cos(heading)
+    vel_y = speed * np.sin(heading)
+    states = {
+        'pos_x': np.cumsum(vel_x) * DT,
+        'pos_y': np.cumsum(vel_y) * DT,
+        'pos_z': np.zeros(num_steps),
+        'vel_x': vel_x,
+        'vel_y': vel_y,
+        # d/dt (v * (cos, sin)) = a_long * (cos, sin) + v * yaw_rate * (-sin, cos)
+        'accel_x': long_accel * np.cos(heading) - speed * yaw_rate * np.sin(heading),
+        'accel_y': long_accel * np.sin(heading) + speed * yaw_rate * np.cos(heading),
+    }
+
+    total_yaw = heading[-1] - heading[0]
+    if kind == 'turn':
+        intent = INTENT_GO_LEFT if total_yaw > 0 else INTENT_GO_RIGHT
+    else:
+        intent = rng.choice([INTENT_GO_STRAIGHT, INTENT_UNKNOWN], p=[0.9, 0.1])
+    return states, int(intent)
+
+def make_camera_images(image_size=(1920, 1280), quality=85, seed=0, num_cameras=NUM_CAMERAS):
+    """
+    JPEG stand-ins for the surround cameras: smooth noise compresses to roughly the
+    size of real camera frames. Needs Pillow.
+
+    :param image_size: (width, height) in pixels
+    :param quality: JPEG quality
+    :param seed: Random seed
+    :param num_cameras: Number of cameras
+    :return: List of (camera name enum, JPEG bytes)
+    """
+    import io
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    width, height = image_size
+    images = []
+    for camera in range(1, num_cameras + 1):
+        small = rng.integers(0, 256, (max(height // 16, 1), max(width // 16, 1), 3), dtype=np.uint8)
+        buffer = io.BytesIO()
+        Image.fromarray(small).resize((width, height), Image.BILINEAR).save(buffer, 'JPEG', quality=quality)
+        images.append((camera, buffer.getvalue()))
+    return images
+
+def generate_records(num_records, seed=0, past_len=16, future_len=20, frames_per_segment=1, stride=1,
+                     image_size=None, image_quality=85, num_cameras=NUM_CAMERAS):
+    """
+    Yields serialized synthetic E2EDFrame records.
+
+    Frames of one segment are sliding windows over the same simulated drive, so with
+    frames_per_segment > 1 consecutive records share past_states like the real data.
+
+    :param num_records: Number of records
+    :param seed: Random seed (same seed = same bytes)
+    :param past_len: Number of past states per frame
+    :param future_len: Number of future states per frame
+    :param frames_per_segment: Frames generated from one drive
+    :param stride: Steps between consecutive frames of a segment
+    :param image_size: (width, height) of the camera JPEGs, or None for no images
+    :param image_quality: JPEG quality
+    :param num_cameras: Number of camera images per frame
+    :return: Generator of record bytes
+    """
+    rng = np.random.default_rng(seed)
+    images = make_camera_images(image_size, image_quality, seed, num_cameras) if image_size else ()
+
+    produced = 0
+    segment = 0
+    while produced < num_records:
+        segment_id = f"{seed:04x}{rng.integers(0, 2**48):012x}"
+        num_frames = min(frames_per_segment, num_records - produced)
+        num_steps = past_len + future_len + (num_frames - 1) * stride
+        states, intent = _segment_trajectory(rng, num_steps)
+        start_time = 1_500_000_000_000_000 + segment * 20_000_000
+
+        for i in range(num_frames):
+            start = i * stride
+            past = {name: values[start:start + past_len] for name, values in states.items()}
+            future = {name: values[start + past_len:start + past_len + future_len] for name, values in states.items()}
+            timestamp = start_time + int((start + past_len - 1) * DT * 1e6)
+            yield encode_e2ed_frame(f"{segment_id}-{i:03d}", timestamp, past, future, intent, images)
+            produced += 1
+        segment += 1
+
+def write_synthetic_shards(out_dir, num_shards=1, records_per_shard=100, seed=0, compute_crc=None, **kwargs):
+    """
+    Writes synthetic TFRecord shards named like the dataset ('<split>.tfrecord-00000-of-00004').
+
+    :param out_dir: Output directory (created if missing)
+    :param num_shards: Number of shards
+    :param records_per_shard: Records per shard
+    :param seed: Base random seed (shard i uses seed + i)
+    :param compute_crc: Write real record CRCs (None = only if the crc32c package is installed)
+    :param kwargs: Passed to generate_records (past_len, image_size, frames_per_segment, ...)
+    :return: List of shard paths
+    """
+    if compute_crc is None:
+        compute_crc = FAST_CRC32C
+    os.makedirs(out_dir, exist_ok=True)
+
+    paths = []
+    for shard in range(num_shards):
+        path = os.path.join(out_dir, f"synthetic.tfrecord-{shard:05d}-of-{num_shards:05d}")
+        write_records(path, generate_records(records_per_shard, seed + shard, **kwargs), compute_crc)
+        paths.append(path)
+    return paths
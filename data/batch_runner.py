@@ -0,0 +1,300 @@
+### ECE143 Final Project Group 4
+### Waymo E2E Driving Analysis - Resumable Batch Runner (CLI)
+
+# Headless, checkpointed version of the notebook loop:
+#
+#   python -m data.batch_runner "/data/womd/training.tfrecord-*" --out-dir runs/full --workers 8
+#
+# Every shard gets a progress file in <out-dir>/progress/ (byte offset of the next record,
+# records/errors so far, finished part files) and its rows are written in part files of
+# --checkpoint-every records to <out-dir>/parts/. Parts and progress files are written to a
+# temporary name and renamed, so a crash leaves either the old or the new checkpoint, never a
+# torn one. Rerunning the same command skips finished shards, resumes the others at their
+# last offset and writes the same final outputs as an uninterrupted run.
+
+import argparse
+import hashlib
+import json
+import multiprocessing as mp
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import pandas as pd
+
+from data.fast_parse import parse_kinematics
+from data.ingestion import list_shards, merge_shard_results, rebuild_summaries
+from data.metrics_cache import analysis_version, read_rows_npz, write_rows_npz
+from data.record_index import save_record_index
+from data.scenario_classification import analyze_driving_behavior, classify_scenario
+from data.tfrecord import FOOTER_SIZE, HEADER_SIZE, iter_records
+
+MANIFEST_NAME = 'manifest.json'
+
+def _write_json(path, obj):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(obj, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def _read_json(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def shard_key(shard_path):
+    """File name stem of a shard's progress and part files (unique per absolute path)."""
+    digest = hashlib.sha1(os.path.abspath(shard_path).encode('utf-8')).hexdigest()[:10]
+    return f"{os.path.basename(shard_path)}-{digest}"
+
+def _new_progress(shard_path):
+    stat = os.stat(shard_path)
+    return {
+        'shard': os.path.abspath(shard_path),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'next_offset': 0,
+        'num_records': 0,
+        'num_errors': 0,
+        'parts': [],
+        'done': False,
+    }
+
+def _is_current(progress, shard_path):
+    """True if the progress file was written for the shard as it is now (same size and mtime)."""
+    stat = os.stat(shard_path)
+    return (progress['size'], progress['mtime_ns']) == (stat.st_size, stat.st_mtime_ns)
+
+def run_shard(shard_path, out_dir, num_samples=None, checkpoint_every=1000, fast_parse=True):
+    """
+    Processes one shard from its last checkpoint to the end (the unit of work of a worker).
+
+    :param shard_path: Path to the TFRecord shard
+    :param out_dir: Run directory
+    :param num_samples: Max number of records of this shard (None = all)
+    :param checkpoint_every: Records per part file / checkpoint
+    :param fast_parse: Use the kinematics-only parser instead of E2EDFrame.ParseFromString
+    :return: Progress dict of the shard
+    """
+    if not fast_parse:
+        from waymo_open_dataset.protos import end_to_end_driving_data_pb2 as wod_e2ed_pb2
+
+    key = shard_key(shard_path)
+    progress_path = os.path.join(out_dir, 'progress', key + '.json')
+    progress = _read_json(progress_path)
+    if progress is not None and not _is_current(progress, shard_path):
+        print(f"{os.path.basename(shard_path)} changed since the last run, starting it over")
+        progress = None
+    progress = progress or _new_progress(shard_path)
+    if progress['done']:
+        return progress
+
+    if progress['next_offset'] > 0:
+        print(f"Resuming {os.path.basename(shard_path)} at record {progress['num_records']} "
+              f"(byte {progress['next_offset']})")
+
+    # One (location, metrics, failed, next offset) entry per record since the last checkpoint.
+    # A record is committed by a single list append, so an interrupt leaves it either entirely
+    # in the next checkpoint (row, index entry, count and offset) or not at all.
+    completed = []
+
+    def checkpoint(done=False):
+        nonlocal completed
+        if completed:
+            rows = [metrics for _, metrics, _, _ in completed if metrics]
+            index = {location[0]: location[1:] for location, _, _, _ in completed if location}
+            num_errors = sum(failed for _, _, failed, _ in completed)
+            part_name = f"{key}-{len(progress['parts']):05d}.npz"
+            write_rows_npz(os.path.join(out_dir, 'parts', part_name), rows, index, len(completed), num_errors)
+            # The part is complete on disk before the progress file points past its records
+            progress['parts'].append(part_name)
+            progress['num_records'] += len(completed)
+            progress['num_errors'] += num_errors
+            progress['next_offset'] = completed[-1][3]
+        progress['done'] = done
+        _write_json(progress_path, progress)
+        completed = []
+
+    remaining = None if num_samples is None else max(num_samples - progress['num_records'], 0)
+    records = iter_records(shard_path, remaining, start_offset=progress['next_offset']) if remaining != 0 else ()
+    try:
+        for offset, bytes_example in records:
+            location, metrics, failed = None, None, False
+            try:
+                if fast_parse:
+                    data = parse_kinematics(bytes_example, include_future=False)
+                else:
+                    data = wod_e2ed_pb2.E2EDFrame()
+                    data.ParseFromString(bytes_example)
+                location = (data.frame.context.name, offset, len(bytes_example))
+
+                metrics = analyze_driving_behavior(data)
+                if metrics:
+                    metrics['scenario'] = classify_scenario(metrics)
+                    metrics['shard'] = os.path.basename(shard_path)
+
+            except Exception as e:
+                failed = True
+                print(f"Error record {progress['num_records'] + len(completed)} in {os.path.basename(shard_path)}: "
+                      f"{type(e).__name__}: {e}")
+
+            # The record is complete: a restart continues after it
+            completed.append((location, metrics, failed, offset + HEADER_SIZE + len(bytes_example) + FOOTER_SIZE))
+            if len(completed) >= checkpoint_every:
+                checkpoint()
+    except BaseException:
+        # Interrupted (Ctrl-C, a crash in the reader): keep the completed records
+        checkpoint()
+        raise
+
+    checkpoint(done=True)
+    return progress
+
+def load_run(out_dir, shard_paths=None):
+    """
+    Reads the finished parts of a run back into per-shard results.
+
+    :param out_dir: Run directory
+    :param shard_paths: Shards to load (default: those of the run manifest)
+    :return: List of dicts in the process_shard format (without the streaming summaries)
+    """
+    if shard_paths is None:
+        shard_paths = _read_json(os.path.join(out_dir, MANIFEST_NAME))['shards']
+
+    results = []
+    for shard_path in shard_paths:
+        progress = _read_json(os.path.join(out_dir, 'progress', shard_key(shard_path) + '.json'))
+        if progress is None:
+            continue
+        all_metrics, record_index = [], {}
+        scenario_counts = defaultdict(int)
+        for part_name in progress['parts']:
+            part = read_rows_npz(os.path.join(out_dir, 'parts', part_name))
+            all_metrics.extend(part['all_metrics'])
+            for scene_id, offset, length in part['index']:
+                record_index[scene_id] = (shard_path, offset, length)
+        for metrics in all_metrics:
+            scenario_counts[metrics['scenario']] += 1
+        results.append({
+            'shard': shard_path,
+            'all_metrics': all_metrics,
+            'scenario_counts': dict(scenario_counts),
+            'record_index': record_index,
+            'num_records': progress['num_records'],
+            'num_errors': progress['num_errors'],
+            'done': progress['done'],
+        })
+    return results
+
+def run_batch(shard_pattern, out_dir, num_workers=None, num_samples=None, checkpoint_every=1000, fast_parse=True,
+              top_k=100, restart=False):
+    """
+    Resumable batch run: processes all shards with checkpoints, then writes the final outputs
+    (metrics.csv, record_index.csv, scenario_counts.csv, summary.json) to out_dir.
+
+    :param shard_pattern: Glob pattern string or list of shard paths
+    :param out_dir: Run directory (manifest, progress files, parts and final outputs)
+    :param num_workers: Number of worker processes (None = os.cpu_count(), 1 = run in-process)
+    :param num_samples: Per-shard record limit (None = all records)
+    :param checkpoint_every: Records per checkpoint
+    :param fast_parse: Use the kinematics-only parser
+    :param top_k: Number of most critical events kept in results['top_events']
+    :param restart: Discard the progress of a previous run in out_dir
+    :return: Merged results, see merge_shard_results
+    """
+    shard_paths = [os.path.abspath(path) for path in list_shards(shard_pattern)]
+    if not shard_paths:
+        raise ValueError(f"No shards matched {shard_pattern}")
+
+    for sub_dir in ('progress', 'parts'):
+        os.makedirs(os.path.join(out_dir, sub_dir), exist_ok=True)
+    manifest_path = os.path.join(out_dir, MANIFEST_NAME)
+    config = {'num_samples': num_samples, 'fast_parse': fast_parse, 'analysis_version': analysis_version()}
+
+    manifest = None if restart else _read_json(manifest_path)
+    if manifest is not None and manifest['config'] != config:
+        raise ValueError(f"{out_dir} holds a run with a different configuration ({manifest['config']}); "
+                         f"use another directory or restart=True")
+    if manifest is None:
+        for sub_dir in ('progress', 'parts'):
+            for name in os.listdir(os.path.join(out_dir, sub_dir)):
+                os.remove(os.path.join(out_dir, sub_dir, name))
+        manifest = {'config': config, 'created': time.time(), 'shards': []}
+    # New shards matching the pattern are added to the run
+    manifest['shards'] = sorted(set(manifest['shards']) | set(shard_paths))
+    _write_json(manifest_path, manifest)
+
+    todo = []
+    for path in shard_paths:
+        progress = _read_json(os.path.join(out_dir, 'progress', shard_key(path) + '.json'))
+        # A finished shard that was rewritten since is processed again (run_shard starts it over)
+        if progress is None or not progress['done'] or not _is_current(progress, path):
+            todo.append(path)
+    print(f"{len(shard_paths) - len(todo)}/{len(shard_paths)} shards already done, processing {len(todo)}...")
+
+    if todo:
+        num_workers = min(num_workers or os.cpu_count() or 1, len(todo))
+        worker = partial(run_shard, out_dir=out_dir, num_samples=num_samples,
+                         checkpoint_every=checkpoint_every, fast_parse=fast_parse)
+        if num_workers == 1:
+            for path in todo:
+                worker(path)
+        else:
+            # 'spawn' so that workers start from a clean interpreter
+            ctx = mp.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=num_workers, mp_context=ctx) as executor:
+                for progress in executor.map(worker, todo):
+                    print(f"Finished {os.path.basename(progress['shard'])}: {progress['num_records']} records")
+
+    shard_results = [rebuild_summaries(result, top_k) for result in load_run(out_dir, shard_paths)]
+    results = merge_shard_results(shard_results, top_k)
+    write_outputs(results, out_dir)
+    return results
+
+def write_outputs(results, out_dir):
+    """
+    Writes the final outputs of a run (each file replaced atomically).
+
+    :param results: Merged results
+    :param out_dir: Output directory
+    """
+    metrics_path = os.path.join(out_dir, 'metrics.csv')
+    pd.DataFrame(results['all_metrics']).to_csv(metrics_path + '.tmp', index=False)
+    os.replace(metrics_path + '.tmp', metrics_path)
+
+    counts_path = os.path.join(out_dir, 'scenario_counts.csv')
+    counts = pd.Series(results['scenario_counts'], name='count').rename_axis('scenario').sort_values(ascending=False)
+    counts.to_csv(counts_path + '.tmp')
+    os.replace(counts_path + '.tmp', counts_path)
+
+    save_record_index(results['record_index'], os.path.join(out_dir, 'record_index.csv'))
+    _write_json(os.path.join(out_dir, 'summary.json'), {
+        'num_records': results['num_records'],
+        'num_errors': results['num_errors'],
+        'num_rows': len(results['all_metrics']),
+        'shards': results['shards'],
+        'scenario_counts': dict(results['scenario_counts']),
+    })
+    print(f"Wrote {len(results['all_metrics'])} rows ({results['num_records']} records, "
+          f"{results['num_errors']} errors) to {out_dir}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Resumable batch analysis of Waymo E2E TFRecord shards.')
+    parser.add_argument('shards', nargs='+', help='Shard paths or glob patterns')
+    parser.add_argument('--out-dir', required=True, help='Run directory (rerun the same command to resume)')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+    parser.add_argument('--num-samples', type=int, default=None, help='Per-shard record limit')
+    parser.add_argument('--checkpoint-every', type=int, default=1000, help='Records per checkpoint')
+    parser.add_argument('--full-parse', action='store_true', help='Parse with the Waymo protos instead of fast_parse')
+    parser.add_argument('--restart', action='store_true', help='Discard the progress of a previous run')
+    args = parser.parse_args(argv)
+
+    shard_paths = sorted({path for pattern in args.shards for path in list_shards(pattern)})
+    run_batch(shard_paths, args.out_dir, args.workers, args.num_samples, args.checkpoint_every,
+              not args.full_parse, restart=args.restart)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+### ECE143 Final Project Group 4
+### Waymo E2E Driving Analysis - Kinematics-Only Partial Parser
+
+# The metrics pass only needs past_states, intent, context.name and timestamp_micros,
+# but E2EDFrame.ParseFromString also materializes the eight camera JPEGs that make up
+# almost all of a record. This module walks the protobuf wire format directly, copies
+# the kinematic fields into NumPy arrays and jumps over everything else.
+
+import numpy as np
+
+# Wire types
+VARINT = 0
+FIXED64 = 1
+LENGTH_DELIMITED = 2
+FIXED32 = 5
+
+# E2EDFrame field numbers (waymo_open_dataset/protos/end_to_end_driving_data.proto)
+E2ED_FRAME = 1
+E2ED_FUTURE_STATES = 5
+E2ED_PAST_STATES = 6
+E2ED_INTENT = 7
+
+# Frame / Context field numbers (waymo_open_dataset/dataset.proto)
+FRAME_CONTEXT = 1
+FRAME_TIMESTAMP_MICROS = 2
+CONTEXT_NAME = 1
+
+# EgoTrajectoryStates field numbers
+STATE_FIELD_NUMBERS = {
+    1: 'pos_x', 2: 'pos_y', 3: 'pos_z',
+    4: 'vel_x', 5: 'vel_y',
+    6: 'accel_x', 7: 'accel_y',
+}
+
+class EgoStates:
+    """
+    Kinematic history/future of the ego vehicle as float32 NumPy arrays
+    (same attribute names as EgoTrajectoryStates).
+    """
+    __slots__ = tuple(STATE_FIELD_NUMBERS.values())
+
+    def __init__(self):
+        for name in self.__slots__:
+            setattr(self, name, np.zeros(0, dtype=np.float32))
+
+class Context:
+    __slots__ = ('name',)
+
+    def __init__(self):
+        self.name = ''
+
+class FrameInfo:
+    __slots__ = ('context', 'timestamp_micros')
+
+    def __init__(self):
+        self.context = Context()
+        self.timestamp_micros = 0
+
+class KinematicsFrame:
+    """
+    Lightweight stand-in for E2EDFrame holding only the fields used by
+    analyze_driving_behavior (plus future_states). It can be passed to
+    analyze_driving_behavior and stack_past_states as-is.
+    """
+    __slots__ = ('frame', 'past_states', 'future_states', 'intent')
+
+    def __init__(self):
+        self.frame = FrameInfo()
+        self.past_states = EgoStates()
+        self.future_states = EgoStates()
+        self.intent = 0
+
+def _read_varint(buf, pos):
+    result = 0
+    shift = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        result |= (b & 0x7F) << shift
+        if not b & 0x80:
+            return result, pos
+        shift += 7
+
+def _skip_field(buf, pos, wire_type):
+    """Returns the position just after a field value of the given wire type."""
+    if wire_type == VARINT:
+        return _read_varint(buf, pos)[1]
+    if wire_type == FIXED64:
+        return pos + 8
+    if wire_type == LENGTH_DELIMITED:
+        length, pos = _read_varint(buf, pos)
+        return pos + length
+    if wire_type == FIXED32:
+        return pos + 4
+    raise ValueError(f"Unsupported protobuf wire type {wire_type} at byte {pos}")
+
+def _to_int64(value):
+    # Negative int64 values are encoded as 10-byte two's complement varints
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+def _parse_states(buf, pos, end, states):
+    chunks = {}
+    while pos < end:
+        tag_start = pos
+        tag, pos = _read_varint(buf, pos)
+        field, wire_type = tag >> 3, tag & 7
+        name = STATE_FIELD_NUMBERS.get(field)
+
+        if name is None:
+            pos = _skip_field(buf, pos, wire_type)
+        elif wire_type == LENGTH_DELIMITED:
+            # Packed repeated float: one contiguous little-endian float32 block
+            length, pos = _read_varint(buf, pos)
+            values = np.frombuffer(buf, dtype='<f4', count=length // 4, offset=pos)
+            chunks.setdefault(name, []).append(values.astype(np.float32))
+            pos += length
+        elif wire_type == FIXED32:
+            # Unpacked repeated float: a run of (tag, 4 bytes) pairs with a fixed stride
+            tag_bytes = bytes(buf[tag_start:pos])
+            stride = len(tag_bytes) + 4
+            count = 1
+            while pos + count * stride <= end and bytes(buf[tag_start + count * stride:pos + count * stride]) == tag_bytes:
+                count += 1
+            values = np.ndarray(shape=(count,), dtype='<f4', buffer=buf, offset=pos, strides=(stride,))
+            chunks.setdefault(name, []).append(values.astype(np.float32))
+            pos = tag_start + count * stride
+        else:
+            pos = _skip_field(buf, pos, wire_type)
+
+    for name, parts in chunks.items():
+        previous = getattr(states, name)
+        if len(previous):
+            parts = [previous] + parts
+        setattr(states, name, parts[0] if len(parts) == 1 else np.concatenate(parts))
+
+def _parse_context(buf, pos, end, context):
+    while pos < end:
+        tag, pos = _read_varint(buf, pos)
+        field, wire_type = tag >> 3, tag & 7
+        if field == CONTEXT_NAME and wire_type == LENGTH_DELIMITED:
+            length, pos = _read_varint(buf, pos)
+            context.name = bytes(buf[pos:pos + length]).decode('utf-8')
+            pos += length
+        else:
+            # camera/laser calibrations, stats
+            pos = _skip_field(buf, pos, wire_type)
+
+def _parse_frame(buf, pos, end, frame):
+    while pos < end:
+        tag, pos = _read_varint(buf, pos)
+        field, wire_type = tag >> 3, tag & 7
+        if field == FRAME_CONTEXT and wire_type == LENGTH_DELIMITED:
+            length, pos = _read_varint(buf, pos)
+            _parse_context(buf, pos, pos + length, frame.context)
+            pos += length
+        elif field == FRAME_TIMESTAMP_MICROS and wire_type == VARINT:
+            value, pos = _read_varint(buf, pos)
+            frame.timestamp_micros = _to_int64(value)
+        else:
+            # images (camera JPEGs), pose, lasers, labels, ... are jumped over, never copied
+            pos = _skip_field(buf, pos, wire_type)
+
+def parse_kinematics(record, include_future=True):
+    """
+    Extracts the kinematic fields of a serialized E2EDFrame without parsing the camera images.
+
+    :param record: Serialized E2EDFrame (bytes, bytearray or memoryview)
+    :param include_future: Also extract future_states (set False to skip them too)
+    :return: KinematicsFrame
+    """
+    buf = memoryview(record)
+    if buf.ndim != 1 or buf.itemsize != 1:
+        buf = buf.cast('B')
+
+    result = KinematicsFrame()
+    pos = 0
+    end = len(buf)
+
+    while pos < end:
+        tag, pos = _read_varint(buf, pos)
+        field, wire_type = tag >> 3, tag & 7
+
+        if wire_type == LENGTH_DELIMITED and field in (E2ED_FRAME, E2ED_PAST_STATES, E2ED_FUTURE_STATES):
+            length, pos = _read_varint(buf, pos)
+            sub_end = pos + length
+            if field == E2ED_FRAME:
+                _parse_frame(buf, pos, sub_end, result.frame)
+            elif field == E2ED_PAST_STATES:
+                _parse_states(buf, pos, sub_end, result.past_states)
+            elif include_future:
+                _parse_states(buf, pos, sub_end, result.future_states)
+            pos = sub_end
+        elif field == E2ED_INTENT and wire_type == VARINT:
+            value, pos = _read_varint(buf, pos)
+            result.intent = _to_int64(value)
+        else:
+            pos = _skip_field(buf, pos, wire_type)
+
+    if pos != end:
+        raise ValueError("Truncated E2EDFrame record")
+
+    return result
@@ -0,0 +1,381 @@
+### ECE143 Final Project Group 4
+### Waymo E2E Driving Analysis - Incremental Per-Segment Analysis
+
+# Consecutive frames of a driving segment carry sliding past_states windows that overlap
+# in all but the newest timestep(s). IncrementalAnalyzer keeps, per segment, the raw window,
+# its per-timestep intermediates (speed, longitudinal/lateral acceleration, jerk, lateral
+# displacement) and the running state of the window reductions. When a new window starts
+# with the tail of the previous one, only the appended timesteps are computed (as NumPy
+# scalars, with the same operations and dtype as the array code) and the reductions are
+# updated in O(new timesteps): peaks with monotonic deques, event counts with running counters.
+# Otherwise the window is recomputed in full (the running state is then only built once the
+# next frame actually extends it, so unrelated frames cost the same as analyze_driving_behavior).
+#
+# The three float sums (mean speed, total and net lateral displacement) are still re-reduced
+# over the cached window: NumPy's pairwise summation depends on the window layout, so running
+# sums would drift from the full recomputation in the last bits. Windows holding a NaN are
+# always recomputed in full, since the deques cannot order them the way np.max does.
+
+import re
+from collections import OrderedDict, deque
+
+import numpy as np
+
+from data.scenario_classification import (STATE_FIELDS, analyze_driving_behavior, interaction_score,
+                                          metrics_record, reduce_window)
+
+def default_segment_key(scene_id):
+    """
+    Segment of a frame: its context.name without a trailing '-<frame number>'.
+    Only used to find the cached window to compare against; reuse requires an
+    exact data match, so a coarse key never changes results.
+    """
+    return re.sub(r'-\d+$', '', scene_id)
+
+# Rows of the stacked (6, T) window, in STATE_FIELDS order
+POS_X, POS_Y, VEL_X, VEL_Y, ACCEL_X, ACCEL_Y = range(len(STATE_FIELDS))
+
+def step_values(raw):
+    """
+    Per-timestep values of a block of timesteps (step 2 of analyze_driving_behavior).
+
+    :param raw: (6, n) block of past states
+    :return: (3, n) array: speeds, long_accels, lat_accels
+    """
+    vel_x, vel_y = raw[VEL_X], raw[VEL_Y]
+    steps = np.zeros((3, raw.shape[1]), dtype=raw.dtype)
+    speeds = np.sqrt(vel_x**2 + vel_y**2, out=steps[0])
+    moving_mask = speeds > 1.0
+
+    if moving_mask.all():
+        # Same elementwise expressions, without the masked copies
+        vx_norm = vel_x / speeds
+        vy_norm = vel_y / speeds
+        ax, ay = raw[ACCEL_X], raw[ACCEL_Y]
+        steps[1] = ax * vx_norm + ay * vy_norm
+        steps[2] = ax * (-vy_norm) + ay * vx_norm
+    elif moving_mask.any():
+        vx_norm = vel_x[moving_mask] / speeds[moving_mask]
+        vy_norm = vel_y[moving_mask] / speeds[moving_mask]
+        ax = raw[ACCEL_X][moving_mask]
+        ay = raw[ACCEL_Y][moving_mask]
+        steps[1, moving_mask] = ax * vx_norm + ay * vy_norm
+        steps[2, moving_mask] = ax * (-vy_norm) + ay * vx_norm
+    return steps
+
+def pair_values(raw, steps):
+    """
+    Values between consecutive timesteps of a block (steps 3-4 of analyze_driving_behavior).
+
+    :param raw: (6, n) block of past states
+    :param steps: (3, n) per-timestep values of the same block
+    :return: (3, n - 1) array: long_jerk, lat_jerk, lateral_moves_m
+    """
+    pairs = np.zeros((3, raw.shape[1] - 1), dtype=raw.dtype)
+    # np.diff(a) is a[1:] - a[:-1]
+    np.divide(steps[1:, 1:] - steps[1:, :-1], 0.25, out=pairs[:2])
+
+    dx, dy = raw[POS_X:POS_Y + 1, 1:] - raw[POS_X:POS_Y + 1, :-1]
+    # Equal to sqrt(v_step_x**2 + v_step_y**2) of the previous timesteps
+    speed_step = steps[0, :-1]
+    step_mask = speed_step > 1.0
+
+    if step_mask.any():
+        vx_n = raw[VEL_X, :-1][step_mask] / speed_step[step_mask]
+        vy_n = raw[VEL_Y, :-1][step_mask] / speed_step[step_mask]
+        pairs[2, step_mask] = (dx[step_mask] * -vy_n) + (dy[step_mask] * vx_n)
+    return pairs
+
+def frame_window(data):
+    """
+    Stacked past_states window of a frame.
+
+    :param data: Parsed E2EDFrame (or KinematicsFrame)
+    :return: (6, T) array, or None for frames analyze_driving_behavior skips (fewer than
+             2 states) or whose state fields differ in length or dtype
+    """
+    if not hasattr(data, 'past_states') or len(data.past_states.pos_x) < 2:
+        return None
+    fields = [np.array(getattr(data.past_states, name)) for name in STATE_FIELDS]
+    if len({len(values) for values in fields}) > 1 or len({values.dtype for values in fields}) > 1:
+        return None
+    # Equal lengths and dtypes: np.array stacks them like np.stack, with less overhead
+    return np.array(fields)
+
+def analyze_with_series(data):
+    """
+    analyze_driving_behavior(data) plus the per-timestep series it reduces (see data.series_store),
+    from one pass over the window.
+
+    :param data: Parsed E2EDFrame (or KinematicsFrame)
+    :return: (metrics dict or None, ((3, T) steps, (3, T - 1) pairs) or None)
+    """
+    raw = frame_window(data)
+    if raw is None:
+        # Too short, or irregular frame: no stacked window, analyze it on its own
+        return analyze_driving_behavior(data), None
+    steps = step_values(raw)
+    pairs = pair_values(raw, steps)
+    metrics = reduce_window(*steps, *pairs, data.intent)
+    return metrics_record(metrics, data.frame.context.name, data.frame.timestamp_micros, data.intent), (steps, pairs)
+
+class _SlidingMax:
+    """
+    Maximum of a sliding window of (index, value) pairs: a deque of decreasing values,
+    so that pushing a value and dropping the oldest ones is amortized O(1).
+    """
+    __slots__ = ('_items',)
+
+    def __init__(self):
+        self._items = deque()
+
+    def push(self, index, value):
+        items = self._items
+        while items and items[-1][1] <= value:
+            items.pop()
+        items.append((index, value))
+
+    def drop_before(self, index):
+        items = self._items
+        while items and items[0][0] < index:
+            items.popleft()
+
+    @property
+    def value(self):
+        return self._items[0][1]
+
+class _SegmentState:
+    __slots__ = ('raw', 'steps', 'pairs', 'start', 'peaks', 'flags', 'counts')
+
+    def __init__(self, raw, steps, pairs):
+        self.raw = raw      # (6, T) past_states
+        self.steps = steps  # (3, T) speeds, long_accels, lat_accels
+        self.pairs = pairs  # (3, T - 1) long_jerk, lat_jerk, lateral_moves_m
+        self.start = 0      # Segment timestep of the first window column (deque indices)
+        # Running reductions, None until init_reductions (and for windows holding a NaN)
+        self.peaks = None   # _SlidingMax of long_accels, -long_accels, |lat_accels|, |long_jerk|, |lat_jerk|
+        self.flags = None   # Per-timestep (deceleration, acceleration, lateral event) flags
+        self.counts = None  # Their sums over the window
+
+    def init_reductions(self):
+        """Builds the running reductions from the cached window (O(T)); no-op if it holds a NaN."""
+        if np.isnan(self.steps).any() or np.isnan(self.pairs).any():
+            return
+        self.peaks = [_SlidingMax() for _ in range(5)]
+        self.flags = []
+        for t, (speed, long_accel, lat_accel) in enumerate(zip(*self.steps)):
+            self._push_step(t, speed, long_accel, lat_accel)
+        for t, (long_jerk, lat_jerk, _) in enumerate(zip(*self.pairs)):
+            self._push_pair(t, long_jerk, lat_jerk)
+        self.counts = [sum(column) for column in zip(*self.flags)]
+
+    def _push_step(self, t, speed, long_accel, lat_accel):
+        abs_lat = abs(lat_accel)
+        self.peaks[0].push(t, long_accel)
+        self.peaks[1].push(t, -long_accel)
+        self.peaks[2].push(t, abs_lat)
+        self.flags.append((int(long_accel < -0.1), int(long_accel > 0.1), int((abs_lat > 1.0) & (speed > 2.0))))
+
+    def _push_pair(self, t, long_jerk, lat_jerk):
+        self.peaks[3].push(t, abs(long_jerk))
+        self.peaks[4].push(t, abs(lat_jerk))
+
+    def window_metrics(self, ego_intent):
+        """
+        Same dict as reduce_window over the cached window: peaks and counts from the
+        running state, the float sums re-reduced.
+        """
+        # ndarray methods: the same reductions as np.mean / np.sum, without the wrappers
+        speeds = self.steps[0]
+        lateral_moves_m = self.pairs[2]
+        max_brake = -self.peaks[1].value
+        max_lat_g = self.peaks[2].value
+        max_long_jerk = self.peaks[3].value
+        num_lat_events = np.int64(self.counts[2])
+        avg_speed = speeds.mean()
+
+        return {
+            'avg_speed_ms': avg_speed,
+            'num_decelerations': self.counts[0],
+            'num_accelerations': self.counts[1],
+            'num_lateral_frames': num_lat_events,
+            'max_braking': max_brake,
+            'max_acceleration': self.peaks[0].value,
+            'max_lateral_accel': max_lat_g,
+            'max_long_jerk': max_long_jerk,
+            'max_lat_jerk': self.peaks[4].value,
+            'total_lateral_dist_m': np.abs(lateral_moves_m).sum(),
+            'net_lateral_dist_m': np.abs(lateral_moves_m.sum()),
+            'interaction_score': interaction_score(max_brake, max_lat_g, max_long_jerk, num_lat_events,
+                                                   avg_speed, ego_intent),
+        }
+
+def _find_overlap(prev_raw, raw):
+    """
+    Largest k such that the first k timesteps of the new window equal the last k of the
+    previous one (all state fields, same bytes). 0 if there is no such overlap.
+    """
+    if prev_raw.dtype != raw.dtype:
+        return 0
+    prev_len, new_len = prev_raw.shape[1], raw.shape[1]
+    itemsize = raw.dtype.itemsize
+    prev_pos_x = prev_raw[POS_X].tobytes()
+    first = raw[POS_X, :1].tobytes()
+    # Candidate shifts (the first pos_x in the previous window), largest overlap first
+    index = prev_pos_x.find(first)
+    while index >= 0:
+        shift, misaligned = divmod(index, itemsize)
+        k = prev_len - shift
+        if not misaligned and k <= new_len and prev_raw[:, shift:].tobytes() == raw[:, :k].tobytes():
+            return k
+        index = prev_pos_x.find(first, index + 1)
+    return 0
+
+class IncrementalAnalyzer:
+    """
+    Segment-aware drop-in for analyze_driving_behavior: same input, same output dict,
+    bit-identical values, but timesteps shared with the previous frame of the segment
+    are not recomputed and the window reductions are updated in O(new timesteps).
+    """
+
+    def __init__(self, segment_key=default_segment_key, max_segments=64):
+        """
+        :param segment_key: Function scene_id -> segment key
+        :param max_segments: Number of segments whose state is kept (least recently used are dropped)
+        """
+        self.segment_key = segment_key
+        self.max_segments = max_segments
+        self._segments = OrderedDict()
+        self.stats = {'full': 0, 'incremental': 0, 'computed_steps': 0, 'reused_steps': 0}
+
+    def reset(self):
+        """Drops all per-segment state."""
+        self._segments.clear()
+
+    def _full(self, raw):
+        steps = step_values(raw)
+        state = _SegmentState(raw, steps, pair_values(raw, steps))
+        self.stats['full'] += 1
+        self.stats['computed_steps'] += raw.shape[1]
+        return state
+
+    def _extend(self, prev, raw, overlap):
+        """
+        Appends the timesteps of raw after the overlap to the previous window and slides its
+        running reductions. Returns None if a new value is NaN (the caller then recomputes the
+        window in full; prev is discarded either way, so it is updated in place).
+        """
+        length = raw.shape[1]
+        shift = prev.raw.shape[1] - overlap
+        # Last shared timestep, the left end of the first new pair
+        last = overlap - 1
+        zero = raw.dtype.type(0)
+
+        state = _SegmentState(raw, np.empty((3, length), dtype=raw.dtype), np.empty((3, length - 1), dtype=raw.dtype))
+        state.steps[:, :overlap] = prev.steps[:, shift:]
+        state.pairs[:, :last] = prev.pairs[:, shift:]
+
+        # Drop the first shift timesteps from the running reductions
+        state.start = start = prev.start + shift
+        state.peaks = prev.peaks
+        for peak in state.peaks:
+            peak.drop_before(start)
+        counts = prev.counts
+        for dropped in prev.flags[:shift]:
+            counts = [count - flag for count, flag in zip(counts, dropped)]
+        state.flags = prev.flags[shift:]
+
+        prev_speed, prev_long, prev_lat = state.steps[0, last], state.steps[1, last], state.steps[2, last]
+        prev_px, prev_py, prev_vx, prev_vy = raw[POS_X, last], raw[POS_Y, last], raw[VEL_X, last], raw[VEL_Y, last]
+        for t in range(overlap, length):
+            px, py, vx, vy, ax, ay = (raw[POS_X, t], raw[POS_Y, t], raw[VEL_X, t], raw[VEL_Y, t],
+                                      raw[ACCEL_X, t], raw[ACCEL_Y, t])
+
+            # Step 2 of analyze_driving_behavior for one timestep
+            speed = np.sqrt(vx * vx + vy * vy)
+            if speed > 1.0:
+                vx_norm = vx / speed
+                vy_norm = vy / speed
+                long_accel = ax * vx_norm + ay * vy_norm
+                lat_accel = ax * (-vy_norm) + ay * vx_norm
+            else:
+                long_accel = lat_accel = zero
+
+            # Steps 3-4 between the previous timestep and this one
+            long_jerk = (long_accel - prev_long) / 0.25
+            lat_jerk = (lat_accel - prev_lat) / 0.25
+            if prev_speed > 1.0:
+                vx_n = prev_vx / prev_speed
+                vy_n = prev_vy / prev_speed
+                lateral_move = ((px - prev_px) * -vy_n) + ((py - prev_py) * vx_n)
+            else:
+                lateral_move = zero
+
+            # Any NaN (or inf - inf) makes the sum NaN
+            total = speed + long_accel + lat_accel + long_jerk + lat_jerk + lateral_move
+            if total != total:
+                return None
+
+            state.steps[:, t] = speed, long_accel, lat_accel
+            state.pairs[:, t - 1] = long_jerk, lat_jerk, lateral_move
+            state._push_step(start + t, speed, long_accel, lat_accel)
+            state._push_pair(start + t - 1, long_jerk, lat_jerk)
+            counts = [count + flag for count, flag in zip(counts, state.flags[-1])]
+
+            prev_speed, prev_long, prev_lat = speed, long_accel, lat_accel
+            prev_px, prev_py, prev_vx, prev_vy = px, py, vx, vy
+        state.counts = counts
+
+        self.stats['incremental'] += 1
+        self.stats['computed_steps'] += int(length - overlap)
+        self.stats['reused_steps'] += int(overlap)
+        return state
+
+    def analyze(self, data):
+        """
+        Same as analyze_driving_behavior(data).
+
+        :param data: Parsed E2EDFrame (or KinematicsFrame)
+        :return: Metrics dict, or None for frames without enough history
+        """
+        return self.analyze_with_series(data)[0]
+
+    __call__ = analyze
+
+    def analyze_with_series(self, data):
+        """
+        analyze() plus the per-timestep series of the window (see data.series_store),
+        which the analysis computes anyway.
+
+        :param data: Parsed E2EDFrame (or KinematicsFrame)
+        :return: (metrics dict or None, ((3, T) steps, (3, T - 1) pairs) or None)
+        """
+        raw = frame_window(data)
+        if raw is None:
+            # Too short, or irregular frame: no stacked window, analyze it on its own
+            return analyze_driving_behavior(data), None
+
+        scene_id = data.frame.context.name
+        key = self.segment_key(scene_id)
+        # Taken out while it is updated, so an exception leaves no half-updated state behind
+        prev = self._segments.pop(key, None)
+        overlap = _find_overlap(prev.raw, raw) if prev is not None else 0
+        if overlap and prev.peaks is None:
+            # Running reductions are only built once a window is actually extended
+            prev.init_reductions()
+            if prev.peaks is None:
+                overlap = 0
+
+        state = self._extend(prev, raw, overlap) if overlap >= 1 else None
+        if state is None:
+            state = self._full(raw)
+        self._segments[key] = state
+        if len(self._segments) > self.max_segments:
+            self._segments.popitem(last=False)
+
+        if state.peaks is None:
+            # Full recomputation: reductions over the arrays, as analyze_driving_behavior does
+            metrics = reduce_window(*state.steps, *state.pairs, data.intent)
+        else:
+            metrics = state.window_metrics(data.intent)
+        return metrics_record(metrics, scene_id, data.frame.timestamp_micros, data.intent), (state.steps, state.pairs)
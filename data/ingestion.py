@@ -0,0 +1,284 @@
+### ECE143 Final Project Group 4
+### Waymo E2E Driving Analysis - Parallel Multi-Shard Ingestion
+
+import glob
+import multiprocessing as mp
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from functools import partial
+
+from data.fast_parse import parse_kinematics
+from data.incremental_analysis import IncrementalAnalyzer, analyze_with_series
+from data.metrics_cache import analysis_version, load_cached_shard, store_cached_shard
+from data.metrics_table import MetricsTable
+from data.record_index import save_record_index
+from data.scenario_classification import analyze_driving_behavior, classify_scenario
+from data.series_store import SeriesWriter, shard_store_path
+from data.telemetry import PipelineTelemetry
+from data.tfrecord import iter_records
+from src.streaming_stats import ScoreSummary, TopKEvents
+
+def list_shards(shard_pattern):
+    """
+    Expands a glob pattern (or list of paths) into a sorted list of shard paths.
+
+    :param shard_pattern: Glob pattern string, e.g. DATASET_DIR + '*.tfrecord-*', or a list of paths
+    :return: Sorted list of shard paths
+    """
+    if isinstance(shard_pattern, str):
+        return sorted(glob.glob(shard_pattern))
+    return sorted(shard_pattern)
+
+def process_shard(shard_path, num_samples=None, fast_parse=True, top_k=100, keep_rows=True, as_table=False,
+                  telemetry_path=None, incremental=False, series_dir=None):
+    """
+    Parses, analyzes and classifies the records of a single TFRecord shard.
+    This is the unit of work of a pool worker.
+
+    :param shard_path: Path to the TFRecord shard
+    :param num_samples: Max number of records to read from this shard (None = all)
+    :param fast_parse: Use the kinematics-only parser (skips camera images) instead of E2EDFrame.ParseFromString
+    :param top_k: Size of the top-K selector of the most critical events (by interaction_score)
+    :param keep_rows: Keep every metrics row; if False only the streaming summaries are returned
+    :param as_table: Collect the rows in a MetricsTable instead of a list of dicts
+    :param telemetry_path: If set, per-stage telemetry snapshots are appended to this JSON-lines file
+    :param incremental: Reuse the past_states overlap of consecutive frames of a segment
+                        (data.incremental_analysis; identical metrics)
+    :param series_dir: If set, the per-timestep series of every analyzed frame are written to a
+                       memory-mapped store in series_dir/<shard name> (see data.series_store)
+    :return: dict with 'shard', 'all_metrics', 'scenario_counts', 'score_summary', 'top_events',
+             'record_index', 'num_records', 'num_errors', 'telemetry' (PipelineTelemetry)
+    """
+    if not fast_parse:
+        # Full protobuf parse, only imported when requested
+        from waymo_open_dataset.protos import end_to_end_driving_data_pb2 as wod_e2ed_pb2
+
+    all_metrics = MetricsTable() if as_table else []
+    scenario_counts = defaultdict(int)
+    score_summary = ScoreSummary()
+    top_events = TopKEvents(top_k)
+    record_index = {}
+    num_records = 0
+    num_errors = 0
+
+    # (metrics, series) per frame; the series come out of the same pass as the metrics
+    if incremental:
+        analyze = IncrementalAnalyzer().analyze_with_series
+    elif series_dir:
+        analyze = analyze_with_series
+    else:
+        analyze = lambda data: (analyze_driving_behavior(data), None)
+    telemetry = PipelineTelemetry(os.path.basename(shard_path), telemetry_path).start()
+
+    # The series store is moved into place only if the whole shard was read;
+    # on an exception outside the per-record handling (e.g. a truncated shard) it is discarded
+    series_store = SeriesWriter(shard_store_path(series_dir, shard_path), shard_path) if series_dir else nullcontext()
+    with series_store as series_writer:
+        for idx, (offset, bytes_example) in enumerate(iter_records(shard_path, num_samples)):
+            telemetry.lap('read', len(bytes_example))
+            num_records += 1
+
+            try:
+                if fast_parse:
+                    data = parse_kinematics(bytes_example, include_future=False)
+                else:
+                    data = wod_e2ed_pb2.E2EDFrame()
+                    data.ParseFromString(bytes_example)
+                telemetry.lap('parse')
+
+                location = (shard_path, offset, len(bytes_example))
+                record_index[data.frame.context.name] = location
+
+                # Analysis
+                metrics, series = analyze(data)
+                telemetry.lap('analyze')
+
+                if metrics:
+                    # Classification
+                    scenario = classify_scenario(metrics)
+                    metrics['scenario'] = scenario
+                    metrics['shard'] = os.path.basename(shard_path)
+                    telemetry.lap('classify')
+
+                    # Store (series first: if it fails, the frame is in neither store)
+                    if series_writer is not None and series is not None:
+                        series_writer.append(data.frame.context.name, *series)
+                    scenario_counts[scenario] += 1
+                    score_summary.update(metrics)
+                    top_events.push(metrics, location)
+                    if keep_rows:
+                        all_metrics.append(metrics)
+                    telemetry.lap('store')
+
+            except Exception as e:
+                num_errors += 1
+                stage = telemetry.error(e)
+                print(f"Error record {idx} in {os.path.basename(shard_path)} ({stage}): {type(e).__name__}: {e}")
+                continue
+
+    telemetry.stop()
+
+    return {
+        'shard': shard_path,
+        'all_metrics': all_metrics,
+        'scenario_counts': dict(scenario_counts),
+        'score_summary': score_summary,
+        'top_events': top_events,
+        'record_index': record_index,
+        'num_records': num_records,
+        'num_errors': num_errors,
+        'telemetry': telemetry,
+    }
+
+def rebuild_summaries(result, top_k=100):
+    """
+    Recomputes the streaming summaries of a shard result that was stored without them
+    (metrics cache, resumable runs). Rows are replayed in order, which gives the same
+    sketch and top-K as the original pass.
+
+    :param result: dict with 'all_metrics' and 'record_index'
+    :param top_k: Size of the top-K selector
+    :return: The same dict with 'score_summary' and 'top_events'
+    """
+    result['score_summary'] = ScoreSummary()
+    result['top_events'] = TopKEvents(top_k)
+    for metrics in result['all_metrics']:
+        result['score_summary'].update(metrics)
+        result['top_events'].push(metrics, result['record_index'].get(metrics['scene_id']))
+    return result
+
+def merge_shard_results(shard_results, top_k=100, as_table=False):
+    """
+    Merges per-shard partial results. Shards are merged in sorted path order,
+    so the output does not depend on which worker finished first.
+
+    :param shard_results: Iterable of dicts returned by process_shard
+    :param top_k: Size of the merged top-K selector
+    :param as_table: Merge the rows into a MetricsTable (parts may be lists or tables)
+    :return: dict with merged 'all_metrics', 'scenario_counts', 'score_summary', 'top_events',
+             'record_index', 'num_records', 'num_errors', 'shards', 'telemetry'
+             (cached shards have no telemetry)
+    """
+    all_metrics = MetricsTable() if as_table else []
+    scenario_counts = defaultdict(int)
+    score_summary = ScoreSummary()
+    top_events = TopKEvents(top_k)
+    record_index = {}
+    num_records = 0
+    num_errors = 0
+    shards = []
+    telemetry = PipelineTelemetry()
+
+    for result in sorted(shard_results, key=lambda r: r['shard']):
+        shards.append(result['shard'])
+        if isinstance(result['all_metrics'], MetricsTable):
+            all_metrics.extend_table(result['all_metrics'])
+        else:
+            all_metrics.extend(result['all_metrics'])
+        for scenario, count in result['scenario_counts'].items():
+            scenario_counts[scenario] += count
+        score_summary.merge(result['score_summary'])
+        top_events.merge(result['top_events'])
+        record_index.update(result['record_index'])
+        num_records += result['num_records']
+        num_errors += result['num_errors']
+        if result.get('telemetry') is not None:
+            telemetry.merge(result['telemetry'])
+
+    return {
+        'all_metrics': all_metrics,
+        'scenario_counts': scenario_counts,
+        'score_summary': score_summary,
+        'top_events': top_events,
+        'record_index': record_index,
+        'num_records': num_records,
+        'num_errors': num_errors,
+        'shards': shards,
+        'telemetry': telemetry,
+    }
+
+def ingest_shards(shard_pattern, num_workers=None, num_samples=None, fast_parse=True, index_path=None,
+                  cache_dir=None, top_k=100, keep_rows=True, as_table=False, telemetry_path=None,
+                  incremental=False, series_dir=None):
+    """
+    Spreads a set of TFRecord shards across a process pool; each worker parses,
+    analyzes and classifies one shard at a time.
+
+    :param shard_pattern: Glob pattern string or list of shard paths
+    :param num_workers: Number of worker processes (None = os.cpu_count(), 1 = run in-process)
+    :param num_samples: Per-shard record limit (None = all records)
+    :param fast_parse: Use the kinematics-only parser, see process_shard
+    :param index_path: If set, the scene_id -> record location index is saved here
+                       (see data.record_index; used by trajectory_visualization)
+    :param cache_dir: If set, per-shard results are loaded from / stored to this metrics cache
+                      (see data.metrics_cache); only new or invalidated shards are processed
+    :param top_k: Number of most critical events kept in results['top_events']
+    :param keep_rows: Keep all metrics rows. With False, a full-dataset risk scan only keeps the
+                      streaming summaries and top-K events (the record index still has one entry per record)
+    :param as_table: Return results['all_metrics'] as a compact MetricsTable instead of a list of dicts
+    :param telemetry_path: If set, every worker streams telemetry snapshots to this JSON-lines file.
+                           results['telemetry'] always holds the merged per-stage timings
+                           (stage times summed over workers, wall time of the whole run)
+    :param incremental: Analyze consecutive frames of a segment incrementally, see process_shard
+    :param series_dir: If set, every shard writes its per-timestep series store here, see process_shard
+                       (cached shards are only skipped if their store exists)
+    :return: Merged results, see merge_shard_results
+    """
+    if cache_dir is not None and not keep_rows:
+        raise ValueError("cache_dir requires keep_rows=True (the cache stores the metrics rows)")
+
+    start_time = time.perf_counter()
+    shard_paths = list_shards(shard_pattern)
+    if not shard_paths:
+        print(f"Warning: No shards matched {shard_pattern}")
+        return merge_shard_results([], top_k, as_table)
+
+    cached_results = []
+    if cache_dir is not None:
+        version = analysis_version()
+        for path in shard_paths:
+            result = load_cached_shard(cache_dir, path, num_samples, version)
+            if result is not None and (series_dir is None or os.path.exists(shard_store_path(series_dir, path))):
+                cached_results.append(rebuild_summaries(result, top_k))
+        cached_paths = {result['shard'] for result in cached_results}
+        shard_paths = [path for path in shard_paths if path not in cached_paths]
+        print(f"Loaded {len(cached_results)} shards from cache {cache_dir}")
+
+    shard_results = []
+    if shard_paths:
+        num_workers = min(num_workers or os.cpu_count() or 1, len(shard_paths))
+        print(f"Processing {len(shard_paths)} shards with {num_workers} workers...")
+
+        # The cache stores full-precision rows, so tables are only built in the workers without it
+        worker = partial(process_shard, num_samples=num_samples, fast_parse=fast_parse,
+                         top_k=top_k, keep_rows=keep_rows, as_table=as_table and cache_dir is None,
+                         telemetry_path=telemetry_path, incremental=incremental, series_dir=series_dir)
+
+        if num_workers == 1:
+            shard_results = [worker(path) for path in shard_paths]
+        else:
+            # 'spawn' so that workers start from a clean interpreter
+            ctx = mp.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=num_workers, mp_context=ctx) as executor:
+                shard_results = list(executor.map(worker, shard_paths))
+
+        if cache_dir is not None:
+            for result in shard_results:
+                store_cached_shard(cache_dir, result, num_samples, version)
+
+    results = merge_shard_results(cached_results + shard_results, top_k, as_table)
+    # Workers run concurrently: rates are reported against the elapsed time of the run
+    results['telemetry'].wall_seconds = time.perf_counter() - start_time
+    results['telemetry'].source = 'ingest_shards'
+    if telemetry_path is not None:
+        results['telemetry'].jsonl_path = telemetry_path
+        results['telemetry'].write_snapshot(final=True)
+
+    if index_path is not None:
+        save_record_index(results['record_index'], index_path)
+        print(f"Saved record index ({len(results['record_index'])} scenes) to {index_path}")
+
+    return results
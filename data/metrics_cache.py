@@ -0,0 +1,281 @@
+### ECE143 Final Project Group 4
+### Waymo E2E Driving Analysis - Persistent Per-Shard Metrics Cache
+
+# One compressed NPZ file of metric columns per shard, plus a JSON manifest.
+# An entry is keyed by the shard path, its size and mtime, the per-shard record
+# limit and a hash of the code that produces the rows (parser, analysis and
+# classification modules, plus CACHE_FORMAT), so editing any of them (or replacing
+# a shard) invalidates it automatically. A hit only touches the entry's file mtime,
+# which is what LRU eviction goes by; the manifest is written on stores only.
+
+import hashlib
+import inspect
+import json
+import os
+import time
+
+import numpy as np
+
+from data import fast_parse, incremental_analysis, scenario_classification
+
+MANIFEST_NAME = 'manifest.json'
+
+# Bump when the rows assembled by process_shard change outside the hashed modules
+# (e.g. the 'scenario'/'shard' columns added in data.ingestion)
+CACHE_FORMAT = 2
+
+def analysis_version():
+    """
+    Hash of the code behind a cached row: the kinematics parser, the (incremental)
+    analysis, the classifier and CACHE_FORMAT.
+
+    :return: Short hex digest
+    """
+    modules = [fast_parse, incremental_analysis, scenario_classification]
+    source = ''.join(inspect.getsource(module) for module in modules) + f"format={CACHE_FORMAT}"
+    return hashlib.sha1(source.encode('utf-8')).hexdigest()[:16]
+
+def shard_cache_key(shard_path, num_samples=None, version=None):
+    """
+    Cache key of one shard: path + size + mtime + record limit + analysis version.
+
+    :return: (key, key_fields) - hex key and the dict it was derived from
+    """
+    stat = os.stat(shard_path)
+    fields = {
+        'shard': os.path.abspath(shard_path),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'num_samples': num_samples,
+        'version': version or analysis_version(),
+    }
+    key = hashlib.sha1(json.dumps(fields, sort_keys=True).encode('utf-8')).hexdigest()[:24]
+    return key, fields
+
+def rows_to_columns(rows):
+    """
+    Converts a list of metrics dicts into a dict of NumPy columns.
+
+    :param rows: List of dicts with identical keys
+    :return: dict column name -> array
+    """
+    if not rows:
+        return {}
+    return {name: np.array([row[name] for row in rows]) for name in rows[0]}
+
+def columns_to_rows(columns):
+    """
+    Inverse of rows_to_columns (values come back as plain Python ints/floats/strs).
+
+    :param columns: dict column name -> array
+    :return: List of metrics dicts
+    """
+    if not columns:
+        return []
+    names = list(columns)
+    values = [columns[name].tolist() for name in names]
+    return [dict(zip(names, row)) for row in zip(*values)]
+
+def write_rows_npz(path, rows, index, num_records, num_errors, scenario_counts=None):
+    """
+    Writes metrics rows and their record offsets as one compressed NPZ file (atomic replace).
+    Shared by the metrics cache and the part files of data.batch_runner.
+
+    :param path: Output path ending in '.npz'
+    :param rows: List of metrics dicts
+    :param index: dict scene_id -> (offset, length) of the records in their shard
+    :param num_records: Records read
+    :param num_errors: Records that failed
+    :param scenario_counts: Optional dict scenario -> frame count
+    """
+    columns = rows_to_columns(rows)
+    arrays = {'metric.' + name: values for name, values in columns.items()}
+    arrays['metric_columns'] = np.array(list(columns), dtype=str)
+    arrays['index.scene_id'] = np.array(list(index), dtype=str)
+    arrays['index.offset'] = np.array([loc[0] for loc in index.values()], dtype=np.int64)
+    arrays['index.length'] = np.array([loc[1] for loc in index.values()], dtype=np.int64)
+    if scenario_counts is not None:
+        arrays['counts.scenario'] = np.array(list(scenario_counts), dtype=str)
+        arrays['counts.count'] = np.array(list(scenario_counts.values()), dtype=np.int64)
+    arrays['num_records'] = np.int64(num_records)
+    arrays['num_errors'] = np.int64(num_errors)
+
+    tmp_path = path[:-len('.npz')] + '.tmp.npz'
+    np.savez_compressed(tmp_path, **arrays)
+    os.replace(tmp_path, path)
+
+def read_rows_npz(path):
+    """
+    Reads a file written by write_rows_npz.
+
+    :param path: NPZ file path
+    :return: dict with 'all_metrics', 'index' (list of (scene_id, offset, length)),
+             'scenario_counts' (None if not stored), 'num_records', 'num_errors'
+    """
+    with np.load(path, allow_pickle=False) as npz:
+        names = npz['metric_columns'].tolist()
+        counts = None
+        if 'counts.scenario' in npz:
+            counts = dict(zip(npz['counts.scenario'].tolist(), npz['counts.count'].tolist()))
+        return {
+            'all_metrics': columns_to_rows({name: npz['metric.' + name] for name in names}),
+            'index': list(zip(npz['index.scene_id'].tolist(), npz['index.offset'].tolist(),
+                              npz['index.length'].tolist())),
+            'scenario_counts': counts,
+            'num_records': int(npz['num_records']),
+            'num_errors': int(npz['num_errors']),
+        }
+
+def _load_manifest(cache_dir):
+    path = os.path.join(cache_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def _save_manifest(cache_dir, manifest):
+    path = os.path.join(cache_dir, MANIFEST_NAME)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def load_cached_shard(cache_dir, shard_path, num_samples=None, version=None):
+    """
+    Returns the cached result of process_shard for this shard, or None on a miss.
+
+    :param cache_dir: Cache directory
+    :param shard_path: Path to the TFRecord shard
+    :param num_samples: Per-shard record limit used for the run
+    :param version: Analysis version (defaults to analysis_version())
+    :return: dict in the process_shard format, or None
+    """
+    key, _ = shard_cache_key(shard_path, num_samples, version)
+    manifest = _load_manifest(cache_dir)
+    entry = manifest.get(key)
+    if entry is None:
+        return None
+
+    path = os.path.join(cache_dir, entry['file'])
+    if not os.path.exists(path):
+        return None
+
+    part = read_rows_npz(path)
+
+    try:
+        # Mark as recently used for evict_cache
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+
+    return {
+        'shard': shard_path,
+        'all_metrics': part['all_metrics'],
+        'scenario_counts': part['scenario_counts'],
+        'record_index': {scene_id: (shard_path, offset, length) for scene_id, offset, length in part['index']},
+        'num_records': part['num_records'],
+        'num_errors': part['num_errors'],
+    }
+
+def store_cached_shard(cache_dir, shard_result, num_samples=None, version=None):
+    """
+    Writes one process_shard result to the cache (atomic file replace).
+
+    :param cache_dir: Cache directory (created if missing)
+    :param shard_result: dict returned by process_shard
+    :param num_samples: Per-shard record limit used for the run
+    :param version: Analysis version (defaults to analysis_version())
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    shard_path = shard_result['shard']
+    key, fields = shard_cache_key(shard_path, num_samples, version)
+
+    file_name = key + '.npz'
+    path = os.path.join(cache_dir, file_name)
+    write_rows_npz(path, shard_result['all_metrics'],
+                   {scene_id: loc[1:] for scene_id, loc in shard_result['record_index'].items()},
+                   shard_result['num_records'], shard_result['num_errors'], shard_result['scenario_counts'])
+
+    manifest = _load_manifest(cache_dir)
+    # Drop older entries of the same shard (previous size/mtime/version)
+    for old_key in [k for k, e in manifest.items() if e['shard'] == fields['shard'] and k != key]:
+        _remove_entry(cache_dir, manifest, old_key)
+
+    now = time.time()
+    manifest[key] = dict(fields, file=file_name, bytes=os.path.getsize(path),
+                         num_rows=len(shard_result['all_metrics']), created=now, last_used=now)
+    _save_manifest(cache_dir, manifest)
+
+def _last_used(cache_dir, entry):
+    # Hits bump the file mtime instead of rewriting the manifest
+    try:
+        return os.path.getmtime(os.path.join(cache_dir, entry['file']))
+    except FileNotFoundError:
+        return entry['last_used']
+
+def _remove_entry(cache_dir, manifest, key):
+    entry = manifest.pop(key)
+    path = os.path.join(cache_dir, entry['file'])
+    if os.path.exists(path):
+        os.remove(path)
+
+def cache_info(cache_dir, version=None):
+    """
+    Lists the cache entries and whether each one is still valid.
+
+    :param cache_dir: Cache directory
+    :param version: Analysis version (defaults to analysis_version())
+    :return: List of dicts (one per entry) with 'key', 'shard', 'bytes', 'num_rows', 'last_used', 'valid', ...
+    """
+    version = version or analysis_version()
+    entries = []
+    for key, entry in _load_manifest(cache_dir).items():
+        valid = entry['version'] == version and os.path.exists(entry['shard'])
+        if valid:
+            stat = os.stat(entry['shard'])
+            valid = stat.st_size == entry['size'] and stat.st_mtime_ns == entry['mtime_ns']
+        entries.append(dict(entry, key=key, valid=valid, last_used=_last_used(cache_dir, entry)))
+    return sorted(entries, key=lambda e: e['shard'])
+
+def invalidate_cache(cache_dir, shard_paths=None, stale_only=False, version=None):
+    """
+    Removes cache entries.
+
+    :param cache_dir: Cache directory
+    :param shard_paths: Only remove entries of these shards (None = all shards)
+    :param stale_only: Only remove entries that no longer match their shard or the analysis version
+    :param version: Analysis version (defaults to analysis_version())
+    :return: Number of removed entries
+    """
+    targets = None if shard_paths is None else {os.path.abspath(p) for p in shard_paths}
+    manifest = _load_manifest(cache_dir)
+    removed = 0
+    for entry in cache_info(cache_dir, version):
+        if targets is not None and entry['shard'] not in targets:
+            continue
+        if stale_only and entry['valid']:
+            continue
+        _remove_entry(cache_dir, manifest, entry['key'])
+        removed += 1
+    _save_manifest(cache_dir, manifest)
+    return removed
+
+def evict_cache(cache_dir, max_bytes):
+    """
+    Evicts least recently used entries until the cache fits in max_bytes.
+
+    :param cache_dir: Cache directory
+    :param max_bytes: Size cap in bytes
+    :return: Number of evicted entries
+    """
+    manifest = _load_manifest(cache_dir)
+    total = sum(e['bytes'] for e in manifest.values())
+    evicted = 0
+    for key in sorted(manifest, key=lambda k: _last_used(cache_dir, manifest[k])):
+        if total <= max_bytes:
+            break
+        total -= manifest[key]['bytes']
+        _remove_entry(cache_dir, manifest, key)
+        evicted += 1
+    _save_manifest(cache_dir, manifest)
+    return evicted
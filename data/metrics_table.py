@@ -0,0 +1,232 @@
+### ECE143 Final Project Group 4
+### Waymo E2E Driving Analysis - Columnar Metrics Container
+
+# A struct-of-arrays replacement for the `all_metrics` list of dicts:
+# float32/int columns, uint8 scenario codes and interned scene_id/shard strings.
+# A frame costs ~60 bytes instead of a ~2 KB dict, and the pandas view used by the
+# plotting modules is built once and cached instead of on every plot call.
+
+import numpy as np
+import pandas as pd
+
+from data.scenario_classification import FLOAT_METRICS, SCENARIO_LABELS
+
+FLOAT_DTYPE = np.float32
+INT_COLUMNS = {
+    'timestamp': np.int64,
+    'intent': np.int8,
+    'num_decelerations': np.int16,
+    'num_accelerations': np.int16,
+    'num_lateral_frames': np.int16,
+}
+# String columns stored as integer codes into a per-table list of unique values
+CATEGORICAL_COLUMNS = {
+    'scene_id': np.int32,
+    'scenario': np.uint8,
+    'shard': np.int32,
+}
+
+class MetricsTable:
+    """
+    Growable columnar table of per-frame metrics (same columns as analyze_driving_behavior
+    plus 'scenario' and 'shard'). Accepted by every plotting function in src/.
+    """
+
+    def __init__(self, capacity=1024):
+        self._size = 0
+        self._capacity = capacity
+        self._columns = {}
+        for name in FLOAT_METRICS:
+            self._columns[name] = np.zeros(capacity, dtype=FLOAT_DTYPE)
+        for name, dtype in INT_COLUMNS.items():
+            self._columns[name] = np.zeros(capacity, dtype=dtype)
+        for name, dtype in CATEGORICAL_COLUMNS.items():
+            self._columns[name] = np.zeros(capacity, dtype=dtype)
+
+        # Interned values of the categorical columns; scenario codes follow SCENARIO_LABELS
+        self._categories = {name: [] for name in CATEGORICAL_COLUMNS}
+        self._categories['scenario'] = list(SCENARIO_LABELS)
+        self._lookup = {name: {value: code for code, value in enumerate(values)}
+                        for name, values in self._categories.items()}
+        self._frame = None
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def columns(self):
+        return list(self._columns)
+
+    @property
+    def nbytes(self):
+        """Bytes used by the column buffers (excluding the interned strings)."""
+        return sum(column.nbytes for column in self._columns.values())
+
+    def _reserve(self, extra):
+        needed = self._size + extra
+        if needed <= self._capacity:
+            return
+        capacity = max(needed, self._capacity * 2)
+        for name, column in self._columns.items():
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:self._size] = column[:self._size]
+            self._columns[name] = grown
+        self._capacity = capacity
+
+    def _encode(self, name, value):
+        lookup = self._lookup[name]
+        code = lookup.get(value)
+        if code is None:
+            code = len(self._categories[name])
+            if code > np.iinfo(CATEGORICAL_COLUMNS[name]).max:
+                raise ValueError(f"Too many distinct values for column '{name}'")
+            self._categories[name].append(value)
+            lookup[value] = code
+        return code
+
+    def append(self, metrics):
+        """
+        Appends one metrics dict (as produced by analyze_driving_behavior + 'scenario').
+
+        :param metrics: Metrics dict
+        """
+        self._reserve(1)
+        i = self._size
+        columns = self._columns
+        for name in FLOAT_METRICS:
+            columns[name][i] = metrics[name]
+        for name in INT_COLUMNS:
+            columns[name][i] = metrics[name]
+        for name in CATEGORICAL_COLUMNS:
+            columns[name][i] = self._encode(name, metrics.get(name, ''))
+        self._size += 1
+        self._frame = None
+
+    def extend(self, rows):
+        """
+        Appends a list of metrics dicts.
+
+        :param rows: Iterable of metrics dicts
+        """
+        for metrics in rows:
+            self.append(metrics)
+
+    def extend_columns(self, columns, scenario_codes=None):
+        """
+        Appends whole columns at once, e.g. the output of analyze_driving_behavior_batch
+        (only the 'valid' rows are kept) with codes from classify_scenarios.
+
+        :param columns: dict column name -> array
+        :param scenario_codes: Optional uint8 codes into SCENARIO_LABELS (instead of a 'scenario' column)
+        """
+        valid = np.asarray(columns['valid']) if 'valid' in columns else slice(None)
+        n = len(np.asarray(columns['interaction_score'])[valid])
+        self._reserve(n)
+        start, end = self._size, self._size + n
+
+        for name in FLOAT_METRICS:
+            self._columns[name][start:end] = np.asarray(columns[name])[valid]
+        for name in INT_COLUMNS:
+            if name in columns:
+                self._columns[name][start:end] = np.asarray(columns[name])[valid]
+
+        if scenario_codes is not None:
+            self._columns['scenario'][start:end] = np.asarray(scenario_codes)[valid]
+        for name in CATEGORICAL_COLUMNS:
+            if name == 'scenario' and scenario_codes is not None:
+                continue
+            if name in columns:
+                values = np.asarray(columns[name], dtype=object)[valid]
+            else:
+                values = [''] * n
+            self._columns[name][start:end] = [self._encode(name, value) for value in values]
+
+        self._size = end
+        self._frame = None
+
+    def extend_table(self, other):
+        """
+        Appends all rows of another MetricsTable (categorical codes are remapped).
+
+        :param other: MetricsTable
+        """
+        n = len(other)
+        self._reserve(n)
+        start, end = self._size, self._size + n
+        for name, column in self._columns.items():
+            if name in CATEGORICAL_COLUMNS:
+                remap = np.array([self._encode(name, value) for value in other._categories[name]],
+                                 dtype=column.dtype)
+                column[start:end] = remap[other.codes(name)] if len(remap) else 0
+            else:
+                column[start:end] = other._columns[name][:n]
+        self._size = end
+        self._frame = None
+
+    @classmethod
+    def from_rows(cls, rows):
+        """
+        Builds a table from a list of metrics dicts.
+
+        :param rows: List of metrics dicts
+        :return: MetricsTable
+        """
+        table = cls(capacity=max(len(rows), 1))
+        table.extend(rows)
+        return table
+
+    def __getitem__(self, name):
+        """
+        Column access. Numeric columns are zero-copy views; categorical columns
+        are decoded to an object array.
+        """
+        if name in CATEGORICAL_COLUMNS:
+            return np.asarray(self._categories[name], dtype=object)[self.codes(name)]
+        return self._columns[name][:self._size]
+
+    def codes(self, name):
+        """Raw integer codes of a categorical column."""
+        return self._columns[name][:self._size]
+
+    def categories(self, name):
+        """Values of a categorical column, indexed by code."""
+        return list(self._categories[name])
+
+    def to_frame(self):
+        """
+        pandas view of the table (numeric columns wrap the buffers, strings are Categoricals).
+        Built once and cached until the next append; callers get a shallow copy,
+        so adding columns to it does not touch the cache.
+
+        :return: pd.DataFrame
+        """
+        if self._frame is None:
+            data = {}
+            for name, column in self._columns.items():
+                if name in CATEGORICAL_COLUMNS:
+                    categorical = pd.Categorical.from_codes(column[:self._size], self._categories[name])
+                    data[name] = categorical.remove_unused_categories()
+                else:
+                    data[name] = column[:self._size]
+            self._frame = pd.DataFrame(data, copy=False)
+        return self._frame.copy(deep=False)
+
+    def rows(self):
+        """
+        Converts back to a list of metrics dicts (for code that still expects all_metrics).
+        """
+        names = self.columns
+        values = [self[name].tolist() for name in names]
+        return [dict(zip(names, row)) for row in zip(*values)]
+
+def as_frame(all_metrics):
+    """
+    Returns a DataFrame for any of the accepted metrics inputs:
+    MetricsTable (cached view), DataFrame, or list of metrics dicts.
+
+    :param all_metrics: MetricsTable, pd.DataFrame or list of dicts
+    :return: pd.DataFrame
+    """
+    if isinstance(all_metrics, MetricsTable):
+        return all_metrics.to_frame()
+    return pd.DataFrame(all_metrics)
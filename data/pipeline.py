@@ -0,0 +1,328 @@
+### ECE143 Final Project Group 4
+### Waymo E2E Driving Analysis - Pipelined Read / Parse / Analyze
+
+# The notebook loop reads, parses, analyzes and stores one record at a time, so the disk
+# sits idle while the CPU works and vice versa. RecordPipeline overlaps them:
+#
+#   reader thread --(bounded queue of record batches)--> parse/analyze/classify workers --> sink
+#
+# Backpressure: the reader blocks when the queue holds queue_depth batches, and at most
+# max_inflight batches are handed to the workers, so memory is capped at roughly
+# (queue_depth + max_inflight) * batch_bytes whatever the speed of the disk or the CPU.
+# The sink receives the records either in file order (ordered=True, same rows as the
+# sequential loop) or as soon as their batch is done (ordered=False).
+
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from functools import partial
+
+from data.fast_parse import parse_kinematics
+from data.ingestion import list_shards
+from data.metrics_table import MetricsTable
+from data.record_index import save_record_index
+from data.scenario_classification import analyze_driving_behavior, classify_scenario
+from data.telemetry import PipelineTelemetry
+from data.tfrecord import iter_records_buffered
+from src.streaming_stats import ScoreSummary, TopKEvents
+
+_END = object()  # End-of-stream marker put on the queue by the reader
+
+def process_batch(batch, fast_parse=True):
+    """
+    Parses, analyzes and classifies a batch of raw records (the unit of work of a worker).
+
+    :param batch: List of (shard_path, record number, offset, record bytes)
+    :param fast_parse: Use the kinematics-only parser instead of E2EDFrame.ParseFromString
+    :return: (outputs, telemetry); outputs holds one (scene_id, location, metrics, error) per record:
+             scene_id is None if parsing failed, metrics None for frames without enough history,
+             error a message or None
+    """
+    if not fast_parse:
+        from waymo_open_dataset.protos import end_to_end_driving_data_pb2 as wod_e2ed_pb2
+
+    telemetry = PipelineTelemetry().start()
+    outputs = []
+    for shard_path, idx, offset, record in batch:
+        # Reading was timed by the reader thread
+        telemetry.reset_lap('read')
+        location = (shard_path, offset, len(record))
+        scene_id = None
+        try:
+            if fast_parse:
+                data = parse_kinematics(record, include_future=False)
+            else:
+                data = wod_e2ed_pb2.E2EDFrame()
+                data.ParseFromString(record)
+            scene_id = data.frame.context.name
+            telemetry.lap('parse')
+
+            metrics = analyze_driving_behavior(data)
+            telemetry.lap('analyze')
+
+            if metrics:
+                metrics['scenario'] = classify_scenario(metrics)
+                metrics['shard'] = os.path.basename(shard_path)
+                telemetry.lap('classify')
+            outputs.append((scene_id, location, metrics, None))
+
+        except Exception as e:
+            stage = telemetry.error(e)
+            message = f"Error record {idx} in {os.path.basename(shard_path)} ({stage}): {type(e).__name__}: {e}"
+            outputs.append((scene_id, location, None, message))
+
+    return outputs, telemetry.stop()
+
+def _put(out_queue, item, stop):
+    """Blocking put that gives up once the pipeline is stopped. Returns False if stopped."""
+    while not stop.is_set():
+        try:
+            out_queue.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+class RecordPipeline:
+    """
+    Iterable over the analyzed records of a set of shards, with reading, parsing/analysis
+    and the consumer running concurrently.
+
+        pipeline = RecordPipeline(shard_paths, num_workers=4)
+        for scene_id, location, metrics in pipeline:
+            ...
+        print(pipeline.telemetry.report(), pipeline.stats)
+    """
+
+    def __init__(self, shard_paths, num_workers=None, ordered=True, queue_depth=8, max_inflight=None,
+                 batch_size=64, batch_bytes=16 << 20, num_samples=None, fast_parse=True, use_threads=False):
+        """
+        :param shard_paths: Shard paths, read in this order
+        :param num_workers: Parse/analyze workers (None = os.cpu_count(); 0 = in the consuming thread,
+                            which still overlaps the reads with the CPU work)
+        :param ordered: Yield records in file order; False yields each batch as soon as it is done
+        :param queue_depth: Max batches buffered between the reader and the workers
+        :param max_inflight: Max batches submitted to the workers (None = 2 * num_workers)
+        :param batch_size: Max records per batch
+        :param batch_bytes: Max bytes per batch (a single larger record still forms a batch)
+        :param num_samples: Per-shard record limit (None = all)
+        :param fast_parse: Use the kinematics-only parser, see process_batch
+        :param use_threads: Workers are threads instead of processes (no pickling of the
+                            records, but parsing holds the GIL)
+        """
+        self.shard_paths = list(shard_paths)
+        self.num_workers = (os.cpu_count() or 1) if num_workers is None else num_workers
+        self.ordered = ordered
+        self.queue_depth = max(1, queue_depth)
+        self.max_inflight = max(1, max_inflight or 2 * self.num_workers)
+        self.batch_size = max(1, batch_size)
+        self.batch_bytes = batch_bytes
+        self.num_samples = num_samples
+        self.fast_parse = fast_parse
+        self.use_threads = use_threads
+
+        self.telemetry = PipelineTelemetry('pipeline')
+        self.stats = {}
+
+    def _read(self, out_queue, stop, telemetry, blocked):
+        # Reader thread: groups records into batches and blocks when the queue is full
+        try:
+            telemetry.start()
+            batch, size = [], 0
+            for shard_path in self.shard_paths:
+                for idx, (offset, record) in enumerate(iter_records_buffered(shard_path, self.num_samples)):
+                    telemetry.lap('read', len(record))
+                    batch.append((shard_path, idx, offset, record))
+                    size += len(record)
+                    if len(batch) >= self.batch_size or size >= self.batch_bytes:
+                        wait_start = time.perf_counter()
+                        if not _put(out_queue, batch, stop):
+                            return
+                        blocked[0] += time.perf_counter() - wait_start
+                        telemetry.reset_lap()
+                        batch, size = [], 0
+            if batch and not _put(out_queue, batch, stop):
+                return
+            _put(out_queue, _END, stop)
+        except BaseException as e:
+            _put(out_queue, e, stop)
+        finally:
+            telemetry.stop()
+
+    def _executor(self):
+        if self.num_workers == 0:
+            return None
+        if self.use_threads:
+            return ThreadPoolExecutor(max_workers=self.num_workers)
+        # 'spawn' so that workers start from a clean interpreter
+        return ProcessPoolExecutor(max_workers=self.num_workers, mp_context=mp.get_context('spawn'))
+
+    def __iter__(self):
+        """
+        :return: Generator of (scene_id, location, metrics); metrics is None for frames without
+                 enough history. Failed records are printed and counted in telemetry, not yielded.
+        """
+        start_time = time.perf_counter()
+        self.telemetry = PipelineTelemetry('pipeline')
+        self.stats = {'batches': 0, 'max_queued': 0, 'reader_blocked_s': 0.0, 'starved_s': 0.0}
+
+        out_queue = queue.Queue(maxsize=self.queue_depth)
+        stop = threading.Event()
+        read_telemetry = PipelineTelemetry()
+        blocked = [0.0]
+        reader = threading.Thread(target=self._read, args=(out_queue, stop, read_telemetry, blocked),
+                                  name='record-reader', daemon=True)
+        worker = partial(process_batch, fast_parse=self.fast_parse)
+        executor = self._executor()
+        inflight = deque()
+        reader_done = False
+
+        reader.start()
+        try:
+            while True:
+                # Submit batches while the in-flight window has room. Only block on the queue
+                # when nothing is in flight (the workers are starved)
+                while not reader_done and len(inflight) < self.max_inflight:
+                    self.stats['max_queued'] = max(self.stats['max_queued'], out_queue.qsize())
+                    try:
+                        if inflight:
+                            batch = out_queue.get(timeout=0.005)
+                        else:
+                            wait_start = time.perf_counter()
+                            batch = out_queue.get()
+                            self.stats['starved_s'] += time.perf_counter() - wait_start
+                    except queue.Empty:
+                        break
+                    if batch is _END:
+                        reader_done = True
+                    elif isinstance(batch, BaseException):
+                        raise batch
+                    else:
+                        self.stats['batches'] += 1
+                        if executor is None:
+                            future = Future()
+                            future.set_result(worker(batch))
+                        else:
+                            future = executor.submit(worker, batch)
+                        inflight.append(future)
+
+                if not inflight:
+                    if reader_done:
+                        break
+                    continue
+
+                # Completed batches: the oldest first if ordered, any otherwise
+                if self.ordered:
+                    ready = []
+                    while inflight and inflight[0].done():
+                        ready.append(inflight.popleft())
+                else:
+                    ready = [future for future in inflight if future.done()]
+                    for future in ready:
+                        inflight.remove(future)
+
+                if not ready:
+                    waiting = [inflight[0]] if self.ordered else list(inflight)
+                    wait(waiting, timeout=None if reader_done else 0.01, return_when=FIRST_COMPLETED)
+                    continue
+
+                for future in ready:
+                    outputs, telemetry = future.result()
+                    self.telemetry.merge(telemetry)
+                    for scene_id, location, metrics, error in outputs:
+                        if error is not None:
+                            print(error)
+                            continue
+                        yield scene_id, location, metrics
+        finally:
+            stop.set()
+            for future in inflight:
+                future.cancel()
+            if executor is not None:
+                executor.shutdown(wait=True, cancel_futures=True)
+            reader.join()
+
+            self.telemetry.merge(read_telemetry)
+            # Stages run concurrently: rates are reported against the elapsed time
+            self.telemetry.wall_seconds = time.perf_counter() - start_time
+            self.stats['reader_blocked_s'] = blocked[0]
+
+def run_pipeline(shard_pattern, num_workers=None, ordered=True, queue_depth=8, max_inflight=None, batch_size=64,
+                 num_samples=None, fast_parse=True, use_threads=False, top_k=100, keep_rows=True, as_table=False,
+                 index_path=None, sink=None):
+    """
+    Pipelined alternative to ingest_shards for slow (e.g. network-mounted) storage: one reader
+    thread streams the shards in order while the workers parse, analyze and classify.
+
+    :param shard_pattern: Glob pattern string or list of shard paths
+    :param num_workers: Parse/analyze workers, see RecordPipeline
+    :param ordered: Store the rows in file order (same all_metrics as the sequential loop)
+                    or in completion order
+    :param queue_depth: Max record batches buffered ahead of the workers
+    :param max_inflight: Max batches being processed at once (None = 2 * num_workers)
+    :param batch_size: Max records per batch
+    :param num_samples: Per-shard record limit (None = all records)
+    :param fast_parse: Use the kinematics-only parser
+    :param use_threads: Thread workers instead of processes
+    :param top_k: Number of most critical events kept in results['top_events']
+    :param keep_rows: Keep all metrics rows (False = only the streaming summaries)
+    :param as_table: Collect the rows in a MetricsTable
+    :param index_path: If set, the scene_id -> record location index is saved here
+    :param sink: Optional callable(metrics, location) called for every analyzed record, in sink order
+    :return: dict with the keys of merge_shard_results plus 'pipeline' (queue/backpressure stats)
+    """
+    shard_paths = list_shards(shard_pattern)
+    if not shard_paths:
+        print(f"Warning: No shards matched {shard_pattern}")
+
+    all_metrics = MetricsTable() if as_table else []
+    scenario_counts = defaultdict(int)
+    score_summary = ScoreSummary()
+    top_events = TopKEvents(top_k)
+    record_index = {}
+
+    pipeline = RecordPipeline(shard_paths, num_workers, ordered, queue_depth, max_inflight, batch_size,
+                              num_samples=num_samples, fast_parse=fast_parse, use_threads=use_threads)
+    print(f"Processing {len(shard_paths)} shards with {pipeline.num_workers} workers "
+          f"(queue depth {pipeline.queue_depth}, {pipeline.max_inflight} batches in flight)...")
+
+    store_telemetry = PipelineTelemetry().start()
+    for scene_id, location, metrics in pipeline:
+        store_telemetry.reset_lap()
+        record_index[scene_id] = location
+        if metrics:
+            scenario_counts[metrics['scenario']] += 1
+            score_summary.update(metrics)
+            top_events.push(metrics, location)
+            if keep_rows:
+                all_metrics.append(metrics)
+            if sink is not None:
+                sink(metrics, location)
+        store_telemetry.lap('store')
+    store_telemetry.stop()
+
+    telemetry = pipeline.telemetry
+    wall_seconds = telemetry.wall_seconds
+    telemetry.merge(store_telemetry)
+    telemetry.wall_seconds = wall_seconds
+
+    if index_path is not None:
+        save_record_index(record_index, index_path)
+        print(f"Saved record index ({len(record_index)} scenes) to {index_path}")
+
+    return {
+        'all_metrics': all_metrics,
+        'scenario_counts': scenario_counts,
+        'score_summary': score_summary,
+        'top_events': top_events,
+        'record_index': record_index,
+        'num_records': telemetry.num_records,
+        'num_errors': telemetry.num_errors,
+        'shards': shard_paths,
+        'telemetry': telemetry,
+        'pipeline': pipeline.stats,
+    }
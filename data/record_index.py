@@ -0,0 +1,82 @@
+### ECE143 Final Project Group 4
+### Waymo E2E Driving Analysis - Scene-ID Record Index
+
+# Maps scene_id -> (shard path, byte offset, record length) so that a handful of
+# records can be fetched with one seek each instead of re-scanning whole shards.
+
+import csv
+import os
+
+from data.fast_parse import parse_kinematics
+from data.tfrecord import iter_records, read_record
+
+INDEX_COLUMNS = ['scene_id', 'shard', 'offset', 'length']
+
+def build_record_index(shard_paths):
+    """
+    Scans shards once and indexes every record by scene_id.
+    (ingest_shards builds the same index as a side effect of the metrics pass.)
+
+    :param shard_paths: List of TFRecord shard paths
+    :return: dict scene_id -> (shard path, offset, length)
+    """
+    index = {}
+    for shard_path in shard_paths:
+        for offset, record in iter_records(shard_path):
+            scene_id = parse_kinematics(record, include_future=False).frame.context.name
+            index[scene_id] = (shard_path, offset, len(record))
+    return index
+
+def save_record_index(index, path):
+    """
+    Writes the index as a CSV file (scene_id, shard, offset, length).
+
+    :param index: dict scene_id -> (shard path, offset, length)
+    :param path: Output file path
+    """
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(INDEX_COLUMNS)
+        for scene_id, (shard, offset, length) in index.items():
+            writer.writerow([scene_id, shard, offset, length])
+    os.replace(tmp_path, path)
+
+def load_record_index(path):
+    """
+    Loads an index written by save_record_index.
+
+    :param path: Index file path
+    :return: dict scene_id -> (shard path, offset, length)
+    """
+    with open(path, newline='') as f:
+        reader = csv.DictReader(f)
+        return {
+            row['scene_id']: (row['shard'], int(row['offset']), int(row['length']))
+            for row in reader
+        }
+
+def read_indexed_records(index, scene_ids):
+    """
+    Random-access reader: fetches exactly the requested records, one seek each.
+
+    :param index: dict scene_id -> (shard path, offset, length), or path to a saved index
+    :param scene_ids: Iterable of scene_ids, records are yielded in this order
+    :return: Generator of (scene_id, record_bytes); unknown scene_ids are skipped with a warning
+    """
+    if isinstance(index, str):
+        index = load_record_index(index)
+
+    files = {}
+    try:
+        for scene_id in scene_ids:
+            if scene_id not in index:
+                print(f"Warning: scene_id {scene_id} not found in record index")
+                continue
+            shard, offset, length = index[scene_id]
+            if shard not in files:
+                files[shard] = open(shard, 'rb')
+            yield scene_id, read_record(files[shard], offset, length)
+    finally:
+        for f in files.values():
+            f.close()
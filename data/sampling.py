@@ -0,0 +1,393 @@
+### ECE143 Final Project Group 4
+### Waymo E2E Driving Analysis - Index-Driven Sampling Across Shards
+
+# NUM_SAMPLES = 1000 analyzes the first records of one shard: consecutive frames of a few
+# segments, read sequentially. Here a sample is drawn from the whole split instead:
+#
+# 1. RecordCatalog: one row per record (shard, byte offset, length, scene_id, segment, intent),
+#    built on first use by a header-only pass (camera images are skipped, never read) and
+#    saved next to the data. Later calls only rescan shards whose size or mtime changed.
+# 2. sample_records: uniform, or stratified by shard / segment / intent, drawn from the catalog.
+# 3. read_sampled_records / analyze_sample: fetch exactly the chosen records, one seek each,
+#    so a 10k-frame sample costs 10k record reads.
+#
+# reservoir_sample draws a uniform sample in one pass over a stream of unknown length
+# (e.g. the record framing of the shards) when no catalog is wanted.
+
+import os
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+from data.fast_parse import parse_kinematics
+from data.incremental_analysis import default_segment_key
+from data.ingestion import list_shards
+from data.scenario_classification import analyze_driving_behavior, classify_scenario
+from data.tfrecord import iter_records, read_record
+from src.streaming_stats import ScoreSummary, TopKEvents
+
+STRATA = ['shard', 'segment', 'intent']
+
+_END = object()  # Exhausted-iterator marker
+
+def _scan_shard(shard_path):
+    # Header-only pass: scene_id and intent of every record, with its location
+    offsets, lengths, scene_ids, intents = [], [], [], []
+    for idx, (offset, record) in enumerate(iter_records(shard_path)):
+        try:
+            data = parse_kinematics(record, include_future=False)
+        except Exception as e:
+            print(f"Error record {idx} in {os.path.basename(shard_path)}: {type(e).__name__}: {e}")
+            continue
+        offsets.append(offset)
+        lengths.append(len(record))
+        scene_ids.append(data.frame.context.name)
+        intents.append(data.intent)
+    return pd.DataFrame({
+        'offset': np.array(offsets, dtype=np.int64),
+        'length': np.array(lengths, dtype=np.int64),
+        'scene_id': scene_ids,
+        'intent': np.array(intents, dtype=np.int8),
+    })
+
+class RecordCatalog:
+    """
+    Location, scene_id, segment and intent of every record of a set of shards.
+
+        catalog = RecordCatalog.load_or_build(DATASET_DIR + '*.tfrecord-*', 'record_catalog.npz')
+        sample = sample_records(catalog, 10_000, mode='stratified', by='segment')
+        results = analyze_sample(sample)
+    """
+
+    def __init__(self, frame, shard_stats):
+        """
+        :param frame: DataFrame with 'shard', 'offset', 'length', 'scene_id', 'segment', 'intent'
+        :param shard_stats: dict shard path -> (size, mtime_ns) at scan time
+        """
+        self.frame = frame.reset_index(drop=True)
+        self.shard_stats = shard_stats
+
+    def __len__(self):
+        return len(self.frame)
+
+    @property
+    def shards(self):
+        return sorted(self.shard_stats)
+
+    @classmethod
+    def build(cls, shard_pattern, previous=None):
+        """
+        Scans the shards (reusing the rows of unchanged shards of a previous catalog).
+
+        :param shard_pattern: Glob pattern string or list of shard paths
+        :param previous: Optional RecordCatalog whose up-to-date shards are not rescanned
+        :return: RecordCatalog
+        """
+        parts, shard_stats = [], {}
+        for shard_path in list_shards(shard_pattern):
+            stat = os.stat(shard_path)
+            shard_stats[shard_path] = (stat.st_size, stat.st_mtime_ns)
+            if previous is not None and previous.shard_stats.get(shard_path) == shard_stats[shard_path]:
+                parts.append(previous.frame[previous.frame['shard'] == shard_path])
+                continue
+            print(f"Cataloging {os.path.basename(shard_path)}...")
+            part = _scan_shard(shard_path)
+            part.insert(0, 'shard', shard_path)
+            part['segment'] = [default_segment_key(scene_id) for scene_id in part['scene_id']]
+            parts.append(part)
+
+        columns = ['shard', 'offset', 'length', 'scene_id', 'segment', 'intent']
+        frame = pd.concat(parts, ignore_index=True)[columns] if parts else pd.DataFrame(columns=columns)
+        return cls(frame, shard_stats)
+
+    def save(self, path):
+        """
+        Writes the catalog as a compressed NPZ file (atomic replace).
+
+        :param path: Output path ending in '.npz'
+        """
+        shards = self.shards
+        shard_codes = {shard: i for i, shard in enumerate(shards)}
+        arrays = {
+            'shards': np.array(shards, dtype=str),
+            'shard_size': np.array([self.shard_stats[s][0] for s in shards], dtype=np.int64),
+            'shard_mtime_ns': np.array([self.shard_stats[s][1] for s in shards], dtype=np.int64),
+            'shard': self.frame['shard'].map(shard_codes).to_numpy(np.int32),
+            'offset': self.frame['offset'].to_numpy(np.int64),
+            'length': self.frame['length'].to_numpy(np.int64),
+            'scene_id': self.frame['scene_id'].to_numpy(str),
+            'segment': self.frame['segment'].to_numpy(str),
+            'intent': self.frame['intent'].to_numpy(np.int8),
+        }
+        tmp_path = path[:-len('.npz')] + '.tmp.npz'
+        np.savez_compressed(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Loads a catalog written by save().
+
+        :param path: Catalog file path
+        :return: RecordCatalog
+        """
+        with np.load(path, allow_pickle=False) as npz:
+            shards = npz['shards'].tolist()
+            shard_stats = {shard: (int(size), int(mtime)) for shard, size, mtime
+                           in zip(shards, npz['shard_size'], npz['shard_mtime_ns'])}
+            frame = pd.DataFrame({
+                'shard': np.array(shards, dtype=object)[npz['shard']] if shards else np.array([], dtype=object),
+                'offset': npz['offset'],
+                'length': npz['length'],
+                'scene_id': npz['scene_id'].astype(object),
+                'segment': npz['segment'].astype(object),
+                'intent': npz['intent'],
+            })
+        return cls(frame, shard_stats)
+
+    @classmethod
+    def load_or_build(cls, shard_pattern, path):
+        """
+        Loads the saved catalog, rescanning only new or modified shards (and saving the update).
+
+        :param shard_pattern: Glob pattern string or list of shard paths
+        :param path: Catalog file path
+        :return: RecordCatalog
+        """
+        previous = cls.load(path) if os.path.exists(path) else None
+        shard_paths = list_shards(shard_pattern)
+        if previous is not None and set(previous.shard_stats) == set(shard_paths):
+            stats = {shard: (os.stat(shard).st_size, os.stat(shard).st_mtime_ns) for shard in shard_paths}
+            if stats == previous.shard_stats:
+                return previous
+        catalog = cls.build(shard_paths, previous)
+        catalog.save(path)
+        print(f"Saved record catalog ({len(catalog)} records, {len(catalog.shard_stats)} shards) to {path}")
+        return catalog
+
+def _allocate(stratum_sizes, size, allocation, rng):
+    """
+    Sample size per stratum.
+
+    :param stratum_sizes: (S,) records per stratum
+    :param size: Total sample size (<= total records, >= number of non-empty strata)
+    :param allocation: 'proportional' (largest remainder, ties broken at random) or 'equal'
+    :param rng: np.random.Generator
+    :return: (S,) int array, each <= its stratum size and >= 1 for non-empty strata, summing to size
+    """
+    stratum_sizes = np.asarray(stratum_sizes, dtype=np.int64)
+    if allocation == 'proportional':
+        quotas = size * stratum_sizes / stratum_sizes.sum()
+        # Every non-empty stratum gets at least one record, so its weight can represent it
+        counts = np.maximum(np.floor(quotas).astype(np.int64), np.minimum(stratum_sizes, 1))
+        remainders = quotas - counts + rng.random(len(quotas)) * 1e-9
+        while counts.sum() < size:
+            # Largest remainder first, among strata that are not taken whole
+            open_strata = np.flatnonzero(counts < stratum_sizes)
+            add = open_strata[np.argsort(-remainders[open_strata])[:size - counts.sum()]]
+            counts[add] += 1
+            remainders[add] -= 1
+        while counts.sum() > size:
+            # Raised to one record: take the excess from the most over-allocated other strata
+            shrinkable = np.flatnonzero(counts > 1)
+            remove = shrinkable[np.argsort(remainders[shrinkable])[:counts.sum() - size]]
+            counts[remove] -= 1
+            remainders[remove] += 1
+        return counts
+    if allocation == 'equal':
+        # Equal shares; strata smaller than their share are taken whole and the rest redistributed
+        counts = np.zeros(len(stratum_sizes), dtype=np.int64)
+        left = size
+        open_strata = np.flatnonzero(stratum_sizes > 0)
+        while left > 0 and len(open_strata):
+            share, extra = divmod(left, len(open_strata))
+            add = np.full(len(open_strata), share)
+            add[rng.permutation(len(open_strata))[:extra]] += 1
+            add = np.minimum(add, stratum_sizes[open_strata] - counts[open_strata])
+            counts[open_strata] += add
+            left -= add.sum()
+            open_strata = open_strata[counts[open_strata] < stratum_sizes[open_strata]]
+        return counts
+    raise ValueError(f"Unknown allocation {allocation!r}, expected 'proportional' or 'equal'")
+
+def sample_records(catalog, size, mode='uniform', by=None, allocation='proportional', seed=0):
+    """
+    Draws a sample of records (without replacement) from a catalog.
+
+    :param catalog: RecordCatalog
+    :param size: Number of records (capped at the catalog size; 'stratified' needs at least
+                 one per stratum)
+    :param mode: 'uniform' or 'stratified'
+    :param by: Stratum of 'stratified': 'shard', 'segment' or 'intent'
+    :param allocation: 'proportional' (strata keep their share of the split) or 'equal'
+                       (same count per stratum; use the 'weight' column for unbiased estimates)
+    :param seed: Random seed
+    :return: DataFrame of catalog rows, sorted by location, with a 'weight' column
+             (records of the split represented by each sampled record; the weights sum to
+             the catalog size)
+    """
+    rng = np.random.default_rng(seed)
+    frame = catalog.frame
+    size = min(size, len(frame))
+
+    if mode == 'uniform':
+        rows = rng.choice(len(frame), size=size, replace=False)
+        sample = frame.iloc[rows].copy()
+        sample['weight'] = len(frame) / size if size else 0.0
+    elif mode == 'stratified':
+        if by not in STRATA:
+            raise ValueError(f"Stratified sampling needs by= one of {STRATA}")
+        codes, strata = pd.factorize(frame[by], sort=True)
+        stratum_sizes = np.bincount(codes, minlength=len(strata))
+        if size < len(strata):
+            # A stratum without sampled records would be missing from the weighted estimates
+            raise ValueError(f"Stratified sampling by {by!r} needs size >= {len(strata)} (one record per "
+                             f"stratum), got {size}; use mode='uniform' or a coarser stratum")
+        counts = _allocate(stratum_sizes, size, allocation, rng)
+
+        # Random rank of every record within its stratum; keep the first `count` of each
+        order = np.lexsort((rng.random(len(frame)), codes))
+        starts = np.concatenate([[0], np.cumsum(stratum_sizes)[:-1]])
+        rank = np.empty(len(frame), dtype=np.int64)
+        rank[order] = np.arange(len(frame)) - np.repeat(starts, stratum_sizes)
+        chosen = rank < counts[codes]
+        sample = frame[chosen].copy()
+        weights = np.divide(stratum_sizes, counts, out=np.zeros(len(counts)), where=counts > 0)
+        sample['weight'] = weights[codes[chosen]]
+    else:
+        raise ValueError(f"Unknown sampling mode {mode!r}, expected 'uniform' or 'stratified'")
+
+    # Location order: the reads then go forward through each shard
+    return sample.sort_values(['shard', 'offset']).reset_index(drop=True)
+
+def reservoir_sample(iterable, size, seed=0):
+    """
+    Uniform sample of a stream of unknown length in one pass (Algorithm L),
+    with O(size) memory.
+
+    :param iterable: Any iterable
+    :param size: Sample size
+    :param seed: Random seed
+    :return: List of up to `size` items
+    """
+    if size <= 0:
+        return []
+    rng = np.random.default_rng(seed)
+    iterator = iter(iterable)
+    reservoir = []
+    for item in iterator:
+        reservoir.append(item)
+        if len(reservoir) == size:
+            break
+    if len(reservoir) < size:
+        return reservoir
+
+    # Skip ahead geometrically instead of drawing a random number per item
+    w = np.exp(np.log(rng.random()) / size)
+    while True:
+        skip = int(np.floor(np.log(rng.random()) / np.log1p(-w)))
+        for _ in range(skip):
+            if next(iterator, _END) is _END:
+                return reservoir
+        item = next(iterator, _END)
+        if item is _END:
+            return reservoir
+        reservoir[rng.integers(size)] = item
+        w *= np.exp(np.log(rng.random()) / size)
+
+
+def reservoir_sample_records(shard_pattern, size, seed=0):
+    """
+    Uniform sample of record locations without a catalog: one pass over the record
+    framing of every shard (no parsing), keeping a reservoir of locations.
+
+    :param shard_pattern: Glob pattern string or list of shard paths
+    :param size: Sample size
+    :param seed: Random seed
+    :return: DataFrame with 'shard', 'offset', 'length', 'weight', sorted by location
+    """
+    shard_paths = list_shards(shard_pattern)
+    total = [0]
+
+    def locations():
+        for shard_path in shard_paths:
+            for offset, record in iter_records(shard_path):
+                total[0] += 1
+                yield shard_path, offset, len(record)
+
+    sample = pd.DataFrame(reservoir_sample(locations(), size, seed), columns=['shard', 'offset', 'length'])
+    sample['weight'] = total[0] / len(sample) if len(sample) else 0.0
+    return sample.sort_values(['shard', 'offset']).reset_index(drop=True)
+
+def read_sampled_records(sample):
+    """
+    Random-access reader for a sample: one seek per record.
+
+    :param sample: DataFrame with 'shard', 'offset', 'length' (from sample_records)
+    :return: Generator of (row position, (shard, offset, length), record_bytes)
+    """
+    files = {}
+    try:
+        for position, (shard, offset, length) in enumerate(
+                zip(sample['shard'], sample['offset'].tolist(), sample['length'].tolist())):
+            if shard not in files:
+                files[shard] = open(shard, 'rb')
+            yield position, (shard, offset, length), read_record(files[shard], offset, length)
+    finally:
+        for f in files.values():
+            f.close()
+
+def analyze_sample(sample, fast_parse=True, top_k=100):
+    """
+    Parses, analyzes and classifies the records of a sample.
+
+    :param sample: DataFrame from sample_records / reservoir_sample_records
+    :param fast_parse: Use the kinematics-only parser instead of E2EDFrame.ParseFromString
+    :param top_k: Size of the top-K selector of the most critical events
+    :return: dict with 'all_metrics' (rows carry the record's 'sample_weight'), 'scenario_counts',
+             'score_summary', 'top_events', 'record_index', 'num_records', 'num_errors'
+    """
+    if not fast_parse:
+        from waymo_open_dataset.protos import end_to_end_driving_data_pb2 as wod_e2ed_pb2
+
+    all_metrics = []
+    scenario_counts = defaultdict(int)
+    score_summary = ScoreSummary()
+    top_events = TopKEvents(top_k)
+    record_index = {}
+    num_errors = 0
+    weights = sample['weight'].tolist()
+
+    for position, location, bytes_example in read_sampled_records(sample):
+        try:
+            if fast_parse:
+                data = parse_kinematics(bytes_example, include_future=False)
+            else:
+                data = wod_e2ed_pb2.E2EDFrame()
+                data.ParseFromString(bytes_example)
+            record_index[data.frame.context.name] = location
+
+            metrics = analyze_driving_behavior(data)
+            if metrics:
+                metrics['scenario'] = classify_scenario(metrics)
+                metrics['shard'] = os.path.basename(location[0])
+                metrics['sample_weight'] = weights[position]
+                scenario_counts[metrics['scenario']] += 1
+                score_summary.update(metrics)
+                top_events.push(metrics, location)
+                all_metrics.append(metrics)
+
+        except Exception as e:
+            num_errors += 1
+            print(f"Error record at byte {location[1]} of {os.path.basename(location[0])}: {type(e).__name__}: {e}")
+
+    return {
+        'all_metrics': all_metrics,
+        'scenario_counts': scenario_counts,
+        'score_summary': score_summary,
+        'top_events': top_events,
+        'record_index': record_index,
+        'num_records': len(sample),
+        'num_errors': num_errors,
+    }
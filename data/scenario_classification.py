@@ -1,17 +1,127 @@
 # Install dependencies (if needed)
-# !pip install tensorflow numpy matplotlib waymo-open-dataset-tf-2-12-0==1.6.7
+# !pip install numpy
 
 # Import Libraries
-import pandas as pd
-import tensorflow as tf
+# (Only NumPy: this module is imported by every worker and the CLI, so it must start fast.
+#  Records are read with data.tfrecord and parsed with data.fast_parse or the Waymo protos.)
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-from collections import defaultdict
-import os
 
-# Import Waymo dataset libraries
-from waymo_open_dataset.protos import end_to_end_driving_data_pb2 as wod_e2ed_pb2
+# Weights of the four interaction_score components (see score_components)
+SCORE_WEIGHTS = {'braking': 5.0, 'lateral': 4.0, 'jerk': 0.5, 'lateral_events': 2.0}
+
+def score_components(max_brake, max_lat_g, max_long_jerk, num_lat_events, avg_speed, intent):
+    """
+    The four terms of interaction_score before weighting. Scalars or (n,) arrays.
+
+    :param max_brake, max_lat_g, max_long_jerk, num_lat_events, avg_speed: Window metrics
+    :param intent: Ego intent (1 = GO_STRAIGHT)
+    :return: (significant braking, speed-weighted lateral accel with the unexpected-motion
+             penalty, max longitudinal jerk, lateral event count)
+    """
+    # Speed factor and penalty are rounded to the state dtype, as in the original scalar
+    # expression (Python floats multiplied into float32 values)
+    dtype = np.result_type(max_lat_g, np.float32)
+    speed_factor = np.maximum(0.5, np.asarray(avg_speed, dtype=np.float64) / 10.0).astype(dtype)
+
+    # Unexpected Motion Penalty
+    # Intent 1 = GO_STRAIGHT. If going straight but swerving hard, double the penalty.
+    unexpected_motion_penalty = np.where((np.asarray(intent) == 1) & (max_lat_g > 1.5), 2.0, 1.0).astype(dtype)
+
+    # Noise Filter: Only count braking if it's stronger than -1.0 m/s^2
+    significant_braking = np.where(max_brake < -1.0, np.abs(max_brake), 0.0)
+
+    return (significant_braking, max_lat_g * speed_factor * unexpected_motion_penalty,
+            max_long_jerk, num_lat_events)
+
+def interaction_score(max_brake, max_lat_g, max_long_jerk, num_lat_events, avg_speed, intent,
+                      weights=SCORE_WEIGHTS):
+    """
+    Weighted sum of score_components. Scalars or (n,) arrays.
+
+    :param weights: Component weights, defaults to SCORE_WEIGHTS
+    :return: interaction_score
+    """
+    braking, lateral, jerk, lateral_events = score_components(
+        max_brake, max_lat_g, max_long_jerk, num_lat_events, avg_speed, intent)
+    # Power-of-two weights (4.0, 0.5, 2.0) scale exactly, so weighting after the
+    # speed factor and penalty gives the same value as weighting first
+    return ((braking * weights['braking']) +
+            (lateral * weights['lateral']) +
+            (jerk * weights['jerk']) +
+            (lateral_events * weights['lateral_events']))
+
+def reduce_window(speeds, long_accels, lat_accels, long_jerk, lat_jerk, lateral_moves_m, intent):
+    """
+    Peaks, counts, distances and interaction_score of analyze_driving_behavior from the
+    per-timestep values of a window. Reductions run over the last axis, so this takes one
+    window (1-D arrays, scalar intent) or a block of equal-length windows ((n, T) arrays,
+    (n,) intents); rows of a block reduce exactly like the 1-D case.
+
+    :param speeds, long_accels, lat_accels: (..., T) per-timestep values
+    :param long_jerk, lat_jerk, lateral_moves_m: (..., T - 1) values between timesteps
+    :param intent: Ego intent (scalar or (n,))
+    :return: dict of the FLOAT_METRICS and INT_METRICS (except 'intent'), NumPy scalars or (n,) arrays
+    """
+    abs_lat_accels = np.abs(lat_accels)
+
+    # Peaks
+    max_brake = np.min(long_accels, axis=-1)
+    max_accel = np.max(long_accels, axis=-1)
+    max_lat_g = np.max(abs_lat_accels, axis=-1)
+    max_long_jerk = np.max(np.abs(long_jerk), axis=-1)
+    max_lat_jerk = np.max(np.abs(lat_jerk), axis=-1)
+
+    # Aggregates
+    num_lat_events = np.sum((abs_lat_accels > 1.0) & (speeds > 2.0), axis=-1)
+    avg_speed = np.mean(speeds, axis=-1)
+
+    return {
+        'avg_speed_ms': avg_speed,
+        'num_decelerations': np.sum(long_accels < -0.1, axis=-1),
+        'num_accelerations': np.sum(long_accels > 0.1, axis=-1),
+        'num_lateral_frames': num_lat_events,
+        'max_braking': max_brake,
+        'max_acceleration': max_accel,
+        'max_lateral_accel': max_lat_g,
+        'max_long_jerk': max_long_jerk,
+        'max_lat_jerk': max_lat_jerk,
+        'total_lateral_dist_m': np.sum(np.abs(lateral_moves_m), axis=-1),
+        'net_lateral_dist_m': np.abs(np.sum(lateral_moves_m, axis=-1)),
+        'interaction_score': interaction_score(max_brake, max_lat_g, max_long_jerk, num_lat_events,
+                                               avg_speed, intent),
+    }
+
+def metrics_record(metrics, scene_id, timestamp, intent):
+    """
+    Per-frame metrics dict of analyze_driving_behavior from the window metrics of one frame.
+
+    :param metrics: dict from reduce_window (NumPy scalars)
+    :param scene_id: frame.context.name
+    :param timestamp: frame.timestamp_micros
+    :param intent: Ego intent
+    :return: Metrics dict with Python float/int values
+    """
+    return {
+        'scene_id': scene_id,
+        'timestamp': timestamp,
+        'avg_speed_ms': float(metrics['avg_speed_ms']),
+        'intent': int(intent),
+
+        'num_decelerations': int(metrics['num_decelerations']),
+        'num_accelerations': int(metrics['num_accelerations']),
+        'num_lateral_frames': int(metrics['num_lateral_frames']),
+
+        'max_braking': float(metrics['max_braking']),
+        'max_acceleration': float(metrics['max_acceleration']),
+        'max_lateral_accel': float(metrics['max_lateral_accel']),
+        'max_long_jerk': float(metrics['max_long_jerk']),
+        'max_lat_jerk': float(metrics['max_lat_jerk']),
+
+        'total_lateral_dist_m': float(metrics['total_lateral_dist_m']),
+        'net_lateral_dist_m': float(metrics['net_lateral_dist_m']),
+
+        'interaction_score': float(metrics['interaction_score'])
+    }
 
 def analyze_driving_behavior(data):
     """
@@ -50,27 +160,12 @@ def analyze_driving_behavior(data):
         long_accels[moving_mask] = ax * vx_norm + ay * vy_norm
         lat_accels[moving_mask]  = ax * (-vy_norm) + ay * vx_norm
 
-    # --- 3. CALCULATE PEAKS ---
-    max_brake = np.min(long_accels) if len(long_accels) > 0 else 0.0
-    max_accel = np.max(long_accels) if len(long_accels) > 0 else 0.0
-    max_lat_g = np.max(np.abs(lat_accels)) if len(lat_accels) > 0 else 0.0
-
-    # --- 4. CALCULATE JERK & PENALTIES ---
+    # --- 3. CALCULATE JERK ---
     # Jerk is the derivative of acceleration (dt = 0.25s)
     lat_jerk = np.diff(lat_accels) / 0.25
     long_jerk = np.diff(long_accels) / 0.25
 
-    # Peak Jerks
-    max_long_jerk = np.max(np.abs(long_jerk)) if len(long_jerk) > 0 else 0.0
-    max_lat_jerk  = np.max(np.abs(lat_jerk)) if len(lat_jerk) > 0 else 0.0
-
-    # Unexpected Motion Penalty
-    # Intent 1 = GO_STRAIGHT. If going straight but swerving hard, double the penalty.
-    unexpected_motion_penalty = 1.0
-    if ego_intent == 1 and max_lat_g > 1.5:
-        unexpected_motion_penalty = 2.0
-
-    # --- 5. CALCULATE DISPLACEMENT METRICS ---
+    # --- 4. CALCULATE DISPLACEMENT METRICS ---
     dx = np.diff(pos_x)
     dy = np.diff(pos_y)
 
@@ -86,49 +181,143 @@ def analyze_driving_behavior(data):
         vy_n = v_step_y[step_mask] / speed_step[step_mask]
         lateral_moves_m[step_mask] = (dx[step_mask] * -vy_n) + (dy[step_mask] * vx_n)
 
-    # --- 6. AGGREGATE METRICS & SCORE ---
-
-    num_decelerations = np.sum(long_accels < -0.1)
-    num_accelerations = np.sum(long_accels > 0.1)
-    num_lat_events    = np.sum((np.abs(lat_accels) > 1.0) & (speeds > 2.0))
-
-    total_lat_dist = np.sum(np.abs(lateral_moves_m))
-    net_lat_dist   = np.abs(np.sum(lateral_moves_m))
-
-    # Speed Weighting
-    speed_factor = max(0.5, float(np.mean(speeds)) / 10.0)
+    # --- 5. PEAKS, AGGREGATES & SCORE ---
+    metrics = reduce_window(speeds, long_accels, lat_accels, long_jerk, lat_jerk, lateral_moves_m, ego_intent)
 
-    # Noise Filter: Only count braking if it's stronger than -1.0 m/s^2
-    significant_braking = abs(max_brake) if max_brake < -1.0 else 0.0
-
-    interaction_score = float(
-        (significant_braking * 5.0) +
-        (max_lat_g * 4.0 * speed_factor * unexpected_motion_penalty) +
-        (max_long_jerk * 0.5) +
-        (num_lat_events * 2.0)
-    )
+    return metrics_record(metrics, data.frame.context.name, data.frame.timestamp_micros, ego_intent)
 
-    return {
-        'scene_id': data.frame.context.name,
-        'timestamp': data.frame.timestamp_micros,
-        'avg_speed_ms': float(np.mean(speeds)),
-        'intent': int(ego_intent),
+# Metric columns produced by analyze_driving_behavior_batch (same keys as the per-frame dict)
+FLOAT_METRICS = [
+    'avg_speed_ms', 'max_braking', 'max_acceleration', 'max_lateral_accel',
+    'max_long_jerk', 'max_lat_jerk', 'total_lateral_dist_m', 'net_lateral_dist_m',
+    'interaction_score'
+]
+INT_METRICS = ['intent', 'num_decelerations', 'num_accelerations', 'num_lateral_frames']
 
-        'num_decelerations': int(num_decelerations),
-        'num_accelerations': int(num_accelerations),
-        'num_lateral_frames': int(num_lat_events),
+STATE_FIELDS = ['pos_x', 'pos_y', 'vel_x', 'vel_y', 'accel_x', 'accel_y']
 
-        'max_braking': float(max_brake),
-        'max_acceleration': float(max_accel),
-        'max_lateral_accel': float(max_lat_g),
-        'max_long_jerk': float(max_long_jerk),
-        'max_lat_jerk': float(max_lat_jerk),
+def stack_past_states(frames):
+    """
+    Packs the past_states of N parsed frames into padded (N, T) arrays.
 
-        'total_lateral_dist_m': float(total_lat_dist),
-        'net_lateral_dist_m': float(net_lat_dist),
+    :param frames: List of E2EDFrame-like objects
+    :return: dict of keyword arguments for analyze_driving_behavior_batch
+    """
+    n = len(frames)
+    lengths = np.array([len(f.past_states.pos_x) for f in frames], dtype=np.int64)
+    max_len = int(lengths.max()) if n > 0 else 0
+
+    # Keep the dtype np.array() gives the per-frame function (float32 for upb-backed protos)
+    dtype = np.asarray(frames[0].past_states.pos_x).dtype if n > 0 else np.float64
+    if not np.issubdtype(dtype, np.floating):
+        dtype = np.float64
+
+    packed = {name: np.zeros((n, max_len), dtype=dtype) for name in STATE_FIELDS}
+    for i, f in enumerate(frames):
+        for name in STATE_FIELDS:
+            values = getattr(f.past_states, name)
+            packed[name][i, :len(values)] = values
+
+    packed['lengths'] = lengths
+    packed['intents'] = np.array([int(f.intent) for f in frames], dtype=np.int64)
+    packed['scene_ids'] = np.array([f.frame.context.name for f in frames], dtype=object)
+    packed['timestamps'] = np.array([f.frame.timestamp_micros for f in frames], dtype=np.int64)
+    return packed
+
+def analyze_driving_behavior_batch(pos_x, pos_y, vel_x, vel_y, accel_x, accel_y,
+                                   lengths, intents, scene_ids=None, timestamps=None):
+    """
+    Array-at-a-time version of analyze_driving_behavior for N frames.
+    Rows are grouped by history length so every group is a dense (n, T) block;
+    this keeps the reductions (and their rounding) identical to the per-frame function.
+
+    :param pos_x, pos_y, vel_x, vel_y, accel_x, accel_y: Padded (N, T) arrays of past states
+    :param lengths: (N,) number of valid timesteps per row
+    :param intents: (N,) ego intent per row
+    :param scene_ids: Optional (N,) scene ids, passed through to the output
+    :param timestamps: Optional (N,) timestamps, passed through to the output
+    :return: dict of metric name -> (N,) array, plus a boolean 'valid' mask
+             (False where analyze_driving_behavior would return None)
+    """
+    lengths = np.asarray(lengths, dtype=np.int64)
+    intents = np.asarray(intents, dtype=np.int64)
+    n = len(lengths)
+
+    result = {name: np.zeros(n, dtype=np.float64) for name in FLOAT_METRICS}
+    result.update({name: np.zeros(n, dtype=np.int64) for name in INT_METRICS})
+    result['intent'][:] = intents
+    result['valid'] = lengths >= 2
+    if scene_ids is not None:
+        result['scene_id'] = np.asarray(scene_ids, dtype=object)
+    if timestamps is not None:
+        result['timestamp'] = np.asarray(timestamps, dtype=np.int64)
+
+    states = [np.asarray(a) for a in (pos_x, pos_y, vel_x, vel_y, accel_x, accel_y)]
+    dtype = np.result_type(*states, np.float32)
+    states = [a.astype(dtype, copy=False) for a in states]
+
+    for length in np.unique(lengths[result['valid']]):
+        rows = np.flatnonzero(lengths == length)
+        px, py, vx, vy, ax, ay = (a[rows, :length] for a in states)
+        intent = intents[rows]
+
+        # --- 1. ACCELERATION VECTORS ---
+        speeds = np.sqrt(vx**2 + vy**2)
+        moving_mask = speeds > 1.0
+        safe_speeds = np.where(moving_mask, speeds, 1.0)
+
+        vx_norm = vx / safe_speeds
+        vy_norm = vy / safe_speeds
+        long_accels = np.where(moving_mask, ax * vx_norm + ay * vy_norm, 0.0)
+        lat_accels  = np.where(moving_mask, ax * (-vy_norm) + ay * vx_norm, 0.0)
+
+        # --- 2. JERK ---
+        lat_jerk = np.diff(lat_accels, axis=1) / 0.25
+        long_jerk = np.diff(long_accels, axis=1) / 0.25
+
+        # --- 3. DISPLACEMENT ---
+        dx = np.diff(px, axis=1)
+        dy = np.diff(py, axis=1)
+
+        v_step_x = vx[:, :-1]
+        v_step_y = vy[:, :-1]
+        speed_step = np.sqrt(v_step_x**2 + v_step_y**2)
+        step_mask = speed_step > 1.0
+        safe_step = np.where(step_mask, speed_step, 1.0)
+
+        vx_n = v_step_x / safe_step
+        vy_n = v_step_y / safe_step
+        lateral_moves_m = np.where(step_mask, (dx * -vy_n) + (dy * vx_n), 0.0)
+
+        # --- 4. PEAKS, AGGREGATES & SCORE (rows of the block reduce like single windows) ---
+        metrics = reduce_window(speeds, long_accels, lat_accels, long_jerk, lat_jerk, lateral_moves_m, intent)
+        for name, values in metrics.items():
+            result[name][rows] = values
+
+    return result
+
+def batch_to_records(batch):
+    """
+    Converts the output of analyze_driving_behavior_batch into the list of dicts
+    that analyze_driving_behavior would have produced (invalid rows are dropped).
 
-        'interaction_score': float(interaction_score)
-    }
+    :param batch: dict returned by analyze_driving_behavior_batch
+    :return: List of metrics dicts
+    """
+    records = []
+    for i in np.flatnonzero(batch['valid']):
+        row = {}
+        if 'scene_id' in batch:
+            row['scene_id'] = batch['scene_id'][i]
+        if 'timestamp' in batch:
+            row['timestamp'] = int(batch['timestamp'][i])
+        row['avg_speed_ms'] = float(batch['avg_speed_ms'][i])
+        for name in INT_METRICS:
+            row[name] = int(batch[name][i])
+        for name in FLOAT_METRICS[1:]:
+            row[name] = float(batch[name][i])
+        records.append(row)
+    return records
 
 def classify_scenario(metrics):
     """
@@ -204,4 +393,85 @@ def classify_scenario(metrics):
         return "Fast Arterial Road"
 
     # > 55 mph
-    return "Highway Cruising"
\ No newline at end of file
+    return "Highway Cruising"
+
+# === RULE TABLE (same 4-Tier logic as classify_scenario, expressed as data) ===
+# Rules are checked top to bottom and the first match wins.
+# Each condition is (metric, operator, threshold); a rule with no conditions always matches.
+SCENARIO_RULES = [
+    # TIER 1: CRITICAL / EMERGENCY
+    {'tier': 1, 'label': "EMERGENCY BRAKING",
+     'conditions': [('max_braking', '<', -4.5)]},
+    {'tier': 1, 'label': "EVASIVE SWERVE / AVOIDANCE",
+     'conditions': [('intent', '==', 1), ('max_lateral_accel', '>', 2.0)]},
+
+    # TIER 2: AGGRESSIVE / ABNORMAL
+    {'tier': 2, 'label': "Aggressive Cut-In / Turn",
+     'conditions': [('intent', 'in', (2, 3)), ('max_lateral_accel', '>', 2.5)]},
+    {'tier': 2, 'label': "Erratic / Jerky Driving",
+     'conditions': [('max_long_jerk', '>', 4.0), ('avg_speed_ms', '>', 5.0)]},
+    {'tier': 2, 'label': "Aggressive Launch",
+     'conditions': [('max_acceleration', '>', 3.0), ('avg_speed_ms', '<', 15.0)]},
+
+    # TIER 3: COMPLEX TRAFFIC PATTERNS
+    {'tier': 3, 'label': "Stop-and-Go Traffic",
+     'conditions': [('num_decelerations', '>=', 3), ('avg_speed_ms', '<', 9.0)]},
+    {'tier': 3, 'label': "Lane Weaving / Unstable",
+     'conditions': [('num_lateral_frames', '>=', 2), ('intent', '==', 1)]},
+    {'tier': 3, 'label': "Normal Lane Change / Turn",
+     'conditions': [('intent', 'in', (2, 3)), ('num_lateral_frames', '>=', 1)]},
+
+    # TIER 4: STEADY STATE
+    {'tier': 4, 'label': "Stationary / Idling",
+     'conditions': [('avg_speed_ms', '<', 1.0)]},
+    {'tier': 4, 'label': "Parking Lot / Residential Area",
+     'conditions': [('avg_speed_ms', '<', 7.0)]},
+    {'tier': 4, 'label': "City Surface Street",
+     'conditions': [('avg_speed_ms', '<', 16.0)]},
+    {'tier': 4, 'label': "Fast Arterial Road",
+     'conditions': [('avg_speed_ms', '<', 25.0)]},
+    {'tier': 4, 'label': "Highway Cruising",
+     'conditions': []},
+]
+
+SCENARIO_LABELS = [rule['label'] for rule in SCENARIO_RULES]
+
+# Code given to rows that match no rule (only possible with a custom table without a default)
+UNMATCHED_CODE = 255
+
+RULE_OPERATORS = {
+    '<': np.less,
+    '<=': np.less_equal,
+    '>': np.greater,
+    '>=': np.greater_equal,
+    '==': np.equal,
+    'in': np.isin,
+}
+
+def classify_scenarios(columns, rules=SCENARIO_RULES):
+    """
+    Vectorized version of classify_scenario: evaluates the rule table for all rows at once.
+
+    :param columns: Mapping (dict of arrays, DataFrame, ...) of metric name -> column
+    :param rules: Rule table, defaults to SCENARIO_RULES
+    :return: (codes, labels) - uint8 code per row and the label for each code
+    """
+    if len(rules) >= UNMATCHED_CODE:
+        raise ValueError(f"A rule table has at most {UNMATCHED_CODE - 1} rules (uint8 codes, "
+                         f"{UNMATCHED_CODE} = unmatched), got {len(rules)}")
+    names = {name for rule in rules for name, _, _ in rule['conditions']}
+    cols = {name: np.asarray(columns[name]) for name in names}
+    n = len(next(iter(cols.values()))) if cols else len(columns[next(iter(columns))])
+
+    codes = np.full(n, UNMATCHED_CODE, dtype=np.uint8)
+    unassigned = np.ones(n, dtype=bool)
+
+    for code, rule in enumerate(rules):
+        match = unassigned.copy()
+        for name, op, threshold in rule['conditions']:
+            match &= RULE_OPERATORS[op](cols[name], threshold)
+        codes[match] = code
+        unassigned &= ~match
+
+    labels = [rule['label'] for rule in rules]
+    return codes, labels
@@ -0,0 +1,310 @@
+### ECE143 Final Project Group 4
+### Waymo E2E Driving Analysis - Memory-Mapped Per-Timestep Series Store
+
+# analyze_driving_behavior reduces the per-timestep speed, longitudinal/lateral acceleration,
+# jerk and lateral displacement of every frame to a few peaks. This store keeps the series
+# themselves as a ragged array: one flat float32 file per series, the frames back to back,
+# plus one offsets array (frame i is buffer[offsets[i]:offsets[i + 1]]) and the scene_ids.
+# Readers memory-map the files, so a frame's series is a zero-copy slice and whole-store
+# scans (e.g. event onsets) are single vectorized passes over the buffers.
+#
+# Layout of a store directory:
+#   meta.json        series names, frame/timestep counts, source shard
+#   scene_ids.npy    (N,) unicode array
+#   offsets.npy      (N + 1,) int64 start of every frame in the per-timestep series
+#   <series>.f32     flat float32 buffer of one series
+# Series between consecutive timesteps (jerk, lateral displacement) have one value less per
+# frame; their offsets are offsets - arange(N + 1), so no second offsets array is stored.
+
+import glob
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from data.incremental_analysis import frame_window, pair_values, step_values
+
+# Per-timestep series (T values per frame), in step_values row order
+STEP_SERIES = ['speed', 'long_accel', 'lat_accel']
+# Series between consecutive timesteps (T - 1 values per frame), in pair_values row order
+PAIR_SERIES = ['long_jerk', 'lat_jerk', 'lateral_move']
+SERIES = STEP_SERIES + PAIR_SERIES
+
+META_NAME = 'meta.json'
+STORE_VERSION = 1
+
+def frame_series(data):
+    """
+    Per-timestep series of one frame, exactly as computed inside analyze_driving_behavior.
+    (Ingestion takes them from data.incremental_analysis.analyze_with_series instead, which
+    also returns the metrics, so the window is not processed twice.)
+
+    :param data: Parsed E2EDFrame (or KinematicsFrame)
+    :return: ((3, T) speed/long_accel/lat_accel, (3, T - 1) long_jerk/lat_jerk/lateral_move),
+             or None for frames analyze_driving_behavior skips (or with ragged state fields)
+    """
+    raw = frame_window(data)
+    if raw is None:
+        return None
+    steps = step_values(raw)
+    return steps, pair_values(raw, steps)
+
+def shard_store_path(series_dir, shard_path):
+    """Store directory of one shard inside series_dir (as written by process_shard)."""
+    return os.path.join(series_dir, os.path.basename(shard_path))
+
+class SeriesWriter:
+    """
+    Appends frames to a new series store. The store is built in '<path>.tmp' and moved
+    to path by close(), so readers never see a partially written store.
+
+        with SeriesWriter('series/shard-00000') as writer:
+            for data in frames:
+                writer.add(data)
+    """
+
+    def __init__(self, path, shard=None):
+        """
+        :param path: Store directory (replaced if it exists)
+        :param shard: Optional source shard path, recorded in meta.json
+        """
+        self.path = path
+        self.shard = shard
+        self._tmp_path = path + '.tmp'
+        if os.path.exists(self._tmp_path):
+            shutil.rmtree(self._tmp_path)
+        os.makedirs(self._tmp_path)
+        self._files = {name: open(os.path.join(self._tmp_path, name + '.f32'), 'wb') for name in SERIES}
+        self._scene_ids = []
+        self._offsets = [0]
+
+    def __len__(self):
+        return len(self._scene_ids)
+
+    def append(self, scene_id, steps, pairs):
+        """
+        Appends the series of one frame.
+
+        :param scene_id: scene_id of the frame
+        :param steps: (3, T) per-timestep series, STEP_SERIES order
+        :param pairs: (3, T - 1) series between timesteps, PAIR_SERIES order
+        """
+        steps = np.asarray(steps, dtype=np.float32)
+        pairs = np.asarray(pairs, dtype=np.float32)
+        if pairs.shape[1] != steps.shape[1] - 1:
+            raise ValueError(f"Frame {scene_id}: {steps.shape[1]} timesteps but {pairs.shape[1]} pair values")
+        for name, values in zip(STEP_SERIES, steps):
+            self._files[name].write(values.tobytes())
+        for name, values in zip(PAIR_SERIES, pairs):
+            self._files[name].write(values.tobytes())
+        self._scene_ids.append(scene_id)
+        self._offsets.append(self._offsets[-1] + steps.shape[1])
+
+    def add(self, data):
+        """
+        Computes and appends the series of a parsed frame.
+
+        :param data: Parsed E2EDFrame (or KinematicsFrame)
+        :return: True if the frame was stored, False if it has no series (see frame_series)
+        """
+        series = frame_series(data)
+        if series is None:
+            return False
+        self.append(data.frame.context.name, *series)
+        return True
+
+    def close(self):
+        """Finishes the store and moves it into place."""
+        for f in self._files.values():
+            f.close()
+        np.save(os.path.join(self._tmp_path, 'offsets.npy'), np.array(self._offsets, dtype=np.int64))
+        np.save(os.path.join(self._tmp_path, 'scene_ids.npy'), np.array(self._scene_ids, dtype=np.str_))
+        meta = {
+            'version': STORE_VERSION,
+            'shard': os.path.abspath(self.shard) if self.shard else None,
+            'num_frames': len(self._scene_ids),
+            'num_steps': self._offsets[-1],
+            'step_series': STEP_SERIES,
+            'pair_series': PAIR_SERIES,
+        }
+        with open(os.path.join(self._tmp_path, META_NAME), 'w') as f:
+            json.dump(meta, f, indent=1)
+
+        if os.path.exists(self.path):
+            shutil.rmtree(self.path)
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self):
+        """Discards the partially written store."""
+        for f in self._files.values():
+            f.close()
+        shutil.rmtree(self._tmp_path, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+class SeriesStore:
+    """
+    Read-only, memory-mapped view of one series store.
+
+        store = SeriesStore('series/shard-00000')
+        store.series(scene_id, 'long_accel')   # np.memmap slice, no copy
+        store[scene_id]                        # dict series name -> slice
+    """
+
+    def __init__(self, path):
+        """
+        :param path: Store directory written by SeriesWriter
+        """
+        with open(os.path.join(path, META_NAME)) as f:
+            self.meta = json.load(f)
+        if self.meta.get('version') != STORE_VERSION:
+            raise ValueError(f"{path} was written by an incompatible version of the series store")
+
+        self.path = path
+        self.scene_ids = np.load(os.path.join(path, 'scene_ids.npy'))
+        self.offsets = np.load(os.path.join(path, 'offsets.npy'))
+        self.pair_offsets = self.offsets - np.arange(len(self.offsets))
+        self._buffers = {}
+        self._rows = None
+
+    def __len__(self):
+        return len(self.scene_ids)
+
+    def __contains__(self, scene_id):
+        return scene_id in self.rows
+
+    @property
+    def rows(self):
+        """dict scene_id -> row (built on first use)."""
+        if self._rows is None:
+            self._rows = {scene_id: i for i, scene_id in enumerate(self.scene_ids.tolist())}
+        return self._rows
+
+    def buffer(self, name):
+        """
+        Flat memory-mapped buffer of one series (all frames back to back).
+
+        :param name: Series name, see SERIES
+        :return: (num_values,) float32 np.memmap
+        """
+        if name not in SERIES:
+            raise KeyError(f"Unknown series {name}, expected one of {SERIES}")
+        if name not in self._buffers:
+            path = os.path.join(self.path, name + '.f32')
+            if os.path.getsize(path) == 0:
+                # np.memmap cannot map an empty file
+                self._buffers[name] = np.zeros(0, dtype=np.float32)
+            else:
+                self._buffers[name] = np.memmap(path, dtype=np.float32, mode='r')
+        return self._buffers[name]
+
+    def series_offsets(self, name):
+        """(N + 1,) offsets of the frames in buffer(name)."""
+        return self.offsets if name in STEP_SERIES else self.pair_offsets
+
+    def series(self, scene_id, name):
+        """
+        One series of one frame.
+
+        :param scene_id: scene_id of the frame
+        :param name: Series name, see SERIES
+        :return: float32 view into the memory map
+        """
+        row = self.rows[scene_id]
+        offsets = self.series_offsets(name)
+        return self.buffer(name)[offsets[row]:offsets[row + 1]]
+
+    def __getitem__(self, scene_id):
+        return {name: self.series(scene_id, name) for name in SERIES}
+
+    def first_crossing(self, name, threshold, mode='above'):
+        """
+        First timestep of every frame at which a series crosses a threshold, in one pass
+        over the whole buffer (e.g. braking onset: 'long_accel' below -3.0).
+
+        :param name: Series name, see SERIES
+        :param threshold: Threshold value
+        :param mode: 'above' (value > threshold), 'below' (value < threshold) or 'abs' (|value| > threshold)
+        :return: pd.DataFrame with 'scene_id', 'onset' (index within the frame's series) and
+                 'value' at the onset, for the frames that cross it
+        """
+        values = self.buffer(name)
+        if mode == 'above':
+            hits = np.flatnonzero(values > threshold)
+        elif mode == 'below':
+            hits = np.flatnonzero(values < threshold)
+        elif mode == 'abs':
+            hits = np.flatnonzero(np.abs(values) > threshold)
+        else:
+            raise ValueError(f"Unknown mode {mode}, expected 'above', 'below' or 'abs'")
+
+        offsets = self.series_offsets(name)
+        frames = np.searchsorted(offsets, hits, side='right') - 1
+        # Hits are sorted, so the first hit of every frame is where its row first appears
+        rows, first = np.unique(frames, return_index=True)
+        return pd.DataFrame({
+            'scene_id': self.scene_ids[rows],
+            'onset': hits[first] - offsets[rows],
+            'value': np.asarray(values[hits[first]]),
+        })
+
+class ShardedSeriesStore:
+    """
+    The per-shard stores of a series_dir (see process_shard) behind one lookup by scene_id.
+    """
+
+    def __init__(self, series_dir):
+        """
+        :param series_dir: Directory holding one store per shard
+        """
+        paths = sorted(os.path.dirname(p) for p in glob.glob(os.path.join(series_dir, '*', META_NAME)))
+        self.stores = [SeriesStore(path) for path in paths if not path.endswith('.tmp')]
+        self._owners = None
+
+    def __len__(self):
+        return sum(len(store) for store in self.stores)
+
+    def __contains__(self, scene_id):
+        return scene_id in self.owners
+
+    @property
+    def owners(self):
+        """dict scene_id -> SeriesStore holding it (built on first use)."""
+        if self._owners is None:
+            self._owners = {scene_id: store for store in self.stores for scene_id in store.rows}
+        return self._owners
+
+    def series(self, scene_id, name):
+        """See SeriesStore.series."""
+        return self.owners[scene_id].series(scene_id, name)
+
+    def __getitem__(self, scene_id):
+        return self.owners[scene_id][scene_id]
+
+    def first_crossing(self, name, threshold, mode='above'):
+        """See SeriesStore.first_crossing (results of all shards concatenated)."""
+        parts = [store.first_crossing(name, threshold, mode) for store in self.stores]
+        if not parts:
+            return pd.DataFrame({'scene_id': [], 'onset': [], 'value': []})
+        return pd.concat(parts, ignore_index=True)
+
+def open_series_store(path):
+    """
+    Opens a single store or a series_dir of per-shard stores.
+
+    :param path: Store directory or series_dir
+    :return: SeriesStore or ShardedSeriesStore
+    """
+    if os.path.exists(os.path.join(path, META_NAME)):
+        return SeriesStore(path)
+    return ShardedSeriesStore(path)
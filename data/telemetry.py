@@ -0,0 +1,243 @@
+### ECE143 Final Project Group 4
+### Waymo E2E Driving Analysis - Pipeline Telemetry
+
+# Per-stage wall time, throughput and error counts of the read -> parse -> analyze ->
+# classify -> store loop. Timing is a "lap" clock: one perf_counter() call per stage
+# boundary and a dict update, well under a microsecond per stage, so it stays on
+# in production runs. Telemetry objects are picklable and mergeable across workers.
+
+import json
+import os
+import time
+from collections import defaultdict
+
+import pandas as pd
+
+STAGES = ['read', 'parse', 'analyze', 'classify', 'store']
+
+class PipelineTelemetry:
+    """
+    Collects per-stage timings, record/byte counts and errors by exception type.
+
+    Usage in a processing loop:
+
+        telemetry.start()
+        for record in records:         # time spent in the iterator is the 'read' stage
+            telemetry.lap('read', len(record))
+            data = parse(record);      telemetry.lap('parse')
+            ...
+            except Exception as e:     telemetry.error(e)
+        telemetry.stop()
+    """
+
+    def __init__(self, source=None, jsonl_path=None, flush_interval=5.0):
+        """
+        :param source: Label of the stream in reports (e.g. the shard name)
+        :param jsonl_path: If set, snapshots are appended to this JSON-lines file
+        :param flush_interval: Seconds between snapshots written to jsonl_path
+        """
+        self.source = source
+        self.jsonl_path = jsonl_path
+        self.flush_interval = flush_interval
+
+        self.stage_seconds = defaultdict(float)
+        self.num_records = 0
+        self.num_bytes = 0
+        self.errors = defaultdict(int)           # exception type -> count
+        self.errors_by_stage = defaultdict(int)  # stage the error happened in -> count
+        self.error_examples = {}                 # exception type -> first message
+        self.wall_seconds = 0.0
+
+        self._clock = time.perf_counter
+        self._started = None
+        self._last = None
+        self._stage = None
+        self._next_flush = None
+
+    def start(self):
+        """Starts (or resumes) the wall clock and the lap timer."""
+        now = self._clock()
+        self._started = now
+        self._last = now
+        self._next_flush = now + self.flush_interval
+        return self
+
+    def lap(self, stage, num_bytes=None):
+        """
+        Charges the time since the previous lap to a stage.
+        A 'read' lap also counts one record (and its bytes).
+
+        :param stage: Stage name (one of STAGES, or any custom name)
+        :param num_bytes: Record size, for bytes/s
+        """
+        now = self._clock()
+        self.stage_seconds[stage] += now - self._last
+        self._last = now
+        self._stage = stage
+
+        if stage == 'read':
+            self.num_records += 1
+            if num_bytes is not None:
+                self.num_bytes += num_bytes
+            if self.jsonl_path is not None and now >= self._next_flush:
+                self._next_flush = now + self.flush_interval
+                self.write_snapshot(now)
+
+    def reset_lap(self, stage=None):
+        """
+        Restarts the lap timer without charging the elapsed time to any stage
+        (e.g. time blocked on a full queue is not work of any stage).
+
+        :param stage: If set, the stage considered completed last (used by error())
+        """
+        self._last = self._clock()
+        if stage is not None:
+            self._stage = stage
+
+    def error(self, exc):
+        """
+        Counts a failed record. The time spent on it is charged to the stage that failed.
+
+        :param exc: The exception
+        :return: Name of the stage that failed
+        """
+        name = type(exc).__name__
+        # The failing stage is the one after the last completed lap
+        failed = STAGES[STAGES.index(self._stage) + 1] if self._stage in STAGES[:-1] else 'other'
+        self.lap(failed)
+        self.errors[name] += 1
+        self.errors_by_stage[failed] += 1
+        self.error_examples.setdefault(name, str(exc))
+        return failed
+
+    def stop(self):
+        """Stops the wall clock and writes a final snapshot."""
+        now = self._clock()
+        if self._started is not None:
+            self.wall_seconds += now - self._started
+            self._started = None
+        if self.jsonl_path is not None:
+            self.write_snapshot(now, final=True)
+        return self
+
+    @property
+    def num_errors(self):
+        return sum(self.errors.values())
+
+    def _elapsed(self, now=None):
+        running = (now or self._clock()) - self._started if self._started is not None else 0.0
+        return self.wall_seconds + running
+
+    def merge(self, other):
+        """
+        Adds another telemetry object (e.g. from another shard) into this one.
+        Wall time adds up, so rates of a merged object are per-worker rates.
+
+        :param other: PipelineTelemetry
+        :return: self
+        """
+        for stage, seconds in other.stage_seconds.items():
+            self.stage_seconds[stage] += seconds
+        for name, count in other.errors.items():
+            self.errors[name] += count
+        for stage, count in other.errors_by_stage.items():
+            self.errors_by_stage[stage] += count
+        for name, message in other.error_examples.items():
+            self.error_examples.setdefault(name, message)
+        self.num_records += other.num_records
+        self.num_bytes += other.num_bytes
+        self.wall_seconds += other._elapsed()
+        return self
+
+    def snapshot(self, now=None):
+        """
+        Current counters and rates as a JSON-serializable dict.
+
+        :return: dict with 'source', 'records', 'bytes', 'wall_s', 'records_per_s', 'mb_per_s',
+                 'stage_s', 'errors', 'errors_by_stage', 'bound'
+        """
+        wall = self._elapsed(now)
+        return {
+            'time': time.time(),
+            'source': self.source,
+            'records': self.num_records,
+            'bytes': self.num_bytes,
+            'wall_s': wall,
+            'records_per_s': self.num_records / wall if wall > 0 else None,
+            'mb_per_s': self.num_bytes / wall / 1e6 if wall > 0 else None,
+            'stage_s': dict(self.stage_seconds),
+            'errors': dict(self.errors),
+            'errors_by_stage': dict(self.errors_by_stage),
+            'bound': self.bound(),
+        }
+
+    def write_snapshot(self, now=None, final=False):
+        """
+        Appends one snapshot line to jsonl_path.
+        """
+        line = self.snapshot(now)
+        line['final'] = final
+        with open(self.jsonl_path, 'a') as f:
+            f.write(json.dumps(line) + '\n')
+
+    def bound(self):
+        """
+        'I/O-bound' if reading takes most of the staged time, else 'CPU-bound'
+        (None before any record was timed).
+        """
+        total = sum(self.stage_seconds.values())
+        if total == 0:
+            return None
+        return 'I/O-bound' if self.stage_seconds.get('read', 0.0) / total > 0.5 else 'CPU-bound'
+
+    def stage_table(self):
+        """
+        Per-stage totals.
+
+        :return: pd.DataFrame indexed by stage with 'seconds', 'share_%', 'us_per_record', 'errors'
+        """
+        stages = STAGES + [s for s in self.stage_seconds if s not in STAGES]
+        total = sum(self.stage_seconds.values())
+        rows = []
+        for stage in stages:
+            seconds = self.stage_seconds.get(stage, 0.0)
+            rows.append({
+                'stage': stage,
+                'seconds': seconds,
+                'share_%': 100.0 * seconds / total if total > 0 else 0.0,
+                'us_per_record': 1e6 * seconds / self.num_records if self.num_records else 0.0,
+                'errors': self.errors_by_stage.get(stage, 0),
+            })
+        return pd.DataFrame(rows).set_index('stage')
+
+    def report(self):
+        """
+        Human-readable summary: throughput, per-stage breakdown and errors by type.
+
+        :return: str
+        """
+        snap = self.snapshot()
+        lines = [
+            f"=== PIPELINE TELEMETRY{f' ({self.source})' if self.source else ''} ===",
+            f"Records: {snap['records']}  |  Bytes: {snap['bytes'] / 1e6:.1f} MB  |  Wall: {snap['wall_s']:.2f} s",
+            f"Throughput: {snap['records_per_s'] or 0:.1f} records/s, {snap['mb_per_s'] or 0:.2f} MB/s  ->  {snap['bound']}",
+            '',
+            self.stage_table().to_markdown(floatfmt='.2f'),
+        ]
+        if self.errors:
+            lines += ['', f"Errors: {self.num_errors}"]
+            for name, count in sorted(self.errors.items(), key=lambda x: x[1], reverse=True):
+                lines.append(f"  {name:<24} {count:>6}  e.g. {self.error_examples[name]}")
+        return '\n'.join(lines)
+
+def load_telemetry_jsonl(path):
+    """
+    Reads a telemetry JSON-lines stream.
+
+    :param path: File written by PipelineTelemetry
+    :return: pd.DataFrame, one row per snapshot
+    """
+    if not os.path.exists(path):
+        return pd.DataFrame()
+    with open(path) as f:
+        return pd.DataFrame([json.loads(line) for line in f if line.strip()])
@@ -0,0 +1,211 @@
+### ECE143 Final Project Group 4
+### Waymo E2E Driving Analysis - TFRecord Reader / Writer (no TensorFlow)
+
+# TFRecord framing (per record):
+#   uint64 length | uint32 masked_crc32c(length) | byte data[length] | uint32 masked_crc32c(data)
+# Reading the framing ourselves over a memory-mapped file avoids importing TensorFlow
+# (several seconds and hundreds of MB) and gives the byte offset of every record,
+# so a record can be fetched again later with a single seek.
+
+import mmap
+import struct
+
+# Optional: hardware-accelerated CRC32C. Without it a (slow) pure-Python table is used,
+# which is fine since CRC checking is off by default.
+try:
+    import crc32c as _crc32c_lib
+except ImportError:
+    _crc32c_lib = None
+FAST_CRC32C = _crc32c_lib is not None
+
+HEADER_SIZE = 12  # uint64 length + uint32 length crc
+FOOTER_SIZE = 4   # uint32 data crc
+
+_CRC32C_POLY = 0x82F63B78
+_CRC32C_TABLE = []
+for _i in range(256):
+    _crc = _i
+    for _ in range(8):
+        _crc = (_crc >> 1) ^ _CRC32C_POLY if _crc & 1 else _crc >> 1
+    _CRC32C_TABLE.append(_crc)
+
+def crc32c(data):
+    """
+    CRC32C (Castagnoli) checksum used by the TFRecord format.
+
+    :param data: bytes-like object
+    :return: Unsigned 32-bit checksum
+    """
+    if _crc32c_lib is not None:
+        return _crc32c_lib.crc32c(data)
+    crc = 0xFFFFFFFF
+    table = _CRC32C_TABLE
+    for b in bytes(data):
+        crc = table[(crc ^ b) & 0xFF] ^ (crc >> 8)
+    return crc ^ 0xFFFFFFFF
+
+def masked_crc32c(data):
+    """
+    Masked CRC32C as stored in TFRecord headers/footers.
+    """
+    crc = crc32c(data)
+    return (((crc >> 15) | (crc << 17)) + 0xA282EAD8) & 0xFFFFFFFF
+
+def iter_records(path, num_records=None, check_crc=False, start_offset=0):
+    """
+    Sequentially reads a TFRecord file through a memory map.
+    Records are zero-copy memoryview slices of the mapping; call bytes() on one
+    to keep it independently of the file.
+
+    :param path: Path to the TFRecord file
+    :param num_records: Stop after this many records (None = read all)
+    :param check_crc: Verify the length and data CRCs of every record
+    :param start_offset: Byte offset of the first record to read (a record boundary, e.g. to resume)
+    :return: Generator of (offset, record_view); offset is the start of the record header
+    """
+    with open(path, 'rb') as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty file, nothing to map
+            return
+
+    view = memoryview(mm)
+    size = len(view)
+    offset = start_offset
+    count = 0
+    try:
+        while offset < size and (num_records is None or count < num_records):
+            if offset + HEADER_SIZE > size:
+                raise ValueError(f"Truncated record header at byte {offset} of {path}")
+
+            length, length_crc = struct.unpack_from('<QI', view, offset)
+            # A corrupted length is reported as such, not as a truncated record
+            if check_crc and masked_crc32c(view[offset:offset + 8]) != length_crc:
+                raise ValueError(f"Corrupted record length at byte {offset} of {path}")
+            start = offset + HEADER_SIZE
+            end = start + length
+            if end + FOOTER_SIZE > size:
+                raise ValueError(f"Truncated record at byte {offset} of {path}")
+
+            record = view[start:end]
+            if check_crc:
+                data_crc, = struct.unpack_from('<I', view, end)
+                if masked_crc32c(record) != data_crc:
+                    raise ValueError(f"Corrupted record data at byte {offset} of {path}")
+
+            yield offset, record
+            offset = end + FOOTER_SIZE
+            count += 1
+    finally:
+        view.release()
+        try:
+            mm.close()
+        except BufferError:
+            # The caller still holds record views; the mapping is released with them
+            pass
+
+def iter_records_buffered(path, num_records=None, check_crc=False, buffer_size=1 << 22):
+    """
+    Same records as iter_records, read with buffered file reads instead of a memory map.
+    A page fault on a mapped network file stalls every Python thread, while read()
+    releases the GIL, so this is the variant to use from a background reader thread.
+
+    :param path: Path to the TFRecord file
+    :param num_records: Stop after this many records (None = read all)
+    :param check_crc: Verify the length and data CRCs of every record
+    :param buffer_size: Read-ahead buffer in bytes
+    :return: Generator of (offset, record_bytes)
+    """
+    with open(path, 'rb', buffering=buffer_size) as f:
+        offset = 0
+        count = 0
+        while num_records is None or count < num_records:
+            header = f.read(HEADER_SIZE)
+            if not header:
+                return
+            if len(header) < HEADER_SIZE:
+                raise ValueError(f"Truncated record header at byte {offset} of {path}")
+
+            length, length_crc = struct.unpack('<QI', header)
+            # Checked before reading, so a corrupted length does not trigger a huge read
+            if check_crc and masked_crc32c(header[:8]) != length_crc:
+                raise ValueError(f"Corrupted record length at byte {offset} of {path}")
+            record = f.read(length)
+            footer = f.read(FOOTER_SIZE)
+            if len(record) < length or len(footer) < FOOTER_SIZE:
+                raise ValueError(f"Truncated record at byte {offset} of {path}")
+
+            if check_crc:
+                data_crc, = struct.unpack('<I', footer)
+                if masked_crc32c(record) != data_crc:
+                    raise ValueError(f"Corrupted record data at byte {offset} of {path}")
+
+            yield offset, record
+            offset += HEADER_SIZE + length + FOOTER_SIZE
+            count += 1
+
+def read_record(f, offset, length=None):
+    """
+    Reads one record at a known offset.
+
+    :param f: Open binary file object
+    :param offset: Byte offset of the record header (as yielded by iter_records)
+    :param length: Record data length, if known (saves reading the header)
+    :return: Record bytes
+    """
+    if length is None:
+        f.seek(offset)
+        length, = struct.unpack('<Q', f.read(HEADER_SIZE)[:8])
+    else:
+        f.seek(offset + HEADER_SIZE)
+    data = f.read(length)
+    if len(data) < length:
+        raise ValueError(f"Truncated record at byte {offset}")
+    return data
+
+def encode_record(data, compute_crc=True):
+    """
+    Frames one record (header + data + footer).
+
+    :param data: Record bytes
+    :param compute_crc: Write real masked CRCs; if False they are zero (readable by
+                        iter_records without check_crc, but not by TensorFlow)
+    :return: Framed bytes
+    """
+    length = struct.pack('<Q', len(data))
+    length_crc = masked_crc32c(length) if compute_crc else 0
+    data_crc = masked_crc32c(data) if compute_crc else 0
+    return length + struct.pack('<I', length_crc) + bytes(data) + struct.pack('<I', data_crc)
+
+def write_records(path, records, compute_crc=True):
+    """
+    Writes records to a TFRecord file readable by iter_records and tf.data.TFRecordDataset.
+
+    :param path: Output file path (overwritten)
+    :param records: Iterable of record bytes
+    :param compute_crc: See encode_record (the pure-Python CRC takes ~0.25 s per MB)
+    :return: List of (offset, length) of the written records
+    """
+    locations = []
+    offset = 0
+    with open(path, 'wb') as f:
+        for data in records:
+            framed = encode_record(data, compute_crc)
+            f.write(framed)
+            locations.append((offset, len(data)))
+            offset += len(framed)
+    return locations
+
+def record_iterator(dataset_input, check_crc=False):
+    """
+    Yields raw records from a TFRecord path or, for backwards compatibility,
+    from an already constructed tf.data.Dataset.
+
+    :param dataset_input: Path to TFRecord file (str) or tf.data.Dataset object
+    :param check_crc: Verify record CRCs (path input only)
+    :return: Iterator of record bytes/memoryviews
+    """
+    if isinstance(dataset_input, str):
+        return (record for _, record in iter_records(dataset_input, check_crc=check_crc))
+    return dataset_input.as_numpy_iterator()
@@ -0,0 +1,404 @@
+### ECE143 Final Project Group 4
+### Waymo E2E Driving Analysis - Predicted Trajectory Evaluation against future_states
+
+# Scores predicted ego trajectories (e.g. planner candidates) against the ground-truth
+# future_states of every frame. The ground truth is extracted once (future positions,
+# current pose and the classify_scenario label of the past_states, computed in batches with
+# analyze_driving_behavior_batch) and can be saved to NPZ, so each further candidate is a
+# pure array computation: predictions are aligned to the ground truth by scene_id, padded to
+# (N, T) blocks with a validity mask, and ADE/FDE, lateral/longitudinal error and comfort
+# metrics are evaluated for all frames at once.
+#
+# Comfort metrics reuse analyze_driving_behavior_batch, so longitudinal / lateral acceleration
+# and jerk have exactly the definitions used for the past_states. Predictions only have waypoints,
+# so the predicted and the gt_ comfort metrics are both finite differences of the current position
+# followed by the waypoints; a perfect prediction reproduces its gt_ values exactly. The values of
+# the recorded future_states velocities and accelerations are reported separately (rec_ prefix).
+
+import multiprocessing as mp
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from data.fast_parse import parse_kinematics
+from data.ingestion import list_shards
+from data.scenario_classification import analyze_driving_behavior_batch, classify_scenarios, stack_past_states
+from data.tfrecord import iter_records
+
+DT = 0.25  # seconds between states
+
+# Comfort metrics taken from analyze_driving_behavior_batch
+COMFORT_METRICS = ['max_braking', 'max_acceleration', 'max_lateral_accel', 'max_long_jerk', 'max_lat_jerk']
+
+# Recorded future_states fields, (N, T) zero-padded arrays in the ground truth
+FUTURE_FIELDS = ['pos_x', 'pos_y', 'vel_x', 'vel_y', 'accel_x', 'accel_y']
+
+GROUND_TRUTH_KEYS = ['scene_id'] + FUTURE_FIELDS + ['lengths', 'current_x', 'current_y', 'heading',
+                                                    'intent', 'scenario']
+
+def _pad(rows, dtype=np.float32):
+    # List of 1-D arrays -> zero-padded (N, T) array and (N,) lengths
+    lengths = np.array([len(values) for values in rows], dtype=np.int64)
+    padded = np.zeros((len(rows), int(lengths.max()) if len(rows) else 0), dtype=dtype)
+    for i, values in enumerate(rows):
+        padded[i, :len(values)] = values
+    return padded, lengths
+
+def _ground_truth_batch(frames):
+    # Future states, current pose and scenario label of a batch of parsed frames
+    packed = stack_past_states(frames)
+    metrics = analyze_driving_behavior_batch(**packed)
+    codes, labels = classify_scenarios(metrics)
+    labels = np.array(labels + ['(unmatched)'], dtype=object)
+
+    last = np.maximum(packed['lengths'] - 1, 0)
+    rows = np.arange(len(frames))
+    future = {name: _pad([np.asarray(getattr(f.future_states, name)) for f in frames])[0]
+              for name in FUTURE_FIELDS}
+    lengths = np.array([len(f.future_states.pos_x) for f in frames], dtype=np.int64)
+    return {
+        'scene_id': packed['scene_ids'],
+        **future,
+        'lengths': lengths,
+        'current_x': packed['pos_x'][rows, last],
+        'current_y': packed['pos_y'][rows, last],
+        'heading': np.arctan2(packed['vel_y'][rows, last], packed['vel_x'][rows, last]),
+        'intent': packed['intents'],
+        'scenario': labels[np.minimum(codes, len(labels) - 1)],
+    }
+
+def _concat_ground_truth(parts):
+    if not parts:
+        return {key: np.zeros((0, 0) if key in FUTURE_FIELDS else 0) for key in GROUND_TRUTH_KEYS}
+    width = max(part['pos_x'].shape[1] for part in parts)
+    result = {}
+    for key in GROUND_TRUTH_KEYS:
+        if key in FUTURE_FIELDS:
+            result[key] = np.vstack([np.pad(part[key], ((0, 0), (0, width - part[key].shape[1]))) for part in parts])
+        else:
+            result[key] = np.concatenate([part[key] for part in parts])
+    return result
+
+def _shard_ground_truth(shard_path, num_samples=None, scene_ids=None, batch_size=4096):
+    """Pool worker: ground truth of the frames of one shard (those in scene_ids, if given)."""
+    parts, frames = [], []
+    for idx, (_, record) in enumerate(iter_records(shard_path, num_samples)):
+        try:
+            data = parse_kinematics(record, include_future=True)
+        except Exception as e:
+            print(f"Error record {idx} in {os.path.basename(shard_path)}: {type(e).__name__}: {e}")
+            continue
+        if scene_ids is not None and data.frame.context.name not in scene_ids:
+            continue
+        if len(data.past_states.pos_x) < 2 or len(data.future_states.pos_x) == 0:
+            continue
+        frames.append(data)
+        if len(frames) >= batch_size:
+            parts.append(_ground_truth_batch(frames))
+            frames = []
+    if frames:
+        parts.append(_ground_truth_batch(frames))
+    return _concat_ground_truth(parts)
+
+def load_ground_truth(shard_pattern, scene_ids=None, num_samples=None, num_workers=None, batch_size=4096):
+    """
+    Extracts the future trajectory and scenario label of every frame of a set of shards.
+
+    :param shard_pattern: Glob pattern string or list of shard paths
+    :param scene_ids: Only keep these frames (e.g. the scene_ids of the predictions); None = all
+    :param num_samples: Per-shard record limit (None = all records)
+    :param num_workers: Worker processes (None = os.cpu_count(), 1 = in-process)
+    :param batch_size: Frames classified at once with analyze_driving_behavior_batch
+    :return: dict of arrays: 'scene_id', FUTURE_FIELDS (N, T) recorded future states (zero-padded),
+             'lengths', 'current_x'/'current_y'/'heading' (last past state), 'intent', 'scenario'
+    """
+    shard_paths = list_shards(shard_pattern)
+    worker = partial(_shard_ground_truth, num_samples=num_samples,
+                     scene_ids=set(scene_ids) if scene_ids is not None else None, batch_size=batch_size)
+
+    num_workers = min(num_workers or os.cpu_count() or 1, max(len(shard_paths), 1))
+    if num_workers == 1:
+        parts = [worker(path) for path in shard_paths]
+    else:
+        ctx = mp.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=num_workers, mp_context=ctx) as executor:
+            parts = list(executor.map(worker, shard_paths))
+
+    ground_truth = _concat_ground_truth([part for part in parts if len(part['scene_id'])])
+    print(f"Loaded the future trajectories of {len(ground_truth['scene_id'])} frames from {len(shard_paths)} shards")
+    return ground_truth
+
+def save_ground_truth(ground_truth, path):
+    """
+    Writes ground truth from load_ground_truth as a compressed NPZ file (atomic replace),
+    so that further candidates are scored without re-reading the shards.
+
+    :param ground_truth: dict from load_ground_truth
+    :param path: Output path ending in '.npz'
+    """
+    arrays = {key: ground_truth[key] for key in GROUND_TRUTH_KEYS}
+    arrays['scene_id'] = np.asarray(arrays['scene_id'], dtype=str)
+    arrays['scenario'] = np.asarray(arrays['scenario'], dtype=str)
+    tmp_path = path[:-len('.npz')] + '.tmp.npz'
+    np.savez_compressed(tmp_path, **arrays)
+    os.replace(tmp_path, path)
+
+def read_ground_truth(path):
+    """
+    Loads ground truth written by save_ground_truth.
+
+    :param path: NPZ file path
+    :return: dict, see load_ground_truth
+    """
+    with np.load(path, allow_pickle=False) as npz:
+        ground_truth = {key: npz[key] for key in GROUND_TRUTH_KEYS}
+    ground_truth['scene_id'] = ground_truth['scene_id'].astype(object)
+    ground_truth['scenario'] = ground_truth['scenario'].astype(object)
+    return ground_truth
+
+def predictions_from_frame(df):
+    """
+    Converts a predictions table into padded arrays. Two layouts are accepted:
+    one row per frame with list-valued 'pos_x'/'pos_y' columns, or one row per
+    waypoint with 'scene_id', 'step', 'pos_x', 'pos_y'.
+
+    :param df: pd.DataFrame
+    :return: dict with 'scene_id' (N,), 'pos_x'/'pos_y' (N, H) and 'lengths' (N,)
+    """
+    if 'step' in df:
+        df = df.sort_values(['scene_id', 'step'], kind='stable')
+        scene_ids, starts, counts = np.unique(df['scene_id'].to_numpy(), return_index=True, return_counts=True)
+        order = np.argsort(starts)
+        scene_ids, starts, counts = scene_ids[order], starts[order], counts[order]
+        pos_x = np.split(df['pos_x'].to_numpy(np.float32), starts[1:])
+        pos_y = np.split(df['pos_y'].to_numpy(np.float32), starts[1:])
+    else:
+        scene_ids = df['scene_id'].to_numpy()
+        pos_x = [np.asarray(values, dtype=np.float32) for values in df['pos_x']]
+        pos_y = [np.asarray(values, dtype=np.float32) for values in df['pos_y']]
+    pos_x, lengths = _pad(pos_x)
+    pos_y, _ = _pad(pos_y)
+    return {'scene_id': np.asarray(scene_ids, dtype=object), 'pos_x': pos_x, 'pos_y': pos_y, 'lengths': lengths}
+
+def load_predictions(path):
+    """
+    Loads predicted trajectories keyed by scene_id, in the ground-truth coordinate frame.
+
+    .npz: 'scene_id' (N,) plus 'pos_x'/'pos_y' (N, H) or 'trajectory' (N, H, 2); optional 'lengths' (N,)
+    .parquet: see predictions_from_frame (needs pyarrow or fastparquet)
+
+    :param path: Predictions file path
+    :return: dict with 'scene_id', 'pos_x', 'pos_y', 'lengths'
+    """
+    if path.endswith('.parquet'):
+        return predictions_from_frame(pd.read_parquet(path))
+
+    with np.load(path, allow_pickle=False) as npz:
+        if 'trajectory' in npz:
+            trajectory = npz['trajectory']
+            pos_x, pos_y = trajectory[..., 0], trajectory[..., 1]
+        else:
+            pos_x, pos_y = npz['pos_x'], npz['pos_y']
+        lengths = npz['lengths'] if 'lengths' in npz else np.full(len(pos_x), pos_x.shape[1])
+        return {'scene_id': npz['scene_id'].astype(object), 'pos_x': pos_x.astype(np.float32),
+                'pos_y': pos_y.astype(np.float32), 'lengths': np.asarray(lengths, dtype=np.int64)}
+
+def trajectory_comfort(pos_x, pos_y, lengths):
+    """
+    Acceleration and jerk peaks of trajectories given only by positions: velocities and
+    accelerations are central finite differences, then analyze_driving_behavior_batch
+    projects them onto the direction of travel exactly as for the past_states.
+
+    :param pos_x, pos_y: (N, T) zero-padded positions (DT apart)
+    :param lengths: (N,) valid points per row
+    :return: dict COMFORT_METRICS name -> (N,) array (NaN for rows with fewer than 3 points)
+    """
+    pos_x = np.asarray(pos_x, dtype=np.float64)
+    pos_y = np.asarray(pos_y, dtype=np.float64)
+    lengths = np.asarray(lengths, dtype=np.int64)
+    vel_x, vel_y, accel_x, accel_y = (np.zeros_like(pos_x) for _ in range(4))
+
+    for length in np.unique(lengths[lengths >= 3]):
+        rows = np.flatnonzero(lengths == length)
+        for pos, vel, accel in ((pos_x, vel_x, accel_x), (pos_y, vel_y, accel_y)):
+            vel[rows, :length] = np.gradient(pos[rows, :length], DT, axis=1)
+            accel[rows, :length] = np.gradient(vel[rows, :length], DT, axis=1)
+
+    return state_comfort(pos_x, pos_y, vel_x, vel_y, accel_x, accel_y, np.where(lengths >= 3, lengths, 0))
+
+def state_comfort(pos_x, pos_y, vel_x, vel_y, accel_x, accel_y, lengths):
+    """
+    Acceleration and jerk peaks of trajectories with known velocities and accelerations
+    (e.g. the recorded future_states), projected as in analyze_driving_behavior_batch.
+
+    :param pos_x, pos_y, vel_x, vel_y, accel_x, accel_y: (N, T) zero-padded states (DT apart)
+    :param lengths: (N,) valid states per row
+    :return: dict COMFORT_METRICS name -> (N,) array (NaN for rows with fewer than 2 states)
+    """
+    lengths = np.asarray(lengths, dtype=np.int64)
+    batch = analyze_driving_behavior_batch(pos_x, pos_y, vel_x, vel_y, accel_x, accel_y,
+                                           lengths, np.zeros(len(lengths), dtype=np.int64))
+    return {name: np.where(batch['valid'], batch[name], np.nan) for name in COMFORT_METRICS}
+
+def _with_current_position(pos_x, pos_y, lengths, current_x, current_y):
+    # Prepends the current position, so that the first waypoint has a velocity and acceleration
+    return (np.column_stack([current_x, pos_x]), np.column_stack([current_y, pos_y]), lengths + 1)
+
+def evaluate_trajectories(predictions, ground_truth):
+    """
+    Per-frame displacement and comfort metrics of predicted trajectories.
+    Each frame is compared over the first min(predicted, future) waypoints.
+
+    :param predictions: dict from load_predictions / predictions_from_frame
+    :param ground_truth: dict from load_ground_truth / read_ground_truth
+    :return: pd.DataFrame with 'scene_id', 'scenario', 'horizon' (waypoints compared), 'ade', 'fde',
+             'lat_error' / 'long_error' (mean absolute error across / along the ground-truth path),
+             'final_lat_error' / 'final_long_error' (signed, lateral positive to the left), the
+             COMFORT_METRICS of the prediction, the same with a 'gt_' prefix for the ground-truth
+             waypoints and with a 'rec_' prefix for the recorded future velocities and accelerations.
+             Frames without ground truth are left out.
+
+    Predicted and gt_ comfort metrics are both computed by trajectory_comfort over the compared
+    waypoints; rec_ ones by state_comfort and are not directly comparable to the predicted ones.
+    """
+    rows = pd.Index(ground_truth['scene_id']).get_indexer(predictions['scene_id'])
+    matched = rows >= 0
+    if not matched.all():
+        print(f"Warning: {int((~matched).sum())} predicted frames have no ground truth and are skipped")
+    keep = np.flatnonzero(matched)
+    rows = rows[keep]
+
+    horizon = min(predictions['pos_x'].shape[1], ground_truth['pos_x'].shape[1])
+    lengths = np.minimum(predictions['lengths'][keep], ground_truth['lengths'][rows])
+    lengths = np.minimum(lengths, horizon)
+    px = predictions['pos_x'][keep, :horizon].astype(np.float64)
+    py = predictions['pos_y'][keep, :horizon].astype(np.float64)
+    gx = ground_truth['pos_x'][rows, :horizon].astype(np.float64)
+    gy = ground_truth['pos_y'][rows, :horizon].astype(np.float64)
+    mask = np.arange(horizon)[None, :] < lengths[:, None]
+    count = np.maximum(lengths, 1)
+    last = np.maximum(lengths - 1, 0)[:, None]
+
+    # --- DISPLACEMENT ---
+    ex, ey = px - gx, py - gy
+    errors = np.sqrt(ex**2 + ey**2)
+
+    # --- LATERAL / LONGITUDINAL (in the direction of the ground-truth path) ---
+    # Direction at step k: from the previous point (the current position for k = 0) to point k
+    cx = ground_truth['current_x'][rows].astype(np.float64)
+    cy = ground_truth['current_y'][rows].astype(np.float64)
+    tx = np.diff(np.column_stack([cx, gx]), axis=1)
+    ty = np.diff(np.column_stack([cy, gy]), axis=1)
+    norm = np.sqrt(tx**2 + ty**2)
+    # Not moving: fall back to the current heading
+    heading = ground_truth['heading'][rows].astype(np.float64)[:, None]
+    still = norm < 1e-3
+    tx = np.where(still, np.cos(heading), tx / np.where(still, 1.0, norm))
+    ty = np.where(still, np.sin(heading), ty / np.where(still, 1.0, norm))
+    long_errors = ex * tx + ey * ty
+    lat_errors = ex * (-ty) + ey * tx
+
+    result = pd.DataFrame({
+        'scene_id': np.asarray(predictions['scene_id'])[keep],
+        'scenario': ground_truth['scenario'][rows],
+        'horizon': lengths,
+        'ade': np.where(mask, errors, 0.0).sum(axis=1) / count,
+        'fde': np.take_along_axis(errors, last, axis=1)[:, 0] if horizon else np.zeros(len(keep)),
+        'lat_error': np.where(mask, np.abs(lat_errors), 0.0).sum(axis=1) / count,
+        'long_error': np.where(mask, np.abs(long_errors), 0.0).sum(axis=1) / count,
+        'final_lat_error': np.take_along_axis(lat_errors, last, axis=1)[:, 0] if horizon else np.zeros(len(keep)),
+        'final_long_error': np.take_along_axis(long_errors, last, axis=1)[:, 0] if horizon else np.zeros(len(keep)),
+    })
+    invalid = lengths == 0
+    result.loc[invalid, ['ade', 'fde', 'lat_error', 'long_error', 'final_lat_error', 'final_long_error']] = np.nan
+
+    # --- COMFORT ---
+    # Prediction and ground truth: finite differences over the compared waypoints, starting at the
+    # current position
+    predicted = trajectory_comfort(*_with_current_position(np.where(mask, px, 0.0), np.where(mask, py, 0.0),
+                                                           lengths, cx, cy))
+    actual = trajectory_comfort(*_with_current_position(np.where(mask, gx, 0.0), np.where(mask, gy, 0.0),
+                                                        lengths, cx, cy))
+    # Recorded velocities and accelerations over the same waypoints
+    recorded = state_comfort(*(ground_truth[name][rows, :horizon].astype(np.float64) for name in FUTURE_FIELDS),
+                             lengths)
+    for prefix, comfort in (('', predicted), ('gt_', actual), ('rec_', recorded)):
+        for name in COMFORT_METRICS:
+            result[prefix + name] = comfort[name]
+    return result
+
+def summarize_by_scenario(per_frame, miss_threshold=2.0):
+    """
+    Per-scenario breakdown of evaluate_trajectories, plus an 'ALL' row.
+
+    :param per_frame: DataFrame from evaluate_trajectories
+    :param miss_threshold: FDE (m) above which a frame counts as a miss
+    :return: pd.DataFrame with 'scenario', 'frames', mean/median ADE and FDE, 'miss_rate',
+             mean lateral/longitudinal error and mean comfort peaks (predicted and ground truth)
+    """
+    df = per_frame.assign(miss=(per_frame['fde'] > miss_threshold).astype(np.float64))
+
+    def summarize(group):
+        return pd.Series({
+            'frames': len(group),
+            'ade': group['ade'].mean(),
+            'ade_median': group['ade'].median(),
+            'fde': group['fde'].mean(),
+            'fde_median': group['fde'].median(),
+            'miss_rate': group['miss'].mean(),
+            'lat_error': group['lat_error'].mean(),
+            'long_error': group['long_error'].mean(),
+            'max_long_jerk': group['max_long_jerk'].mean(),
+            'gt_max_long_jerk': group['gt_max_long_jerk'].mean(),
+            'max_lat_jerk': group['max_lat_jerk'].mean(),
+            'gt_max_lat_jerk': group['gt_max_lat_jerk'].mean(),
+            'max_lateral_accel': group['max_lateral_accel'].mean(),
+            'gt_max_lateral_accel': group['gt_max_lateral_accel'].mean(),
+        })
+
+    rows = [summarize(group).rename(scenario) for scenario, group in df.groupby('scenario', sort=False)]
+    summary = pd.DataFrame(rows).sort_values('frames', ascending=False, kind='stable')
+    summary.loc['ALL'] = summarize(df)
+    summary['frames'] = summary['frames'].astype(np.int64)
+    return summary.rename_axis('scenario').reset_index()
+
+def evaluate_predictions(predictions, ground_truth, miss_threshold=2.0):
+    """
+    One-call evaluation of a set of predicted trajectories.
+
+        ground_truth = load_ground_truth(DATASET_DIR + '*.tfrecord-*')
+        save_ground_truth(ground_truth, 'ground_truth.npz')
+        result = evaluate_predictions('planner_v2.npz', 'ground_truth.npz')
+
+    :param predictions: Predictions file path or dict (see load_predictions)
+    :param ground_truth: dict from load_ground_truth or path of a saved one
+    :param miss_threshold: FDE (m) above which a frame counts as a miss
+    :return: dict with 'per_frame' and 'by_scenario' DataFrames
+    """
+    if isinstance(predictions, str):
+        predictions = load_predictions(predictions)
+    if isinstance(ground_truth, str):
+        ground_truth = read_ground_truth(ground_truth)
+    per_frame = evaluate_trajectories(predictions, ground_truth)
+    return {'per_frame': per_frame, 'by_scenario': summarize_by_scenario(per_frame, miss_threshold)}
+
+def compare_candidates(candidates, ground_truth, miss_threshold=2.0):
+    """
+    Scores several prediction sets (e.g. planner candidates) on the same ground truth.
+
+    :param candidates: dict name -> predictions file path or dict
+    :param ground_truth: dict from load_ground_truth or path of a saved one
+    :param miss_threshold: FDE (m) above which a frame counts as a miss
+    :return: pd.DataFrame of the by-scenario summaries with a leading 'candidate' column
+    """
+    if isinstance(ground_truth, str):
+        ground_truth = read_ground_truth(ground_truth)
+    summaries = []
+    for name, predictions in candidates.items():
+        summary = evaluate_predictions(predictions, ground_truth, miss_threshold)['by_scenario']
+        summary.insert(0, 'candidate', name)
+        summaries.append(summary)
+    return pd.concat(summaries, ignore_index=True)
@@ -0,0 +1,334 @@
+### ECE143 Final Project Group 4
+### Waymo E2E Driving Analysis - Pre-Aggregated Metrics Cube
+
+# The views of src/ group the raw rows on every call (groupby('scenario'), quantiles,
+# value_counts). AggregationCube bins the frames once along scenario x intent x speed bin
+# x score bin x shard and keeps, per non-empty cell, the frame count and the sum/min/max of
+# a few metrics. Filters and drill-downs then touch only the cells (thousands of rows,
+# however many frames sit underneath), so they answer in milliseconds. Score quantiles are
+# interpolated inside the score bins, between the exact min and max of each bin.
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from data.metrics_table import as_frame
+
+DIMENSIONS = ['scenario', 'intent', 'speed_bin', 'score_bin', 'shard']
+
+# Bin edges of avg_speed_ms (m/s) and interaction_score; values outside fall into open-ended end bins
+DEFAULT_SPEED_EDGES = np.arange(0.0, 42.5, 2.5)
+DEFAULT_SCORE_EDGES = np.arange(0.0, 50.5, 0.5)
+
+# Metrics with count/sum/min/max per cell (interaction_score is required for quantiles)
+DEFAULT_MEASURES = ['interaction_score', 'avg_speed_ms', 'max_braking', 'max_lateral_accel',
+                    'max_long_jerk', 'num_lateral_frames']
+
+# Binned dimension -> (metric it bins, attribute holding its edges)
+_BINNED = {'speed_bin': ('avg_speed_ms', 'speed_edges'), 'score_bin': ('interaction_score', 'score_edges')}
+
+def _bin_index(values, edges):
+    # 0 = below edges[0], len(edges) = at or above edges[-1]
+    return np.searchsorted(edges, values, side='right').astype(np.int16)
+
+def _bin_bounds(edges):
+    # (lower, upper) of every bin, including the two open-ended ones
+    padded = np.concatenate([[-np.inf], edges, [np.inf]])
+    return padded[:-1], padded[1:]
+
+def _as_list(value):
+    return list(value) if isinstance(value, (list, tuple, set, np.ndarray, pd.Index)) else [value]
+
+class AggregationCube:
+    """
+    Counts and sum/min/max of metrics per (scenario, intent, speed bin, score bin, shard) cell.
+
+        cube = AggregationCube.build(all_metrics)
+        cube.filter(intent=2, speed=(10, None)).aggregate('scenario')
+        cube.filter(scenario='EMERGENCY BRAKING').quantile([0.5, 0.9])
+    """
+
+    def __init__(self, cells, scenarios, shards, speed_edges=DEFAULT_SPEED_EDGES,
+                 score_edges=DEFAULT_SCORE_EDGES, measures=DEFAULT_MEASURES):
+        """
+        :param cells: DataFrame of dimension codes, 'count' and sum_/min_/max_<measure> columns
+        :param scenarios: Scenario labels, indexed by the 'scenario' codes
+        :param shards: Shard names, indexed by the 'shard' codes
+        :param speed_edges: Bin edges of avg_speed_ms
+        :param score_edges: Bin edges of interaction_score
+        :param measures: Aggregated metrics
+        """
+        self.cells = cells.reset_index(drop=True)
+        self.scenarios = list(scenarios)
+        self.shards = list(shards)
+        self.speed_edges = np.asarray(speed_edges, dtype=np.float64)
+        self.score_edges = np.asarray(score_edges, dtype=np.float64)
+        self.measures = list(measures)
+
+    @classmethod
+    def build(cls, all_metrics, speed_edges=DEFAULT_SPEED_EDGES, score_edges=DEFAULT_SCORE_EDGES,
+              measures=DEFAULT_MEASURES):
+        """
+        Bins and aggregates metrics rows.
+
+        :param all_metrics: List of metrics dicts, DataFrame or MetricsTable
+        :param speed_edges: Bin edges of avg_speed_ms
+        :param score_edges: Bin edges of interaction_score
+        :param measures: Metrics to aggregate
+        :return: AggregationCube
+        """
+        df = as_frame(all_metrics)
+        scenario_codes, scenarios = pd.factorize(df['scenario'], sort=True)
+        shard_column = df['shard'] if 'shard' in df else pd.Series('', index=df.index)
+        shard_codes, shards = pd.factorize(shard_column, sort=True)
+
+        keys = {
+            'scenario': scenario_codes.astype(np.int16),
+            'intent': df['intent'].to_numpy(np.int16),
+            'speed_bin': _bin_index(df['avg_speed_ms'].to_numpy(np.float64), np.asarray(speed_edges)),
+            'score_bin': _bin_index(df['interaction_score'].to_numpy(np.float64), np.asarray(score_edges)),
+            'shard': shard_codes.astype(np.int32),
+        }
+        # Every row is a cell of one frame: count 1, sum = min = max = value
+        values = {name: df[name].to_numpy(np.float64) for name in measures}
+        cells = _reduce(keys, np.ones(len(df), dtype=np.int64), values, values, values)
+        return cls(cells, scenarios, shards, speed_edges, score_edges, measures)
+
+    def __len__(self):
+        """Number of frames in the cube."""
+        return int(self.cells['count'].sum())
+
+    def merge(self, other):
+        """
+        Cube of the frames of both cubes (e.g. of two shards), built with the same bins and measures.
+
+        :param other: AggregationCube
+        :return: New AggregationCube
+        """
+        if (not np.array_equal(self.speed_edges, other.speed_edges)
+                or not np.array_equal(self.score_edges, other.score_edges) or self.measures != other.measures):
+            raise ValueError("Cubes with different bin edges or measures cannot be merged")
+
+        scenarios = sorted(set(self.scenarios) | set(other.scenarios))
+        shards = sorted(set(self.shards) | set(other.shards))
+        parts = []
+        for cube in (self, other):
+            cells = cube.cells.copy()
+            cells['scenario'] = np.searchsorted(scenarios, np.asarray(cube.scenarios, dtype=object)[cells['scenario']]
+                                                if len(cells) else []).astype(np.int16)
+            cells['shard'] = np.searchsorted(shards, np.asarray(cube.shards, dtype=object)[cells['shard']]
+                                             if len(cells) else []).astype(np.int32)
+            parts.append(cells)
+        cells = _reduce_cells(pd.concat(parts, ignore_index=True), DIMENSIONS, self.measures)
+        return AggregationCube(cells, scenarios, shards, self.speed_edges, self.score_edges, self.measures)
+
+    def filter(self, scenario=None, intent=None, shard=None, speed=None, score=None):
+        """
+        Sub-cube of the cells matching all given conditions.
+
+        :param scenario: Scenario label or list of labels
+        :param intent: Intent value or list of values
+        :param shard: Shard name or list of names
+        :param speed: (low, high) avg_speed_ms range, either end None for open; snapped outward to bin edges
+        :param score: (low, high) interaction_score range, same as speed
+        :return: AggregationCube
+        """
+        cells = self.cells
+        mask = np.ones(len(cells), dtype=bool)
+        if scenario is not None:
+            codes = [self.scenarios.index(s) for s in _as_list(scenario) if s in self.scenarios]
+            mask &= cells['scenario'].isin(codes).to_numpy()
+        if intent is not None:
+            mask &= cells['intent'].isin(_as_list(intent)).to_numpy()
+        if shard is not None:
+            codes = [self.shards.index(s) for s in _as_list(shard) if s in self.shards]
+            mask &= cells['shard'].isin(codes).to_numpy()
+        for dimension, value_range in (('speed_bin', speed), ('score_bin', score)):
+            if value_range is not None:
+                mask &= np.isin(cells[dimension].to_numpy(), self._bins_in_range(dimension, *value_range))
+        return AggregationCube(cells[mask], self.scenarios, self.shards, self.speed_edges, self.score_edges,
+                               self.measures)
+
+    def _bins_in_range(self, dimension, low, high):
+        lower, upper = _bin_bounds(getattr(self, _BINNED[dimension][1]))
+        low = -np.inf if low is None else low
+        high = np.inf if high is None else high
+        return np.flatnonzero((upper > low) & (lower < high))
+
+    def bin_labels(self, dimension):
+        """
+        Labels of the bins of a binned dimension, e.g. '[2.5, 5)'.
+
+        :param dimension: 'speed_bin' or 'score_bin'
+        :return: List of labels, indexed by bin
+        """
+        lower, upper = _bin_bounds(getattr(self, _BINNED[dimension][1]))
+        return [f"[{lo:g}, {hi:g})" for lo, hi in zip(lower, upper)]
+
+    def aggregate(self, by='scenario', measures=None):
+        """
+        Drill-down: counts and count/mean/min/max of the measures per group.
+
+        :param by: Dimension name or list of names (see DIMENSIONS); [] for a single total row
+        :param measures: Measures to report (defaults to all)
+        :return: pd.DataFrame with the decoded group columns, 'count' and <measure>_mean/_min/_max
+        """
+        by = _as_list(by)
+        measures = self.measures if measures is None else _as_list(measures)
+        result = _reduce_cells(self.cells, by, measures)
+
+        for name in measures:
+            result[f"{name}_mean"] = result.pop(f"sum_{name}") / result['count'].where(result['count'] > 0)
+            result[f"{name}_min"] = result.pop(f"min_{name}")
+            result[f"{name}_max"] = result.pop(f"max_{name}")
+        return self._decode(result, by)
+
+    def _decode(self, result, by):
+        # Codes back to labels
+        for dimension in by:
+            if dimension == 'scenario':
+                result['scenario'] = np.asarray(self.scenarios, dtype=object)[result['scenario'].to_numpy(np.int64)]
+            elif dimension == 'shard':
+                result['shard'] = np.asarray(self.shards, dtype=object)[result['shard'].to_numpy(np.int64)]
+            elif dimension in _BINNED:
+                result[dimension] = np.asarray(self.bin_labels(dimension), dtype=object)[result[dimension].to_numpy(np.int64)]
+        return result
+
+    @property
+    def scenario_counts(self):
+        """dict scenario -> number of frames"""
+        counts = self.aggregate('scenario', measures=[])
+        return dict(zip(counts['scenario'], counts['count'].tolist()))
+
+    def quantile(self, q, by=None):
+        """
+        Estimated interaction_score quantiles: exact bin by rank, then linear interpolation
+        between the smallest and largest score in that bin.
+
+        :param q: Quantile or list of quantiles in [0, 1]
+        :param by: Optional dimension (or list) to compute them per group
+        :return: float / array without by; otherwise pd.DataFrame with one column per quantile
+        """
+        if 'interaction_score' not in self.measures:
+            raise ValueError("Quantiles need 'interaction_score' among the cube measures")
+        qs = np.atleast_1d(np.asarray(q, dtype=np.float64))
+        if by is None:
+            result = _bin_quantiles(_reduce_cells(self.cells, ['score_bin'], ['interaction_score']), qs)
+            return float(result[0]) if np.isscalar(q) else result
+
+        by = _as_list(by)
+        # Score histogram of every group, split at the group boundaries
+        histogram = _reduce_cells(self.cells, by + ['score_bin'], ['interaction_score'])
+        groups = histogram[by].to_numpy()
+        starts = np.flatnonzero(np.r_[True, (groups[1:] != groups[:-1]).any(axis=1)]) if len(histogram) else []
+        ends = list(starts[1:]) + [len(histogram)]
+        rows = [[*groups[start], *_bin_quantiles(histogram.iloc[start:end], qs)]
+                for start, end in zip(starts, ends)]
+        result = pd.DataFrame(rows, columns=by + [float(x) for x in qs])
+        return self._decode(result, by)
+
+    def stats_table(self):
+        """
+        Per-scenario median/IQR/max/min of interaction_score, in the layout of interaction_stats_table.
+
+        :return: pd.DataFrame sorted by median (descending)
+        """
+        quantiles = self.quantile([0.25, 0.5, 0.75], by='scenario')
+        extremes = self.aggregate('scenario', measures='interaction_score')
+        stats_df = pd.DataFrame({
+            'scenario': quantiles['scenario'],
+            'median': quantiles[0.5],
+            'iqr': quantiles[0.75] - quantiles[0.25],
+            'max': extremes['interaction_score_max'],
+            'min': extremes['interaction_score_min'],
+        })
+        return stats_df.sort_values(by='median', ascending=False)
+
+    def save(self, path):
+        """
+        Writes the cube as a compressed NPZ file (atomic replace).
+
+        :param path: Output path ending in '.npz'
+        """
+        arrays = {f"cell_{name}": self.cells[name].to_numpy() for name in self.cells.columns}
+        arrays.update({
+            'scenarios': np.array(self.scenarios, dtype=str),
+            'shards': np.array(self.shards, dtype=str),
+            'speed_edges': self.speed_edges,
+            'score_edges': self.score_edges,
+            'measures': np.array(self.measures, dtype=str),
+        })
+        tmp_path = path[:-len('.npz')] + '.tmp.npz'
+        np.savez_compressed(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Loads a cube written by save().
+
+        :param path: Cube file path
+        :return: AggregationCube
+        """
+        with np.load(path, allow_pickle=False) as npz:
+            cells = pd.DataFrame({name[len('cell_'):]: npz[name] for name in npz.files if name.startswith('cell_')})
+            return cls(cells, npz['scenarios'].tolist(), npz['shards'].tolist(), npz['speed_edges'],
+                       npz['score_edges'], npz['measures'].tolist())
+
+def _reduce(keys, counts, sums, mins, maxs):
+    """
+    Cells of the distinct key combinations: counts and sums added up, mins/maxs reduced.
+
+    :param keys: dict dimension -> (n,) integer codes, in grouping order
+    :param counts: (n,) frame counts
+    :param sums, mins, maxs: dict measure -> (n,) sums / minima / maxima
+    :return: pd.DataFrame of the key columns, 'count' and sum_/min_/max_<measure>, sorted by key
+    """
+    n = len(counts)
+    # One int64 key per row (mixed radix over the shifted codes, so the order is lexicographic)
+    combined = np.zeros(n, dtype=np.int64)
+    for codes in keys.values():
+        codes = np.asarray(codes, dtype=np.int64)
+        if n:
+            codes = codes - codes.min()
+            combined = combined * (int(codes.max()) + 1) + codes
+    # One sort; every cell is a run of equal keys
+    order = np.argsort(combined, kind='stable')
+    sorted_keys = combined[order]
+    starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]]) if n else np.zeros(0, dtype=np.int64)
+    first = order[starts]
+
+    def reduce(ufunc, values):
+        return ufunc.reduceat(np.asarray(values)[order], starts) if n else np.zeros(0)
+
+    cells = {name: np.asarray(codes)[first] for name, codes in keys.items()}
+    cells['count'] = reduce(np.add, counts).astype(np.int64)
+    for name in sums:
+        cells[f"sum_{name}"] = reduce(np.add, sums[name])
+        cells[f"min_{name}"] = reduce(np.minimum, mins[name])
+        cells[f"max_{name}"] = reduce(np.maximum, maxs[name])
+    return pd.DataFrame(cells)
+
+def _reduce_cells(cells, by, measures):
+    # Regroups existing cells along a subset of the dimensions
+    return _reduce({name: cells[name].to_numpy() for name in by}, cells['count'].to_numpy(),
+                   {name: cells[f"sum_{name}"].to_numpy() for name in measures},
+                   {name: cells[f"min_{name}"].to_numpy() for name in measures},
+                   {name: cells[f"max_{name}"].to_numpy() for name in measures})
+
+def _bin_quantiles(histogram, qs):
+    # Score histogram (one row per score bin, sorted), with the exact score range of every bin
+    counts = histogram['count'].to_numpy(np.float64)
+    lows = histogram['min_interaction_score'].to_numpy()
+    highs = histogram['max_interaction_score'].to_numpy()
+    if counts.sum() == 0:
+        return np.full(len(qs), np.nan)
+    # Rank of every quantile (0 = smallest frame), located in the cumulative counts
+    ranks = qs * (counts.sum() - 1)
+    cum = np.cumsum(counts)
+    idx = np.minimum(np.searchsorted(cum, ranks, side='right'), len(counts) - 1)
+    start = cum[idx] - counts[idx]
+    # Position inside the bin, spreading its frames evenly between its min and max
+    frac = np.where(counts[idx] > 1, (ranks - start) / np.maximum(counts[idx] - 1, 1), 0.0)
+    return lows[idx] + np.clip(frac, 0.0, 1.0) * (highs[idx] - lows[idx])
@@ -3,26 +3,45 @@
 
 import seaborn as sns
 import matplotlib.pyplot as plt
-import pandas as pd
 import numpy as np
 
+from data.metrics_table import as_frame
+from src.aggregation_cube import AggregationCube
+from src.density import hist_kde, use_large_n
+from src.figure_output import show_or_save
+
 sns.set_theme(style="whitegrid")
 
-def plot_kinematic_statics(all_metrics):
+def _histplot(data, x, ax, color, bins, large_n):
+    # sns.histplot(kde=True), or its binned equivalent for large inputs
+    if large_n:
+        hist_kde(ax, data[x].to_numpy(), bins=bins, color=color, line_kws={'linewidth': 3})
+        ax.set_xlabel(x)
+        ax.set_ylabel('Count')
+    else:
+        sns.histplot(
+            data=data, x=x, ax=ax,
+            kde=True, color=color, bins=bins,
+            line_kws={'linewidth': 3}
+        )
+
+def plot_kinematic_statics(all_metrics, save_path=None, large_n=None):
     """
     Seaborn version of kinematic statistics 1x3 dashboard.
+
+    :param all_metrics: List of metrics dicts, DataFrame or MetricsTable
+    :param save_path: Write the figure to this file instead of showing it
+    :param large_n: Use pre-binned histograms + FFT KDE (src.density) instead of seaborn's exact KDE.
+                    None = automatically above LARGE_N_THRESHOLD rows
     """
-    df = pd.DataFrame(all_metrics)
+    df = as_frame(all_metrics)
+    large_n = use_large_n(len(df), large_n)
 
     fig, axes = plt.subplots(1, 3, figsize=(18, 5))
     fig.suptitle('Motion Data', fontsize=16, weight='bold', y=1.05)
 
     # --- PLOT 1: SPEED ---
-    sns.histplot(
-        data=df, x='avg_speed_ms', ax=axes[0], 
-        kde=True, color='skyblue', bins=25,
-        line_kws={'linewidth': 3}
-    )
+    _histplot(df, 'avg_speed_ms', axes[0], color='skyblue', bins=25, large_n=large_n)
     
     # Mean Line & Annotation
     mean_speed = df['avg_speed_ms'].mean()
@@ -38,11 +57,7 @@ def plot_kinematic_statics(all_metrics):
     # --- PLOT 2: BRAKING ---
     braking_data = df[df['max_braking'] < -0.1]
     
-    sns.histplot(
-        data=braking_data, x='max_braking', ax=axes[1], 
-        kde=True, color='coral', bins=30,
-        line_kws={'linewidth': 3}
-    )
+    _histplot(braking_data, 'max_braking', axes[1], color='coral', bins=30, large_n=large_n)
     
     # Threshold Line & Annotation
     axes[1].axvline(-3.0, color='red', linestyle='--', linewidth=2)
@@ -55,11 +70,7 @@ def plot_kinematic_statics(all_metrics):
     axes[1].set_xlabel("Max Deceleration (m/s²)")
 
     # --- PLOT 3: LATERAL ---
-    sns.histplot(
-        data=df, x='net_lateral_dist_m', ax=axes[2], 
-        kde=True, color='lightgreen', bins=30,
-        line_kws={'linewidth': 3}
-    )
+    _histplot(df, 'net_lateral_dist_m', axes[2], color='lightgreen', bins=30, large_n=large_n)
     
     # Threshold Line & Annotation
     axes[2].axvline(3.7, color='green', linestyle='--', linewidth=2)
@@ -72,20 +83,25 @@ def plot_kinematic_statics(all_metrics):
     axes[2].set_xlabel("Net Lateral Dist (m)")
 
     plt.tight_layout()
-    plt.show()
+    show_or_save(fig, save_path)
 
 
-def plot_scenario_distribution(all_metrics):
+def plot_scenario_distribution(all_metrics, save_path=None):
     """
     Seaborn version of scenario distribution bar chart.
-    """
-    df = pd.DataFrame(all_metrics)
 
+    :param all_metrics: List of metrics dicts, DataFrame or MetricsTable, or an AggregationCube
+    :param save_path: Write the figure to this file instead of showing it
+    """
     # Count and Sort
-    counts = df['scenario'].value_counts().reset_index()
+    if isinstance(all_metrics, AggregationCube):
+        counts = all_metrics.aggregate('scenario', measures=[])[['scenario', 'count']]
+        counts = counts.sort_values('count', ascending=False, kind='stable')
+    else:
+        counts = as_frame(all_metrics)['scenario'].value_counts().reset_index()
     counts.columns = ['scenario', 'count']
 
-    plt.figure(figsize=(10, 6))
+    fig = plt.figure(figsize=(10, 6))
     
     # Create Bar Plot
     ax = sns.barplot(
@@ -102,4 +118,4 @@ def plot_scenario_distribution(all_metrics):
     plt.xticks(rotation=15)
     
     plt.tight_layout()
-    plt.show()
\ No newline at end of file
+    show_or_save(fig, save_path)
\ No newline at end of file
@@ -0,0 +1,184 @@
+### ECE143 Final Project Group 4
+### Waymo E2E Driving Analysis - Headless Batch Rendering
+
+# Renders the event gallery (trajectory + camera panel per top event) and the
+# dashboards straight to PNG/PDF on the Agg backend, so a nightly job can produce
+# them unattended. Per-event figures are spread over a process pool.
+
+import multiprocessing as mp
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+import matplotlib.pyplot as plt
+
+from data.metrics_table import as_frame
+from data.record_index import load_record_index
+from data.tfrecord import read_record
+from src.baseline_plots import plot_kinematic_statics, plot_scenario_distribution
+from src.figure_output import collect_saved_paths, show_or_save
+from src.interaction_validation import plot_interaction
+from src.score_distribution import interaction_stats_table, plot_interaction_score
+from src.streaming_stats import TopKEvents
+from src.thumbnail_cache import ThumbnailCache
+from src.visualization import cached_event, render_event_figure
+
+def _use_agg():
+    matplotlib.use('Agg', force=True)
+
+def events_from_metrics(all_metrics, record_index, top_n=10):
+    """
+    Picks the top_n events by interaction_score and attaches their record locations.
+
+    :param all_metrics: List of metrics dicts, DataFrame or MetricsTable
+    :param record_index: dict scene_id -> (shard, offset, length), or path to a saved index
+    :param top_n: Number of events
+    :return: List of event dicts ('scene_id', 'score', 'location', 'metrics'), highest score first
+    """
+    if isinstance(record_index, str):
+        record_index = load_record_index(record_index)
+
+    df = as_frame(all_metrics)
+    top = df.sort_values('interaction_score', ascending=False).head(top_n)
+    events = []
+    for _, row in top.iterrows():
+        metrics = row.to_dict()
+        events.append({
+            'scene_id': metrics['scene_id'],
+            'score': metrics['interaction_score'],
+            'location': record_index.get(metrics['scene_id']),
+            'metrics': metrics,
+        })
+    return events
+
+def _event_file_name(rank, scene_id, fmt):
+    safe_id = re.sub(r'[^A-Za-z0-9_.-]+', '_', str(scene_id))
+    return f"event_{rank:03d}_{safe_id}.{fmt}"
+
+def _render_event(task):
+    """Pool worker: reads one record by location (unless cached), renders and saves its figure."""
+    rank, metrics, location, out_path, decode_workers, thumbnail_dir = task
+    # Full parse: the camera images are needed here
+    from waymo_open_dataset.protos import end_to_end_driving_data_pb2 as wod_e2ed_pb2
+
+    try:
+        thumbnail_cache = ThumbnailCache(thumbnail_dir) if thumbnail_dir is not None else None
+        cached = cached_event(thumbnail_cache, metrics['scene_id']) if thumbnail_cache is not None else None
+        if cached is not None:
+            fig = render_event_figure(cached[0], metrics, rank, decode_workers, thumbnail_cache, cached[1])
+        else:
+            shard, offset, length = location
+            with open(shard, 'rb') as f:
+                record = read_record(f, offset, length)
+            data = wod_e2ed_pb2.E2EDFrame()
+            data.ParseFromString(record)
+            fig = render_event_figure(data, metrics, rank, decode_workers, thumbnail_cache)
+        show_or_save(fig, out_path)
+        return out_path, None
+    except Exception as e:
+        plt.close('all')
+        return out_path, f"{type(e).__name__}: {e}"
+
+def render_event_reports(events, out_dir, fmt='png', num_workers=None, decode_workers=2, thumbnail_dir=None):
+    """
+    Renders one trajectory + camera figure per event to out_dir, in parallel.
+
+    :param events: TopKEvents, or list of event dicts (see events_from_metrics)
+    :param out_dir: Output directory
+    :param fmt: File format ('png', 'pdf', ...)
+    :param num_workers: Number of worker processes (None = os.cpu_count(), 1 = in-process)
+    :param decode_workers: Camera decoding threads per event
+    :param thumbnail_dir: Optional thumbnail cache directory (see src.thumbnail_cache), shared by the workers
+    :return: List of written file paths (events without a record location are skipped)
+    """
+    if isinstance(events, TopKEvents):
+        events = events.events()
+    os.makedirs(out_dir, exist_ok=True)
+
+    tasks = []
+    for rank, event in enumerate(events, start=1):
+        if event['location'] is None:
+            print(f"Warning: no record location for {event['scene_id']}, skipped")
+            continue
+        out_path = os.path.join(out_dir, _event_file_name(rank, event['scene_id'], fmt))
+        tasks.append((rank, event['metrics'], event['location'], out_path, decode_workers, thumbnail_dir))
+
+    if not tasks:
+        return []
+
+    num_workers = min(num_workers or os.cpu_count() or 1, len(tasks))
+    print(f"Rendering {len(tasks)} event reports with {num_workers} workers...")
+
+    if num_workers == 1:
+        previous_backend = matplotlib.get_backend()
+        _use_agg()
+        try:
+            outcomes = [_render_event(task) for task in tasks]
+        finally:
+            plt.switch_backend(previous_backend)
+    else:
+        ctx = mp.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=num_workers, mp_context=ctx, initializer=_use_agg) as executor:
+            outcomes = list(executor.map(_render_event, tasks))
+
+    written = []
+    for out_path, error in outcomes:
+        if error is None:
+            written.append(out_path)
+        else:
+            print(f"Error rendering {os.path.basename(out_path)}: {error}")
+    return written
+
+def render_dashboards(all_metrics, out_dir, fmt='png', score_summary=None):
+    """
+    Writes every dashboard of src/ to out_dir (Agg backend, figures closed after saving).
+
+    :param all_metrics: List of metrics dicts, DataFrame or MetricsTable
+    :param out_dir: Output directory
+    :param fmt: File format ('png', 'pdf', ...)
+    :param score_summary: Optional ScoreSummary for the stats table and the top-10% threshold
+    :return: List of file paths written by this call
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    path = lambda name: os.path.join(out_dir, f"{name}.{fmt}")
+
+    previous_backend = matplotlib.get_backend()
+    _use_agg()
+    try:
+        with collect_saved_paths() as written:
+            plot_kinematic_statics(all_metrics, save_path=path('kinematic_statics'))
+            plot_scenario_distribution(all_metrics, save_path=path('scenario_distribution'))
+            plot_interaction_score(all_metrics, save_path=path('interaction_score'))
+            plot_interaction(all_metrics, score_summary=score_summary, save_path=path('interaction'))
+        stats_path = os.path.join(out_dir, 'interaction_stats.md')
+        interaction_stats_table(score_summary if score_summary is not None else all_metrics, save_path=stats_path)
+        written.append(stats_path)
+    finally:
+        plt.close('all')
+        plt.switch_backend(previous_backend)
+
+    return sorted(written)
+
+def export_event_gallery(results, out_dir, fmt='png', top_n=None, num_workers=None, thumbnail_dir=None):
+    """
+    One-call nightly export from ingest_shards results: dashboards + top event reports.
+
+    :param results: dict returned by data.ingestion.ingest_shards
+    :param out_dir: Output directory (dashboards in out_dir, events in out_dir/events)
+    :param fmt: File format ('png', 'pdf', ...)
+    :param top_n: Number of events (None = all events in results['top_events'])
+    :param num_workers: Worker processes for the event reports
+    :param thumbnail_dir: Optional thumbnail cache directory, see render_event_reports
+    :return: List of written file paths
+    """
+    written = []
+    if len(results['all_metrics']):
+        written += render_dashboards(results['all_metrics'], out_dir, fmt, results.get('score_summary'))
+
+    events = results['top_events'].events()
+    if top_n is not None:
+        events = events[:top_n]
+    written += render_event_reports(events, os.path.join(out_dir, 'events'), fmt, num_workers,
+                                    thumbnail_dir=thumbnail_dir)
+    return written
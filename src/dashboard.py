@@ -0,0 +1,140 @@
+### ECE143 Final Project Group 4
+### Waymo E2E Driving Analysis - Interactive Plotly Dashboard over the Aggregation Cube
+
+# Four linked panels (frames per scenario, interaction_score histogram, speed histogram,
+# frames per intent) computed from an AggregationCube, never from the raw rows, so every
+# filter change is a query over the cube cells. cube_dashboard writes a self-contained
+# plotly figure with a drop-down over one dimension (e.g. scenario), every option
+# precomputed from the cube; interactive_dashboard drives the same panels from ipywidgets
+# controls in a notebook (any combination of filters, recomputed on every change).
+
+import os
+
+import numpy as np
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+PANEL_TITLES = ['Frames per Scenario', 'Interaction Score', 'Average Speed (m/s)', 'Frames per Intent']
+
+def _counts(cube, dimension, labels):
+    # Frame counts of a dimension, in a fixed label order (missing labels = 0)
+    counts = cube.aggregate(dimension, measures=[])
+    lookup = dict(zip(counts[dimension].tolist(), counts['count'].tolist()))
+    return [lookup.get(label, 0) for label in labels]
+
+def _axes(cube):
+    # Fixed x values of the four panels, so that filtering only changes the bar heights
+    intents = sorted(cube.cells['intent'].unique().tolist())
+    return [cube.scenarios, cube.bin_labels('score_bin'), cube.bin_labels('speed_bin'), intents]
+
+def panel_data(cube, axes=None):
+    """
+    Bar heights of the four dashboard panels.
+
+    :param cube: AggregationCube (typically a filtered one)
+    :param axes: x values of the panels (defaults to those of this cube)
+    :return: List of four (x, y) pairs, see PANEL_TITLES
+    """
+    axes = _axes(cube) if axes is None else axes
+    dimensions = ['scenario', 'score_bin', 'speed_bin', 'intent']
+    return [(x, _counts(cube, dimension, x)) for dimension, x in zip(dimensions, axes)]
+
+def _figure(data, title):
+    fig = make_subplots(rows=2, cols=2, subplot_titles=PANEL_TITLES)
+    colors = ['teal', 'indianred', 'steelblue', 'darkorange']
+    for i, ((x, y), color) in enumerate(zip(data, colors)):
+        fig.add_trace(go.Bar(x=[str(v) for v in x], y=y, marker_color=color, showlegend=False),
+                      row=i // 2 + 1, col=i % 2 + 1)
+    fig.update_layout(title=title, height=750, bargap=0.05)
+    fig.update_yaxes(title_text='Frames')
+    return fig
+
+def cube_dashboard(cube, filter_by='scenario', save_path=None, title='Driving Scenario Dashboard', **filters):
+    """
+    Dashboard figure with a drop-down over the values of one dimension.
+
+        cube_dashboard(cube, filter_by='scenario', intent=2, save_path='dashboard.html')
+
+    :param cube: AggregationCube
+    :param filter_by: Dimension of the drop-down ('scenario', 'intent' or 'shard'), None for no drop-down
+    :param save_path: Write a standalone HTML file instead of returning the figure
+    :param title: Figure title
+    :param filters: Fixed filters applied to every view, see AggregationCube.filter
+    :return: plotly Figure (None if saved)
+    """
+    base = cube.filter(**filters) if filters else cube
+    axes = _axes(cube)
+    fig = _figure(panel_data(base, axes), title)
+
+    if filter_by is not None:
+        if filter_by == 'scenario':
+            options = base.aggregate('scenario', measures=[])['scenario'].tolist()
+        elif filter_by in ('intent', 'shard'):
+            options = base.aggregate(filter_by, measures=[])[filter_by].tolist()
+        else:
+            raise ValueError(f"Cannot filter the dashboard by {filter_by}, expected 'scenario', 'intent' or 'shard'")
+
+        buttons = []
+        for option in [None] + options:
+            view = base if option is None else base.filter(**{filter_by: option})
+            heights = [y for _, y in panel_data(view, axes)]
+            label = 'All' if option is None else str(option)
+            buttons.append(dict(label=f"{label} ({len(view)})", method='restyle', args=[{'y': heights}]))
+        fig.update_layout(updatemenus=[dict(buttons=buttons, direction='down', x=1.0, xanchor='right',
+                                            y=1.12, yanchor='top')])
+
+    if save_path is None:
+        return fig
+    out_dir = os.path.dirname(save_path)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    fig.write_html(save_path, include_plotlyjs='cdn')
+
+def interactive_dashboard(cube, title='Driving Scenario Dashboard'):
+    """
+    Notebook dashboard: scenario/intent/shard selections and speed/score range sliders,
+    every change answered from the cube. Needs ipywidgets (preinstalled on Colab).
+
+    :param cube: AggregationCube
+    :param title: Figure title
+    :return: ipywidgets.VBox (display it, or leave it as the last expression of a cell)
+    """
+    try:
+        import ipywidgets as widgets
+    except ImportError as e:
+        raise ImportError("interactive_dashboard requires ipywidgets; use cube_dashboard for a static figure") from e
+
+    axes = _axes(cube)
+    fig = go.FigureWidget(_figure(panel_data(cube, axes), title))
+
+    def multi_select(description, options):
+        return widgets.SelectMultiple(options=options, description=description, rows=min(len(options), 6))
+
+    scenario = multi_select('Scenario', cube.scenarios)
+    intent = multi_select('Intent', axes[3])
+    shard = multi_select('Shard', cube.shards)
+    speed_edges, score_edges = cube.speed_edges, cube.score_edges
+    speed = widgets.FloatRangeSlider(value=(speed_edges[0], speed_edges[-1]), min=speed_edges[0],
+                                     max=speed_edges[-1], step=float(np.diff(speed_edges).min()), description='Speed')
+    score = widgets.FloatRangeSlider(value=(score_edges[0], score_edges[-1]), min=score_edges[0],
+                                     max=score_edges[-1], step=float(np.diff(score_edges).min()), description='Score')
+    status = widgets.Label()
+
+    def value_range(slider, edges):
+        # A handle at the end of the slider leaves that side open (includes the end bins)
+        low, high = slider.value
+        return (None if low <= edges[0] else low, None if high >= edges[-1] else high)
+
+    def update(_=None):
+        view = cube.filter(scenario=list(scenario.value) or None, intent=list(intent.value) or None,
+                           shard=list(shard.value) or None, speed=value_range(speed, speed_edges),
+                           score=value_range(score, score_edges))
+        with fig.batch_update():
+            for trace, (_, y) in zip(fig.data, panel_data(view, axes)):
+                trace.y = y
+        status.value = f"{len(view)} of {len(cube)} frames"
+
+    for control in (scenario, intent, shard, speed, score):
+        control.observe(update, names='value')
+    update()
+    return widgets.VBox([widgets.HBox([scenario, intent, shard]), widgets.HBox([speed, score]), status, fig])
@@ -0,0 +1,191 @@
+### ECE143 Final Project Group 4
+### Waymo E2E Driving Analysis - Large-n Density Rendering
+
+# Seaborn's histplot(kde=True) evaluates an exact Gaussian KDE (O(n * gridsize)) and
+# scatterplot draws one marker per row, so both stop being usable at millions of rows.
+# The helpers below bin the data once in NumPy (O(n), vectorized) and only draw
+# O(bins) artists: a histogram + binned FFT KDE for 1-D distributions and rasterized
+# 2-D maps for the scatter plots. Render time then depends on the grid size, not on n.
+
+import numpy as np
+import seaborn as sns
+from matplotlib.colors import to_rgb
+from matplotlib.patches import Patch
+
+# Above this many rows the plotting functions switch to the binned renderers
+LARGE_N_THRESHOLD = 100_000
+
+def use_large_n(n, large_n=None):
+    """
+    Decides whether to use the binned renderers.
+
+    :param n: Number of rows to plot
+    :param large_n: True/False to force a mode, None = automatic (n > LARGE_N_THRESHOLD)
+    :return: bool
+    """
+    return n > LARGE_N_THRESHOLD if large_n is None else bool(large_n)
+
+def _finite(values):
+    values = np.asarray(values, dtype=np.float64)
+    return values[np.isfinite(values)]
+
+def linear_binning(values, start, step, num_bins):
+    """
+    Spreads every value over its two nearest grid points (weights proportional to distance).
+
+    :param values: 1-D array inside [start, start + (num_bins - 1) * step]
+    :param start: First grid point
+    :param step: Grid spacing
+    :param num_bins: Number of grid points
+    :return: (num_bins,) array of weights summing to len(values)
+    """
+    pos = (values - start) / step
+    left = np.clip(np.floor(pos).astype(np.int64), 0, num_bins - 2)
+    frac = np.clip(pos - left, 0.0, 1.0)
+    return (np.bincount(left, 1.0 - frac, minlength=num_bins) +
+            np.bincount(left + 1, frac, minlength=num_bins))
+
+def binned_kde(values, gridsize=200, cut=0, bw_adjust=1.0, num_bins=2048):
+    """
+    Gaussian KDE with Scott's bandwidth (as seaborn / scipy), computed by linear binning
+    and an FFT convolution: O(n + num_bins log num_bins) instead of O(n * gridsize).
+
+    :param values: 1-D data
+    :param gridsize: Number of evaluation points
+    :param cut: Extend the support this many bandwidths past the data (seaborn's histplot uses 0)
+    :param bw_adjust: Bandwidth multiplier
+    :param num_bins: Resolution of the binning grid
+    :return: (support, density) arrays; empty if the data is constant or has < 2 values
+    """
+    values = _finite(values)
+    n = len(values)
+    if n < 2:
+        return np.zeros(0), np.zeros(0)
+    bandwidth = bw_adjust * n ** (-1 / 5) * values.std(ddof=1)
+    if not bandwidth > 0:
+        return np.zeros(0), np.zeros(0)
+
+    # Binning grid wide enough that the kernel tails of the extreme values are not clipped
+    pad = 4 * bandwidth + cut * bandwidth
+    start, stop = values.min() - pad, values.max() + pad
+    step = (stop - start) / (num_bins - 1)
+    counts = linear_binning(values, start, step, num_bins)
+
+    # Kernel sampled on the grid, truncated at 4 bandwidths
+    half_width = min(num_bins - 1, int(np.ceil(4 * bandwidth / step)))
+    offsets = np.arange(-half_width, half_width + 1) * step
+    kernel = np.exp(-0.5 * (offsets / bandwidth) ** 2) / (bandwidth * np.sqrt(2 * np.pi))
+
+    size = 1 << int(np.ceil(np.log2(num_bins + len(kernel))))
+    smoothed = np.fft.irfft(np.fft.rfft(counts, size) * np.fft.rfft(kernel, size), size)
+    density = smoothed[half_width:half_width + num_bins] / n
+
+    grid = start + step * np.arange(num_bins)
+    support = np.linspace(values.min() - cut * bandwidth, values.max() + cut * bandwidth, gridsize)
+    return support, np.maximum(np.interp(support, grid, density), 0.0)
+
+def hist_kde(ax, values, bins=30, color=None, line_kws=None, alpha=0.75):
+    """
+    Large-n stand-in for sns.histplot(kde=True): count histogram plus a binned KDE line
+    scaled to counts, with the same bin edges.
+
+    :param ax: Matplotlib axes
+    :param values: 1-D data
+    :param bins: Number of histogram bins
+    :param color: Bar and line color
+    :param line_kws: Keyword arguments of the KDE line
+    :param alpha: Bar opacity
+    """
+    values = _finite(values)
+    if len(values) == 0:
+        return
+    counts, edges = np.histogram(values, bins=bins)
+    ax.bar(edges[:-1], counts, width=np.diff(edges), align='edge',
+           color=color, alpha=alpha, edgecolor='white', linewidth=0.5)
+
+    support, density = binned_kde(values)
+    if len(support):
+        # Density -> counts per bin, as seaborn scales the KDE of a count histogram
+        scale = len(values) * np.diff(edges).mean()
+        ax.plot(support, density * scale, color=color, **(line_kws or {}))
+
+def _grid_indices(x, y, extent, gridsize):
+    x_min, x_max, y_min, y_max = extent
+    nx, ny = gridsize
+    ix = np.clip(((x - x_min) / (x_max - x_min or 1.0) * nx).astype(np.int64), 0, nx - 1)
+    iy = np.clip(((y - y_min) / (y_max - y_min or 1.0) * ny).astype(np.int64), 0, ny - 1)
+    return iy * nx + ix
+
+def _extent(x, y):
+    def span(values):
+        lo, hi = float(values.min()), float(values.max())
+        return (lo - 0.5, hi + 0.5) if lo == hi else (lo, hi)
+    return span(x) + span(y)
+
+def _show_grid(ax, image, extent, **kwargs):
+    ax.imshow(image, origin='lower', extent=extent, aspect='auto', interpolation='nearest', **kwargs)
+
+def binned_mean_map(ax, x, y, values, gridsize=(80, 60), cmap='viridis', norm=None):
+    """
+    Rasterized map of the mean of `values` per cell (the binned version of a scatter
+    plot colored by a continuous variable). Empty cells stay transparent.
+
+    :param ax: Matplotlib axes
+    :param x, y: 1-D positions
+    :param values: 1-D color variable
+    :param gridsize: (columns, rows) of the raster
+    :param cmap: Colormap
+    :param norm: Optional matplotlib Normalize for the color scale
+    :return: AxesImage
+    """
+    x, y, values = (np.asarray(a, dtype=np.float64) for a in (x, y, values))
+    keep = np.isfinite(x) & np.isfinite(y) & np.isfinite(values)
+    x, y, values = x[keep], y[keep], values[keep]
+    if len(x) == 0:
+        return None
+    extent = _extent(x, y)
+    cells = _grid_indices(x, y, extent, gridsize)
+    size = gridsize[0] * gridsize[1]
+    counts = np.bincount(cells, minlength=size)
+    sums = np.bincount(cells, values, minlength=size)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        image = (sums / counts).reshape(gridsize[1], gridsize[0])
+    _show_grid(ax, image, extent, cmap=cmap, norm=norm)
+    return ax.images[-1]
+
+def category_map(ax, x, y, categories, palette='bright', gridsize=(80, 60), legend_title=None):
+    """
+    Rasterized version of a scatter plot with a categorical hue: every cell takes the
+    color of its most frequent category, with opacity growing with the (log) point count.
+
+    :param ax: Matplotlib axes
+    :param x, y: 1-D positions
+    :param categories: 1-D category labels
+    :param palette: Seaborn palette name
+    :param gridsize: (columns, rows) of the raster
+    :param legend_title: Title of the category legend
+    """
+    x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+    keep = np.isfinite(x) & np.isfinite(y)
+    x, y = x[keep], y[keep]
+    labels, codes = np.unique(np.asarray(categories, dtype=object)[keep].astype(str), return_inverse=True)
+    if len(x) == 0:
+        return
+
+    extent = _extent(x, y)
+    size = gridsize[0] * gridsize[1]
+    cells = _grid_indices(x, y, extent, gridsize)
+    # (categories, cells) counts in one bincount
+    per_category = np.bincount(codes * size + cells, minlength=len(labels) * size).reshape(len(labels), size)
+    total = per_category.sum(axis=0)
+    dominant = per_category.argmax(axis=0)
+
+    colors = np.array([to_rgb(c) for c in sns.color_palette(palette, len(labels))])
+    rgba = np.zeros((size, 4))
+    rgba[:, :3] = colors[dominant]
+    occupied = total > 0
+    rgba[occupied, 3] = 0.35 + 0.65 * np.log1p(total[occupied]) / np.log1p(total.max())
+    _show_grid(ax, rgba.reshape(gridsize[1], gridsize[0], 4), extent)
+
+    handles = [Patch(color=colors[i], label=label) for i, label in enumerate(labels)]
+    ax.legend(handles=handles, bbox_to_anchor=(1.05, 1), loc='upper left', borderaxespad=0, title=legend_title)
@@ -0,0 +1,63 @@
+### ECE143 Final Project Group 4
+### Waymo E2E Driving Analysis - Figure Output Helpers
+
+import os
+from contextlib import contextmanager
+
+import matplotlib.pyplot as plt
+
+# List receiving the paths written by show_or_save inside collect_saved_paths (None = not collecting)
+_saved_paths = None
+
+@contextmanager
+def collect_saved_paths():
+    """
+    Records the files that show_or_save writes inside the block.
+
+        with collect_saved_paths() as written:
+            plot_interaction(all_metrics, save_path='out/interaction.png')
+
+    :return: Context manager yielding the list of written paths
+    """
+    global _saved_paths
+    previous, _saved_paths = _saved_paths, []
+    try:
+        yield _saved_paths
+    finally:
+        if previous is not None:
+            previous.extend(_saved_paths)
+        _saved_paths = previous
+
+def show_or_save(fig, save_path=None, dpi=None):
+    """
+    Shows a figure interactively, or writes it to a file and closes it
+    (closing matters for batch jobs: open figures are never freed otherwise).
+
+    :param fig: matplotlib Figure
+    :param save_path: Output file (.png/.pdf/...); None = plt.show()
+    :param dpi: Optional output resolution
+    """
+    if save_path is None:
+        plt.show()
+        return
+
+    out_dir = os.path.dirname(save_path)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    fig.savefig(save_path, bbox_inches='tight', dpi=dpi)
+    plt.close(fig)
+    if _saved_paths is not None:
+        _saved_paths.append(save_path)
+
+def suffixed_path(save_path, suffix):
+    """
+    Derives the file name of an additional figure: 'out/plot.png' -> 'out/plot_<suffix>.png'.
+
+    :param save_path: Base output path (or None)
+    :param suffix: Figure name suffix
+    :return: Path (None if save_path is None)
+    """
+    if save_path is None:
+        return None
+    root, ext = os.path.splitext(save_path)
+    return f"{root}_{suffix}{ext or '.png'}"
@@ -3,29 +3,62 @@
 
 import seaborn as sns
 import matplotlib.pyplot as plt
-import pandas as pd
 import numpy as np
 
+from data.metrics_table import as_frame
+from src.density import binned_mean_map, category_map, use_large_n
+from src.figure_output import show_or_save, suffixed_path
+from src.streaming_stats import TopKEvents
+
 # Set theme
 sns.set_theme(style="whitegrid")
 
-def plot_interaction(all_metrics):
+def plot_interaction(all_metrics, score_summary=None, save_path=None, large_n=None):
     """
     Seaborn version: Deep dive into high interaction score events.
     1) Risk Context: Speed vs Interaction Score (Categorical Color)
     2) Dynamics Map: Lateral Accel vs Max Braking (Continuous Gradient Color)
+
+    :param all_metrics: List of metrics dicts (or DataFrame), or a TopKEvents selector
+                        (only its retained events can be plotted; requires score_summary)
+    :param score_summary: Optional ScoreSummary; the top-10% threshold is then read from its sketch
+                          (required for a TopKEvents input)
+    :param save_path: Write the figures to files instead of showing them
+                      ('out/plot.png' -> 'out/plot_risk_context.png', 'out/plot_dynamics_map.png')
+    :param large_n: Draw rasterized density maps (src.density) instead of one marker per event.
+                    None = automatically above LARGE_N_THRESHOLD rows in all_metrics
     """
-    df = pd.DataFrame(all_metrics)
+    top_events = None
+    if isinstance(all_metrics, TopKEvents):
+        if score_summary is None:
+            raise ValueError("plot_interaction needs score_summary with a TopKEvents input: "
+                             "the top-10% threshold cannot be estimated from the K retained events")
+        top_events = all_metrics
+        all_metrics = all_metrics.metrics_rows()
+
+    df = as_frame(all_metrics)
 
     # 1. Filter High Interaction (Top 10%)
-    threshold = df['interaction_score'].quantile(0.90)
+    if score_summary is not None:
+        threshold = score_summary.quantile(0.90)
+    else:
+        threshold = df['interaction_score'].quantile(0.90)
     hi_df = df[df['interaction_score'] >= threshold].copy()
 
+    selection = "top 10% events"
+    if top_events is not None and len(top_events) >= top_events.k and threshold <= df['interaction_score'].min():
+        # The heap is smaller than the top 10%: events between the threshold and its lowest score were dropped
+        print(f"Warning: the top 10% (score > {threshold:.1f}) holds more events than the {top_events.k} "
+              f"kept by TopKEvents; plotting the top {top_events.k} only")
+        selection = f"top {len(hi_df)} events"
+
     if hi_df.empty:
         print(f"No events found above score threshold {threshold:.1f}")
         return
 
     print(f"Visualizing {len(hi_df)} Critical Events (Score > {threshold:.1f})")
+    # Keyed on the dataset size: the top 10% of a large split is still too many markers
+    large_n = use_large_n(len(df), large_n)
 
     # Clean up names for legend
     hi_df['scenario_clean'] = hi_df['scenario'].str.replace('/', '/\n')
@@ -37,55 +70,66 @@ def plot_interaction(all_metrics):
     # FIGURE 1: RISK CONTEXT (Speed vs. Score)
     # =========================================================================
     
-    plt.figure(figsize=(10, 6))
+    fig = plt.figure(figsize=(10, 6))
     
-    sns.scatterplot(
-        data=hi_df,
-        x='avg_speed_ms',
-        y='interaction_score',
-        hue='scenario_clean',
-        palette='bright', # High contrast
-        s=100,            # Marker size
-        alpha=0.8,
-        edgecolor='black'
-    )
+    if large_n:
+        # One raster cell per speed/score bin, colored by its most frequent scenario
+        category_map(plt.gca(), hi_df['avg_speed_ms'], hi_df['interaction_score'],
+                     hi_df['scenario_clean'], palette='bright', legend_title="Scenario")
+    else:
+        sns.scatterplot(
+            data=hi_df,
+            x='avg_speed_ms',
+            y='interaction_score',
+            hue='scenario_clean',
+            palette='bright', # High contrast
+            s=100,            # Marker size
+            alpha=0.8,
+            edgecolor='black'
+        )
 
     # Titles
     plt.suptitle("Risk Context", fontsize=16, weight='bold', y=0.98)
-    plt.title(f"(Score vs Speed for top 10% events > {threshold:.1f})", fontsize=11, style='italic', pad=10)
+    plt.title(f"(Score vs Speed for {selection} > {threshold:.1f})", fontsize=11, style='italic', pad=10)
     
     plt.xlabel("Avg Speed (m/s)")
     plt.ylabel("Interaction Score")
     
-    # Move legend outside
-    plt.legend(bbox_to_anchor=(1.05, 1), loc='upper left', borderaxespad=0, title="Scenario")
+    # Move legend outside (category_map places its own)
+    if not large_n:
+        plt.legend(bbox_to_anchor=(1.05, 1), loc='upper left', borderaxespad=0, title="Scenario")
     
-    plt.show()
+    show_or_save(fig, suffixed_path(save_path, 'risk_context'))
 
     # =========================================================================
     # FIGURE 2: DYNAMICS MAP (Braking vs. Swerving)
     # =========================================================================
     
     fig, ax = plt.subplots(figsize=(10, 6))
+    norm = plt.Normalize(hi_df['net_lateral_dist_m'].min(), hi_df['net_lateral_dist_m'].max())
     
-    # We use 'hue' for the color, but we turn off the default legend
-    # so we can build a proper Colorbar later.
-    scatter = sns.scatterplot(
-        data=hi_df,
-        x='max_lateral_accel',
-        y='braking_abs',
-        hue='net_lateral_dist_m',
-        palette='viridis',
-        s=120, # Slightly larger for emphasis
-        alpha=0.9,
-        edgecolor='black',
-        legend=False, # We will make our own colorbar
-        ax=ax
-    )
+    if large_n:
+        # Mean net lateral distance per lateral-accel/braking bin
+        binned_mean_map(ax, hi_df['max_lateral_accel'], hi_df['braking_abs'],
+                        hi_df['net_lateral_dist_m'], cmap='viridis', norm=norm)
+    else:
+        # We use 'hue' for the color, but we turn off the default legend
+        # so we can build a proper Colorbar later.
+        scatter = sns.scatterplot(
+            data=hi_df,
+            x='max_lateral_accel',
+            y='braking_abs',
+            hue='net_lateral_dist_m',
+            palette='viridis',
+            s=120, # Slightly larger for emphasis
+            alpha=0.9,
+            edgecolor='black',
+            legend=False, # We will make our own colorbar
+            ax=ax
+        )
     
     # --- CUSTOM COLORBAR LOGIC ---
     # This creates the gradient bar on the right side
-    norm = plt.Normalize(hi_df['net_lateral_dist_m'].min(), hi_df['net_lateral_dist_m'].max())
     sm = plt.cm.ScalarMappable(cmap="viridis", norm=norm)
     sm.set_array([])
     
@@ -100,4 +144,4 @@ def plot_interaction(all_metrics):
     plt.xlabel("Max Lateral Accel (m/s²)")
     plt.ylabel("Max Braking Force (m/s²)")
 
-    plt.show()
\ No newline at end of file
+    show_or_save(fig, suffixed_path(save_path, 'dynamics_map'))
\ No newline at end of file
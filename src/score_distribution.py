@@ -3,7 +3,11 @@
 
 import seaborn as sns
 import matplotlib.pyplot as plt
-import pandas as pd
+
+from data.metrics_table import as_frame
+from src.aggregation_cube import AggregationCube
+from src.figure_output import show_or_save
+from src.streaming_stats import ScoreSummary
 
 sns.set_theme(style="whitegrid")
 
@@ -16,14 +20,22 @@ def iqr(x):
     """
     return x.quantile(0.75) - x.quantile(0.25)
 
-def interaction_stats_table(all_metrics):
+def interaction_stats_table(all_metrics, save_path=None):
     """
     Display a summary table of interaction score statistics for each scenario type.
     
-    :param all_metrics: input dataframe
+    :param all_metrics: input dataframe, or a ScoreSummary / AggregationCube (no rows needed)
+    :param save_path: Also write the markdown table to this file
     :return: None
     """
-    df = pd.DataFrame(all_metrics)
+    if isinstance(all_metrics, (ScoreSummary, AggregationCube)):
+        stats_df = all_metrics.stats_table()
+        print("\n=== RISK PROFILE STATS SUMMARY ===")
+        print(stats_df.to_markdown(index=False))
+        _save_table(stats_df, save_path)
+        return
+
+    df = as_frame(all_metrics)
 
     # Clean up Scenario Names for nicer legends
     df['scenario_clean'] = df['scenario'].str.replace('/', '/<br>')
@@ -39,13 +51,22 @@ def interaction_stats_table(all_metrics):
     ).reset_index().sort_values(by='median', ascending=False)
     print("\n=== RISK PROFILE STATS SUMMARY ===")
     print(stats_df.to_markdown(index=False))
+    _save_table(stats_df, save_path)
     # End of plot_interaction_score
 
-def plot_interaction_score(all_metrics):
+def _save_table(stats_df, save_path):
+    if save_path is not None:
+        with open(save_path, 'w') as f:
+            f.write(stats_df.to_markdown(index=False) + '\n')
+
+def plot_interaction_score(all_metrics, save_path=None):
     """
     Plots the score variance/stability of each scenario type.
+
+    :param all_metrics: List of metrics dicts, DataFrame or MetricsTable
+    :param save_path: Write the figure to this file instead of showing it
     """
-    df = pd.DataFrame(all_metrics)
+    df = as_frame(all_metrics)
 
     # Clean up Scenario Names for nicer legends
     df['scenario_clean'] = df['scenario'].str.replace('/', '/\n')
@@ -54,7 +75,7 @@ def plot_interaction_score(all_metrics):
     order = df.groupby('scenario_clean')['interaction_score'].median().sort_values(ascending=False).index
 
     
-    plt.figure(figsize=(12, 6))
+    fig = plt.figure(figsize=(12, 6))
     
     # BOX PLOT
     sns.boxplot(
@@ -77,4 +98,4 @@ def plot_interaction_score(all_metrics):
     
     plt.legend([],[], frameon=False)
     
-    plt.show()
\ No newline at end of file
+    show_or_save(fig, save_path)
\ No newline at end of file
@@ -0,0 +1,275 @@
+### ECE143 Final Project Group 4
+### Waymo E2E Driving Analysis - Trajectory Similarity Index
+
+# "Find scenarios like this one": every frame's past trajectory is normalized with
+# rotate_to_vertical (start at the origin, initial heading up), resampled to a fixed number
+# of points and turned into one feature vector (lateral/longitudinal path, speed profile,
+# longitudinal/lateral acceleration profile). A scikit-learn KD-tree over their principal
+# components answers k-nearest-neighbour queries by scene_id in milliseconds.
+
+import os
+import pickle
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import BallTree, KDTree
+
+from data.fast_parse import parse_kinematics
+from data.ingestion import list_shards
+from data.metrics_table import as_frame
+from data.tfrecord import iter_records
+from src.visualization import rotate_to_vertical
+
+# Feature blocks, each resampled to num_points values
+FEATURE_BLOCKS = ['lateral', 'longitudinal', 'speed', 'long_accel', 'lat_accel']
+
+# Relative weight of each block in the distance (after scaling every block to unit RMS)
+DEFAULT_BLOCK_WEIGHTS = {'lateral': 1.0, 'longitudinal': 1.0, 'speed': 1.0, 'long_accel': 0.5, 'lat_accel': 0.5}
+
+INDEX_VERSION = 1
+
+def _resample_matrix(length, num_points):
+    """(num_points, length) linear interpolation matrix from length samples to num_points samples."""
+    positions = np.linspace(0, length - 1, num_points)
+    left = np.clip(np.floor(positions).astype(np.int64), 0, max(length - 2, 0))
+    frac = positions - left
+    matrix = np.zeros((num_points, length))
+    rows = np.arange(num_points)
+    if length == 1:
+        matrix[:, 0] = 1.0
+        return matrix
+    matrix[rows, left] = 1.0 - frac
+    matrix[rows, left + 1] += frac
+    return matrix
+
+def trajectory_features(pos_x, pos_y, vel_x, vel_y, accel_x, accel_y, num_points=8):
+    """
+    Raw (unscaled) feature vectors of trajectories of equal length.
+
+    :param pos_x, pos_y, vel_x, vel_y, accel_x, accel_y: (T,) arrays of one frame or (N, T) arrays of N frames
+    :param num_points: Points per feature block after resampling
+    :return: (N, len(FEATURE_BLOCKS) * num_points) float64 array (N = 1 for 1-D input)
+    """
+    states = [np.atleast_2d(np.asarray(a, dtype=np.float64)) for a in (pos_x, pos_y, vel_x, vel_y, accel_x, accel_y)]
+    # (T, N) layout: rotate_to_vertical then centers on and rotates by the first timestep of every frame
+    pos_x, pos_y, vel_x, vel_y, accel_x, accel_y = (a.T for a in states)
+
+    headings = np.arctan2(vel_y, vel_x + 1e-6)
+    lat_x, long_y = rotate_to_vertical(pos_x, pos_y, headings)
+    # Accelerations rotated by the same angle (vectors, so no centering): x = lateral, y = longitudinal
+    theta = (np.pi / 2) - headings[0]
+    c, s = np.cos(theta), np.sin(theta)
+    lat_accel = accel_x * c - accel_y * s
+    long_accel = accel_x * s + accel_y * c
+    speeds = np.sqrt(vel_x**2 + vel_y**2)
+
+    blocks = {'lateral': lat_x, 'longitudinal': long_y, 'speed': speeds,
+              'long_accel': long_accel, 'lat_accel': lat_accel}
+    resample = _resample_matrix(len(pos_x), num_points)
+    return np.hstack([(resample @ blocks[name]).T for name in FEATURE_BLOCKS])
+
+class TrajectorySimilarityIndex:
+    """
+    k-NN index over the normalized trajectories of a set of frames.
+
+        index = build_similarity_index(DATASET_DIR + '*.tfrecord-*')
+        index.save('similarity_index.pkl')
+        index = TrajectorySimilarityIndex.load('similarity_index.pkl')
+        index.query(scene_id, k=10)
+
+    Trees degrade to brute force in 40+ dimensions, so the tree is built over the first
+    num_components principal components and its num_candidates nearest candidates are
+    re-ranked by their exact distance in the full feature space.
+    """
+
+    def __init__(self, scene_ids, features, num_points=8, block_weights=None, num_components=16,
+                 num_candidates=100, tree='kd', leaf_size=40):
+        """
+        :param scene_ids: (N,) scene_ids
+        :param features: (N, D) raw features from trajectory_features
+        :param num_points: Points per feature block the features were built with
+        :param block_weights: dict block -> weight (defaults to DEFAULT_BLOCK_WEIGHTS)
+        :param num_components: Dimensions of the tree (None = all features, exact search)
+        :param num_candidates: Tree candidates re-ranked per query (more = better recall, slower)
+        :param tree: 'kd' (KDTree) or 'ball' (BallTree)
+        :param leaf_size: Leaf size of the tree
+        """
+        self.scene_ids = np.asarray(scene_ids, dtype=object)
+        self.num_points = num_points
+        self.block_weights = {**DEFAULT_BLOCK_WEIGHTS, **(block_weights or {})}
+        self.num_candidates = num_candidates
+
+        features = np.asarray(features, dtype=np.float64).reshape(len(self.scene_ids), len(FEATURE_BLOCKS) * num_points)
+        # One scale per block (its RMS over the dataset), so that meters, m/s and m/s^2 weigh alike
+        blocks = features.reshape(len(features), len(FEATURE_BLOCKS), num_points)
+        rms = np.sqrt(np.mean(blocks**2, axis=(0, 2))) if len(features) else np.ones(len(FEATURE_BLOCKS))
+        weights = np.array([self.block_weights[name] for name in FEATURE_BLOCKS])
+        self.scales = np.where(rms > 0, weights / np.where(rms > 0, rms, 1.0), 0.0)
+        self.features = self.transform(features).astype(np.float32)
+
+        if len(features) == 0:
+            # No valid frames (e.g. shards without usable past_states): nothing to project or search
+            self.mean = np.zeros(features.shape[1])
+            self.components = None
+            self.tree = None
+        else:
+            # Principal axes from (a sample of) the scaled features
+            self.mean = self.features.mean(axis=0, dtype=np.float64)
+            if num_components is None or num_components >= self.features.shape[1]:
+                self.components = None
+            else:
+                sample = self.features[::max(1, len(self.features) // 100_000)] - self.mean
+                self.components = np.linalg.svd(sample, full_matrices=False)[2][:num_components]
+            self.tree = (KDTree if tree == 'kd' else BallTree)(self._project(self.features), leaf_size=leaf_size)
+        self._rows = {scene_id: i for i, scene_id in enumerate(self.scene_ids)}
+
+    def __len__(self):
+        return len(self.scene_ids)
+
+    def __contains__(self, scene_id):
+        return scene_id in self._rows
+
+    def transform(self, features):
+        """
+        Scales raw feature vectors into the index space.
+
+        :param features: (N, D) raw features
+        :return: (N, D) scaled features
+        """
+        features = np.atleast_2d(np.asarray(features, dtype=np.float64))
+        return (features.reshape(len(features), len(FEATURE_BLOCKS), self.num_points)
+                * self.scales[None, :, None]).reshape(len(features), len(FEATURE_BLOCKS) * self.num_points)
+
+    def _project(self, scaled):
+        if self.components is None:
+            return np.asarray(scaled, dtype=np.float32)
+        return ((scaled - self.mean) @ self.components.T).astype(np.float32)
+
+    def _search(self, scaled, k):
+        # Tree candidates, re-ranked by the exact distance over all features
+        k = min(k, len(self))
+        if self.tree is None:
+            return np.zeros((len(scaled), 0)), np.zeros((len(scaled), 0), dtype=np.int64)
+        if self.components is None:
+            return self.tree.query(self._project(scaled), k=k)
+        num_candidates = min(max(k, self.num_candidates), len(self))
+        _, candidates = self.tree.query(self._project(scaled), k=num_candidates)
+        distances = np.sqrt(((self.features[candidates] - scaled[:, None, :])**2).sum(axis=2))
+        order = np.argsort(distances, axis=1, kind='stable')[:, :k]
+        return np.take_along_axis(distances, order, axis=1), np.take_along_axis(candidates, order, axis=1)
+
+    def query_features(self, features, k=10):
+        """
+        Nearest neighbours of raw feature vectors (e.g. of a frame that is not in the index).
+
+        :param features: (D,) or (N, D) raw features
+        :param k: Number of neighbours
+        :return: (distances, rows), both (N, k), closest first
+        """
+        return self._search(self.transform(features), k)
+
+    def query(self, scene_id, k=10, all_metrics=None):
+        """
+        The k frames with the most similar trajectories to a frame of the index.
+
+        :param scene_id: scene_id of the query frame
+        :param k: Number of neighbours (the frame itself is excluded)
+        :param all_metrics: Optional metrics (list of dicts, DataFrame or MetricsTable) joined onto the result
+        :return: pd.DataFrame with 'rank', 'scene_id', 'distance' (+ metrics columns), closest first
+        """
+        if scene_id not in self._rows:
+            raise KeyError(f"scene_id {scene_id} is not in the similarity index")
+        row = self._rows[scene_id]
+        distances, rows = self._search(self.features[row:row + 1].astype(np.float64), k + 1)
+        keep = rows[0] != row
+        result = pd.DataFrame({
+            'scene_id': self.scene_ids[rows[0][keep]][:k],
+            'distance': distances[0][keep][:k],
+        })
+        result.insert(0, 'rank', np.arange(1, len(result) + 1))
+
+        if all_metrics is not None:
+            metrics = as_frame(all_metrics).drop_duplicates('scene_id')
+            result = result.merge(metrics, on='scene_id', how='left')
+        return result
+
+    def save(self, path):
+        """
+        Writes the index (scene_ids, scaled features, projection and the built tree) to one pickle file.
+
+        :param path: Output file path
+        """
+        state = {name: getattr(self, name) for name in self._STATE}
+        state['version'] = INDEX_VERSION
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    _STATE = ['scene_ids', 'num_points', 'block_weights', 'num_candidates', 'scales', 'features',
+              'mean', 'components', 'tree']
+
+    @classmethod
+    def load(cls, path):
+        """
+        Loads an index written by save() without rebuilding the tree.
+
+        :param path: Index file path
+        :return: TrajectorySimilarityIndex
+        """
+        with open(path, 'rb') as f:
+            state = pickle.load(f)
+        if state.get('version') != INDEX_VERSION:
+            raise ValueError(f"{path} was written by an incompatible version of the similarity index")
+
+        index = cls.__new__(cls)
+        for name in cls._STATE:
+            setattr(index, name, state[name])
+        index._rows = {scene_id: i for i, scene_id in enumerate(index.scene_ids)}
+        return index
+
+def build_similarity_index(shard_pattern, num_points=8, num_samples=None, block_weights=None, num_components=16,
+                           batch_size=4096):
+    """
+    Reads the past_states of every frame of a set of shards and indexes their trajectories.
+
+    :param shard_pattern: Glob pattern string or list of shard paths
+    :param num_points: Points per feature block (path, speed and acceleration profiles)
+    :param num_samples: Per-shard record limit (None = all records)
+    :param block_weights: dict block -> weight, see DEFAULT_BLOCK_WEIGHTS
+    :param num_components: Dimensions of the tree, see TrajectorySimilarityIndex
+    :param batch_size: Frames of equal length converted to features at once
+    :return: TrajectorySimilarityIndex
+    """
+    fields = ['pos_x', 'pos_y', 'vel_x', 'vel_y', 'accel_x', 'accel_y']
+    scene_ids, features = [], []
+    pending = defaultdict(list)  # trajectory length -> [(scene_id, states), ...]
+
+    def flush(length):
+        group = pending.pop(length)
+        states = [np.array([s[i] for _, s in group]) for i in range(len(fields))]
+        scene_ids.extend(scene_id for scene_id, _ in group)
+        features.append(trajectory_features(*states, num_points=num_points))
+
+    for shard_path in list_shards(shard_pattern):
+        for idx, (_, record) in enumerate(iter_records(shard_path, num_samples)):
+            try:
+                data = parse_kinematics(record, include_future=False)
+            except Exception as e:
+                print(f"Error record {idx} in {os.path.basename(shard_path)}: {type(e).__name__}: {e}")
+                continue
+            states = [getattr(data.past_states, name) for name in fields]
+            length = len(states[0])
+            if length < 2 or any(len(values) != length for values in states):
+                continue
+            pending[length].append((data.frame.context.name, states))
+            if len(pending[length]) >= batch_size:
+                flush(length)
+
+    for length in list(pending):
+        flush(length)
+
+    features = np.vstack(features) if features else np.zeros((0, len(FEATURE_BLOCKS) * num_points))
+    print(f"Indexed {len(scene_ids)} trajectories ({features.shape[1]} features)")
+    return TrajectorySimilarityIndex(scene_ids, features, num_points, block_weights, num_components)
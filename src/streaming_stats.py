@@ -0,0 +1,260 @@
+### ECE143 Final Project Group 4
+### Waymo E2E Driving Analysis - Streaming Score Statistics
+
+# Mergeable, constant-memory summaries that are updated while frames are analyzed,
+# so the stats table and the top-10% threshold do not need every metrics row in memory.
+
+import heapq
+import math
+import random
+
+import numpy as np
+import pandas as pd
+
+class KLLSketch:
+    """
+    KLL quantile sketch (Karnin, Lang & Liberty, 2016).
+    Memory is O(k log(n / k)); rank error is about 2 / k (below 4 / k over all quantiles).
+    Quantiles are exact (same as pandas' linear interpolation) until the first compaction.
+    """
+
+    def __init__(self, k=200, seed=0):
+        """
+        :param k: Accuracy parameter (size of the top compactor)
+        :param seed: Seed of the compaction coin flips (fixed seed = deterministic results)
+        """
+        self.k = k
+        self.levels = [np.zeros(0)]
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self._rng = random.Random(seed)
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(2, int(math.ceil(self.k * (2.0 / 3.0) ** depth)))
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.zeros(0))
+                items = np.sort(items)
+                keep = items[len(items) - len(items) % 2:]
+                offset = self._rng.randint(0, 1)
+                promoted = items[offset:len(items) - len(items) % 2:2]
+                self.levels[level] = keep
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            level += 1
+
+    def update(self, values):
+        """
+        Adds one value or an array of values. Feeding an array gives the same
+        sketch as feeding its values one by one.
+
+        :param values: Scalar or array-like of floats
+        """
+        values = np.atleast_1d(np.asarray(values, dtype=np.float64))
+        if len(values) == 0:
+            return
+        self.count += len(values)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+        while len(values):
+            # Compaction happens as soon as level 0 exceeds its capacity
+            take = max(1, self._capacity(0) + 1 - len(self.levels[0]))
+            self.levels[0] = np.concatenate([self.levels[0], values[:take]])
+            values = values[take:]
+            self._compress()
+
+    def merge(self, other):
+        """
+        Merges another sketch into this one (in place).
+
+        :param other: KLLSketch
+        :return: self
+        """
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.zeros(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+        return self
+
+    def quantile(self, q):
+        """
+        Estimated q-quantile.
+
+        :param q: Quantile in [0, 1] (scalar or array)
+        :return: float (or array), NaN if the sketch is empty
+        """
+        if self.count == 0:
+            return np.nan if np.isscalar(q) else np.full(len(q), np.nan)
+
+        if len(self.levels) == 1:
+            # Nothing compacted yet: exact
+            return np.quantile(self.levels[0], q)
+
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(items), 2.0 ** level) for level, items in enumerate(self.levels)])
+        order = np.argsort(values, kind='stable')
+        values = values[order]
+        cum_weights = np.cumsum(weights[order])
+
+        ranks = np.asarray(q, dtype=np.float64) * cum_weights[-1]
+        idx = np.minimum(np.searchsorted(cum_weights, ranks, side='left'), len(values) - 1)
+        result = np.clip(values[idx], self.min, self.max)
+        return float(result) if np.isscalar(q) else result
+
+    def num_retained(self):
+        """Number of values currently stored (memory footprint)."""
+        return sum(len(items) for items in self.levels)
+
+class ScoreSummary:
+    """
+    Running per-scenario count/min/max plus quantile sketches of a metric
+    (interaction_score by default). Mergeable across workers.
+    """
+
+    def __init__(self, metric='interaction_score', k=200, seed=0):
+        self.metric = metric
+        self.k = k
+        self.seed = seed
+        self.overall = KLLSketch(k, seed)
+        self.by_scenario = {}
+
+    def _scenario_sketch(self, scenario):
+        if scenario not in self.by_scenario:
+            self.by_scenario[scenario] = KLLSketch(self.k, self.seed)
+        return self.by_scenario[scenario]
+
+    def update(self, metrics):
+        """
+        Adds one analyzed frame.
+
+        :param metrics: Metrics dict with 'scenario' and the summarized metric
+        """
+        value = metrics[self.metric]
+        self.overall.update(value)
+        self._scenario_sketch(metrics['scenario']).update(value)
+
+    def update_batch(self, scenarios, values):
+        """
+        Adds many frames at once (same result as calling update row by row).
+
+        :param scenarios: Array-like of scenario labels
+        :param values: Array-like of metric values
+        """
+        scenarios = np.asarray(scenarios)
+        values = np.asarray(values, dtype=np.float64)
+        self.overall.update(values)
+        for scenario in pd.unique(scenarios):
+            self._scenario_sketch(scenario).update(values[scenarios == scenario])
+
+    def merge(self, other):
+        """
+        Merges another summary into this one (in place).
+
+        :param other: ScoreSummary
+        :return: self
+        """
+        self.overall.merge(other.overall)
+        for scenario, sketch in other.by_scenario.items():
+            self._scenario_sketch(scenario).merge(sketch)
+        return self
+
+    @property
+    def scenario_counts(self):
+        """dict scenario -> number of frames"""
+        return {scenario: sketch.count for scenario, sketch in self.by_scenario.items()}
+
+    def quantile(self, q):
+        """Estimated q-quantile of the metric over all frames."""
+        return self.overall.quantile(q)
+
+    def stats_table(self):
+        """
+        Per-scenario median/IQR/max/min, in the layout of interaction_stats_table.
+
+        :return: pd.DataFrame sorted by median (descending)
+        """
+        rows = []
+        for scenario, sketch in self.by_scenario.items():
+            q25, median, q75 = sketch.quantile([0.25, 0.5, 0.75])
+            rows.append({
+                'scenario': scenario,
+                'median': median,
+                'iqr': q75 - q25,
+                'max': sketch.max,
+                'min': sketch.min,
+            })
+        stats_df = pd.DataFrame(rows, columns=['scenario', 'median', 'iqr', 'max', 'min'])
+        return stats_df.sort_values(by='median', ascending=False)
+
+class TopKEvents:
+    """
+    Bounded min-heap of the K frames with the highest value of a metric
+    (interaction_score by default). O(K) memory, mergeable across workers.
+    Ties on the metric are broken by scene_id, so results do not depend on merge order.
+    """
+
+    def __init__(self, k=10, metric='interaction_score'):
+        self.k = k
+        self.metric = metric
+        self._heap = []
+        self._counter = 0  # last-resort tie breaker, keeps heap items comparable
+
+    def __len__(self):
+        return len(self._heap)
+
+    def _offer(self, score, scene_id, location, metrics):
+        item = (score, scene_id, self._counter, location, metrics)
+        self._counter += 1
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, item)
+        elif item[:2] > self._heap[0][:2]:
+            heapq.heapreplace(self._heap, item)
+
+    def push(self, metrics, location=None):
+        """
+        Offers one analyzed frame.
+
+        :param metrics: Metrics dict (must contain 'scene_id' and the ranking metric)
+        :param location: Optional (shard path, offset, length) of the record
+        """
+        self._offer(metrics[self.metric], metrics['scene_id'], location, metrics)
+
+    def merge(self, other):
+        """
+        Merges another selector into this one (in place).
+
+        :param other: TopKEvents with the same metric
+        :return: self
+        """
+        for score, scene_id, _, location, metrics in other._heap:
+            self._offer(score, scene_id, location, metrics)
+        return self
+
+    def events(self):
+        """
+        :return: List of dicts ('scene_id', 'score', 'location', 'metrics'), highest score first
+        """
+        ordered = sorted(self._heap, key=lambda item: item[:2], reverse=True)
+        return [
+            {'scene_id': scene_id, 'score': score, 'location': location, 'metrics': metrics}
+            for score, scene_id, _, location, metrics in ordered
+        ]
+
+    def metrics_rows(self):
+        """Metrics dicts of the retained events, highest score first."""
+        return [event['metrics'] for event in self.events()]
+
+    def record_index(self):
+        """scene_id -> (shard, offset, length) for the retained events that have a location."""
+        return {event['scene_id']: event['location'] for event in self.events() if event['location'] is not None}
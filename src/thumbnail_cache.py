@@ -0,0 +1,193 @@
+### ECE143 Final Project Group 4
+### Waymo E2E Driving Analysis - On-Disk LRU Thumbnail Cache
+
+# Revisiting an event used to re-read its record and re-decode all eight full-size camera
+# JPEGs. ThumbnailCache keeps the decoded tiles as raw .npy arrays (loading one is a
+# memcpy, no JPEG decode), keyed by a hash of (scene_id, camera, tile size),
+# plus a small per-frame entry with the past_states and camera names, so that a cached
+# event is rendered without touching the TFRecord at all.
+#
+# Files are written atomically and a hit bumps the file's mtime; when the cache grows
+# past max_bytes the least recently used files are deleted. The directory is the only
+# state, so several render processes can share one cache.
+
+import hashlib
+import os
+import time
+
+import numpy as np
+
+from data.fast_parse import KinematicsFrame
+from data.scenario_classification import STATE_FIELDS
+
+DEFAULT_MAX_BYTES = 1 << 30  # 1 GB
+
+def _size_key(size):
+    width, height = size
+    return f"{int(width)}x{int(height)}"
+
+class ThumbnailCache:
+    """
+    Decoded camera tiles by (scene_id, camera, tile size), capped at max_bytes.
+
+        cache = ThumbnailCache('thumbnail_cache/')
+        tile = cache.get(scene_id, camera, (369, 600))    # None on a miss
+        cache.put(scene_id, camera, (369, 600), tile)
+    """
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        :param cache_dir: Cache directory (created if missing)
+        :param max_bytes: Size cap; the least recently used files are evicted beyond it
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        self.stats = {'hits': 0, 'misses': 0, 'writes': 0, 'evicted': 0}
+        self._total_bytes = sum(size for _, size, _ in self._entries())
+
+    def _path(self, *key_parts):
+        digest = hashlib.sha1('|'.join(str(part) for part in key_parts).encode('utf-8')).hexdigest()
+        # Two-level layout keeps directories small
+        return os.path.join(self.cache_dir, digest[:2], digest + '.npy')
+
+    def _entries(self):
+        # (path, bytes, mtime) of every cache file
+        for sub in os.scandir(self.cache_dir):
+            if not sub.is_dir():
+                continue
+            for entry in os.scandir(sub.path):
+                if entry.name.endswith('.npy'):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue  # evicted by another process
+                    yield entry.path, stat.st_size, stat.st_mtime
+
+    def _load(self, path):
+        try:
+            array = np.load(path, allow_pickle=False)
+        except (FileNotFoundError, ValueError, OSError):
+            self.stats['misses'] += 1
+            return None
+        try:
+            # Mark as recently used
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        self.stats['hits'] += 1
+        return array
+
+    def _store(self, path, array):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path[:-len('.npy')]}.{os.getpid()}.tmp.npy"
+        np.save(tmp_path, np.ascontiguousarray(array))
+        size = os.path.getsize(tmp_path)
+        previous = os.path.getsize(path) if os.path.exists(path) else 0
+        os.replace(tmp_path, path)
+        self.stats['writes'] += 1
+        self._total_bytes += size - previous
+        if self._total_bytes > self.max_bytes:
+            self.evict()
+
+    def get(self, scene_id, camera, size):
+        """
+        Cached tile of one camera.
+
+        :param scene_id: scene_id of the frame
+        :param camera: Camera name enum
+        :param size: (width, height) box the tile was decoded for
+        :return: uint8 (H, W, 3) array, or None on a miss
+        """
+        return self._load(self._path(scene_id, camera, _size_key(size)))
+
+    def put(self, scene_id, camera, size, tile):
+        """
+        Stores the tile of one camera.
+
+        :param scene_id: scene_id of the frame
+        :param camera: Camera name enum
+        :param size: (width, height) box the tile was decoded for
+        :param tile: uint8 (H, W, 3) array
+        """
+        self._store(self._path(scene_id, camera, _size_key(size)), tile)
+
+    def has(self, scene_id, camera, size):
+        """True if the tile of (scene_id, camera, size) is cached."""
+        return os.path.exists(self._path(scene_id, camera, _size_key(size)))
+
+    def has_frame(self, scene_id):
+        """True if the trajectory of scene_id is cached."""
+        return os.path.exists(self._path(scene_id, 'frame'))
+
+    def get_frame(self, scene_id):
+        """
+        Cached trajectory of a frame.
+
+        :param scene_id: scene_id of the frame
+        :return: (KinematicsFrame with past_states, list of camera names), or None on a miss
+        """
+        packed = self._load(self._path(scene_id, 'frame'))
+        if packed is None:
+            return None
+        # Rows: the STATE_FIELDS (zero-padded), then their lengths, the number of cameras and the camera names
+        info = packed[len(STATE_FIELDS)].astype(np.int64)
+        data = KinematicsFrame()
+        data.frame.context.name = scene_id
+        for i, name in enumerate(STATE_FIELDS):
+            setattr(data.past_states, name, packed[i, :info[i]])
+        num_cams = info[len(STATE_FIELDS)]
+        return data, info[len(STATE_FIELDS) + 1:len(STATE_FIELDS) + 1 + num_cams].tolist()
+
+    def put_frame(self, data, camera_names):
+        """
+        Stores the past_states and camera names of a parsed frame.
+
+        :param data: Parsed E2EDFrame (or KinematicsFrame)
+        :param camera_names: Camera name enums of the frame, in display order
+        """
+        fields = [np.asarray(getattr(data.past_states, name), dtype=np.float32) for name in STATE_FIELDS]
+        info = [len(values) for values in fields] + [len(camera_names)] + [int(camera) for camera in camera_names]
+        packed = np.zeros((len(STATE_FIELDS) + 1, max([len(values) for values in fields] + [len(info)])),
+                          dtype=np.float32)
+        for i, values in enumerate(fields):
+            packed[i, :len(values)] = values
+        packed[len(STATE_FIELDS), :len(info)] = info
+        self._store(self._path(data.frame.context.name, 'frame'), packed)
+
+    def evict(self, max_bytes=None):
+        """
+        Deletes least recently used files until the cache fits max_bytes.
+
+        :param max_bytes: Target size (defaults to the cache cap)
+        :return: Number of deleted files
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        deleted = 0
+        for path, size, _ in entries:
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            deleted += 1
+        self._total_bytes = total
+        self.stats['evicted'] += deleted
+        return deleted
+
+    def clear(self):
+        """Deletes every cached file."""
+        self.evict(0)
+
+    def info(self):
+        """
+        :return: dict with 'files', 'bytes', 'max_bytes', 'oldest_use' (seconds ago) and the hit/miss stats
+        """
+        entries = list(self._entries())
+        oldest = min((mtime for _, _, mtime in entries), default=None)
+        return dict(self.stats, files=len(entries), bytes=sum(size for _, size, _ in entries),
+                    max_bytes=self.max_bytes, oldest_use=None if oldest is None else time.time() - oldest)
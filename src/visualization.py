@@ -5,10 +5,20 @@ import matplotlib.pyplot as plt
 import matplotlib.gridspec as gridspec
 from PIL import Image
 import io
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-import pandas as pd
-import tensorflow as tf
-from waymo_open_dataset.protos import end_to_end_driving_data_pb2 as wod_e2ed_pb2
+
+from data.metrics_table import as_frame
+from data.record_index import read_indexed_records
+from data.tfrecord import read_record, record_iterator
+from src.streaming_stats import TopKEvents
+from src.thumbnail_cache import ThumbnailCache
+
+# Event figure layout: trajectory column + CAM_COLS camera columns
+FIGURE_SIZE = (24, 12)
+FIGURE_DPI = 100
+CAM_COLS = 4
+TRAJECTORY_WIDTH = 2.5  # relative to one camera column
 
 def rotate_to_vertical(xs, ys, headings):
     """
@@ -35,153 +45,358 @@ def rotate_to_vertical(xs, ys, headings):
 
     return x_rot, y_rot
 
-def trajectory_visualization(dataset_input, all_metrics, top_n=5):
+def decode_camera_image(image_bytes, max_size=None):
+    """
+    Decodes one camera JPEG, optionally at reduced resolution.
+    With max_size, JPEG draft mode lets libjpeg decode directly at 1/2, 1/4 or 1/8 scale,
+    so the full-resolution image is never materialized.
+
+    :param image_bytes: Encoded image bytes
+    :param max_size: Optional (width, height) the image must fit in
+    :return: RGB image as a uint8 array of shape (H, W, 3)
+    """
+    img = Image.open(io.BytesIO(image_bytes))
+    if max_size is not None:
+        # Fit the box while keeping the aspect ratio, then let the decoder pick the
+        # largest DCT scale that still covers that size
+        scale = min(max_size[0] / img.width, max_size[1] / img.height, 1.0)
+        target = (max(1, int(img.width * scale)), max(1, int(img.height * scale)))
+        img.draft('RGB', target)
+        img.thumbnail(target, Image.BILINEAR)
+    return np.asarray(img.convert('RGB'))
+
+def decode_camera_images(images, max_size=None, max_workers=8):
+    """
+    Decodes several camera images on a thread pool (PIL releases the GIL while decoding).
+
+    :param images: List of encoded image bytes
+    :param max_size: Optional (width, height) every tile must fit in
+    :param max_workers: Number of decoding threads
+    :return: List of arrays in input order (None where decoding failed)
+    """
+    def decode(image_bytes):
+        try:
+            return decode_camera_image(image_bytes, max_size)
+        except Exception:
+            return None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(decode, images))
+
+def camera_cell_size(num_cams):
+    """
+    Pixel size of one camera cell of the event figure: the JPEGs are decoded at (about) this resolution.
+
+    :param num_cams: Number of camera images of the frame
+    :return: (width, height)
+    """
+    cam_rows = (num_cams + CAM_COLS - 1) // CAM_COLS
+    fig_w, fig_h = FIGURE_SIZE[0] * FIGURE_DPI, FIGURE_SIZE[1] * FIGURE_DPI
+    return (int(fig_w / (TRAJECTORY_WIDTH + CAM_COLS)), int(fig_h / max(cam_rows, 1)))
+
+def camera_tiles(scene_id, camera_names, images, cell_size, decode_workers=8, thumbnail_cache=None):
+    """
+    Camera tiles of one frame: from the thumbnail cache where present, the rest decoded
+    from the JPEGs (and added to the cache).
+
+    :param scene_id: scene_id of the frame
+    :param camera_names: Camera name enums, in display order
+    :param images: Matching CameraImage messages (may be empty if every tile is cached)
+    :param cell_size: (width, height) box of a tile
+    :param decode_workers: Number of decoding threads
+    :param thumbnail_cache: Optional ThumbnailCache
+    :return: List of uint8 arrays (None where a tile is neither cached nor decodable)
+    """
+    tiles = [None] * len(camera_names)
+    if thumbnail_cache is not None:
+        tiles = [thumbnail_cache.get(scene_id, name, cell_size) for name in camera_names]
+
+    missing = [i for i, tile in enumerate(tiles) if tile is None]
+    if missing and images:
+        decoded = decode_camera_images([images[i].image for i in missing], max_size=cell_size,
+                                       max_workers=decode_workers)
+        for i, tile in zip(missing, decoded):
+            tiles[i] = tile
+            if thumbnail_cache is not None and tile is not None:
+                thumbnail_cache.put(scene_id, camera_names[i], cell_size, tile)
+    return tiles
+
+def cached_event(thumbnail_cache, scene_id):
+    """
+    An event whose trajectory and camera tiles are all in the thumbnail cache.
+
+    :param thumbnail_cache: ThumbnailCache
+    :param scene_id: scene_id of the event
+    :return: (KinematicsFrame, camera names) to pass to render_event_figure, or None
+    """
+    cached = thumbnail_cache.get_frame(scene_id)
+    if cached is None:
+        return None
+    cell_size = camera_cell_size(len(cached[1]))
+    if not all(thumbnail_cache.has(scene_id, name, cell_size) for name in cached[1]):
+        return None
+    return cached
+
+def render_event_figure(data, row, event_number=1, decode_workers=8, thumbnail_cache=None, camera_names=None):
+    """
+    Builds the trajectory + surround camera figure of one event (does not show it).
+
+    :param data: Parsed E2EDFrame of the event, or the KinematicsFrame of cached_event
+    :param row: Metrics row of the event (dict or pd.Series with 'scenario', 'interaction_score', ...)
+    :param event_number: Rank shown in the panel title
+    :param decode_workers: Number of threads decoding the camera images
+    :param thumbnail_cache: Optional ThumbnailCache the camera tiles are read from / added to
+    :param camera_names: Camera name enums of a frame without images (from cached_event)
+    :return: matplotlib Figure
+    """
+    scene_id = data.frame.context.name
+    sorted_images = sorted(getattr(data.frame, 'images', ()), key=lambda x: x.name)
+    if sorted_images:
+        camera_names = [img_data.name for img_data in sorted_images]
+    camera_names = list(camera_names or [])
+
+    # --- Setup Figure Layout ---
+    # High resolution figure
+    fig = plt.figure(figsize=FIGURE_SIZE, dpi=FIGURE_DPI)
+
+    # Layout: Left column for Trajectory, Right columns for Cameras
+    num_cams = len(camera_names)
+    cam_cols = CAM_COLS
+    cam_rows = (num_cams + cam_cols - 1) // cam_cols
+
+    # GridSpec: Trajectory column is 2.5x wider than a single camera column
+    width_ratios = [TRAJECTORY_WIDTH] + [1]*cam_cols
+    gs = gridspec.GridSpec(max(cam_rows, 1), cam_cols + 1, width_ratios=width_ratios)
+    gs.update(wspace=0.1, hspace=0.2)
+
+    # Pixel size of one camera cell: decode the JPEGs at (about) this resolution
+    cell_size = camera_cell_size(num_cams)
+
+    # =========================================================
+    # PANEL 1: EGO TRAJECTORY (Left Side)
+    # =========================================================
+    ax_traj = fig.add_subplot(gs[:, 0])
+
+    # Extract Physics Data
+    pos_x = np.array(data.past_states.pos_x)
+    pos_y = np.array(data.past_states.pos_y)
+    vel_x = np.array(data.past_states.vel_x)
+    vel_y = np.array(data.past_states.vel_y)
+
+    # Calculate Heading and Rotate Coordinates
+    headings = np.arctan2(vel_y, vel_x + 1e-6)
+    lat_x, long_y = rotate_to_vertical(pos_x, pos_y, headings)
+
+    # Plot: Reference Lines (Assuming 3.7m Lane Width)
+    ax_traj.axvline(0, color='black', linestyle='-', alpha=0.1, linewidth=1)
+    ax_traj.axvline(-1.85, color='gray', linestyle=':', alpha=0.4, label='Lane Width (+/- 1.85m)')
+    ax_traj.axvline(1.85, color='gray', linestyle=':', alpha=0.4)
+
+    # Plot: Actual Trajectory
+    ax_traj.plot(lat_x, long_y, color='#007ACC', linewidth=5, alpha=0.8, label='Actual Path')
+
+    # Plot: Start and End points
+    ax_traj.scatter(lat_x[0], long_y[0], c='green', s=200, edgecolors='white', linewidth=2, zorder=5, label='Start')
+    ax_traj.scatter(lat_x[-1], long_y[-1], c='red', s=200, edgecolors='white', linewidth=2, zorder=5, label='End')
+
+    # Info Box (Scorecard)
+    stats_text = (
+        f"SCENARIO    : {row['scenario']}\n"
+        f"RISK SCORE  : {row['interaction_score']:.2f}\n"
+        f"-----------------------------\n"
+        f"Speed       : {row['avg_speed_ms']:.1f} m/s\n"
+        f"Max Brake   : {row['max_braking']:.2f} m/s²\n"
+        f"Max Lat G   : {row['max_lateral_accel']:.2f} m/s²\n"
+        f"Net Move    : {row['net_lateral_dist_m']:.2f} m"
+    )
+    ax_traj.text(0.05, 0.02, stats_text, transform=ax_traj.transAxes,
+                 verticalalignment='bottom', fontsize=12, fontfamily='monospace', weight='bold',
+                 bbox=dict(boxstyle='round,pad=0.5', facecolor='#f8f9fa', alpha=0.95, edgecolor='#cccccc'))
+
+    # Styling
+    ax_traj.set_title(f"EVENT #{event_number}: EGO-MOTION ANALYSIS", fontsize=16, fontweight='bold', pad=20)
+    ax_traj.set_xlabel("Lateral Deviation (meters)", fontsize=12)
+    ax_traj.set_ylabel("Longitudinal Distance (meters)", fontsize=12)
+    ax_traj.axis('equal')
+    ax_traj.set_xlim(-8, 8) # Fixed X-axis to clearly show swerving
+    ax_traj.grid(True, linestyle='--', alpha=0.5)
+    ax_traj.legend(loc='upper right', fontsize=10, frameon=True)
+
+    # =========================================================
+    # PANEL 2: SURROUND CAMERAS (Right Side)
+    # =========================================================
+    cam_labels = {
+        1: 'FRONT', 2: 'FRONT_LEFT', 3: 'FRONT_RIGHT',
+        4: 'SIDE_LEFT', 5: 'SIDE_RIGHT',
+        6: 'BACK_LEFT', 7: 'BACK', 8: 'BACK_RIGHT'
+    }
+
+    tiles = camera_tiles(scene_id, camera_names, sorted_images, cell_size, decode_workers, thumbnail_cache)
+    if thumbnail_cache is not None and sorted_images and not thumbnail_cache.has_frame(scene_id):
+        thumbnail_cache.put_frame(data, camera_names)
+
+    for i, (camera_name, tile) in enumerate(zip(camera_names, tiles)):
+        row_idx = i // cam_cols
+        col_idx = i % cam_cols
+
+        # Add subplot
+        ax_cam = fig.add_subplot(gs[row_idx, col_idx + 1])
+
+        try:
+            if tile is None:
+                raise ValueError("undecodable image")
+            ax_cam.imshow(tile)
+
+            # Camera Label
+            label_text = cam_labels.get(camera_name, f"CAM {camera_name}")
+            ax_cam.text(0.5, 0.95, label_text, transform=ax_cam.transAxes,
+                        ha='center', va='top', fontsize=11, fontweight='bold',
+                        color='white', bbox=dict(facecolor='black', alpha=0.7, boxstyle='round,pad=0.2'))
+
+            # Remove ticks
+            ax_cam.set_xticks([])
+            ax_cam.set_yticks([])
+        except:
+            ax_cam.text(0.5, 0.5, "IMAGE ERROR", ha='center')
+            ax_cam.axis('off')
+
+    return fig
+
+def trajectory_visualization(dataset_input, all_metrics, top_n=5, record_index=None, decode_workers=8,
+                             thumbnail_cache=None):
     """
     Generates a trajectory visualization: 
     - Left Panel: Trajectory analysis (Physics)
     - Right Panel: Multi-view Camera feed (Context)
     
     :param dataset_input: Path to TFRecord file (str) or loaded tf.data.Dataset object
-    :param all_metrics: List of dicts parsed from csv (must contain 'interaction_score')
+                          (ignored when record_index is given, may be None)
+    :param all_metrics: List of dicts parsed from csv (must contain 'interaction_score'),
+                        or a TopKEvents selector from ingestion (its record locations are used)
     :param top_n: Number of top scoring events to visualize
+    :param record_index: Optional scene_id -> (shard, offset, length) index, or path to a saved one
+                         (see data.record_index). The top events are then read directly, across shards,
+                         instead of scanning dataset_input from the start.
+    :param decode_workers: Number of threads decoding the camera images of an event
+    :param thumbnail_cache: Optional ThumbnailCache (or its directory). Events it holds completely are
+                            rendered without reading the TFRecord; the others are added to it.
+                            Either way the events are shown in score order.
     """
     
+    # Full parse (the camera images are needed), only imported when rendering
+    from waymo_open_dataset.protos import end_to_end_driving_data_pb2 as wod_e2ed_pb2
+
     # --- 1. Data Preparation ---
-    df = pd.DataFrame(all_metrics)
+    if isinstance(all_metrics, TopKEvents):
+        if record_index is None:
+            record_index = all_metrics.record_index()
+        all_metrics = all_metrics.metrics_rows()
+
+    df = as_frame(all_metrics)
     
     # Sort by interaction score to find the most critical events
     top_events = df.sort_values('interaction_score', ascending=False).head(top_n)
-    target_ids = set(top_events['scene_id'].values)
     
     # Create a map for quick lookup
     event_map = {row['scene_id']: row for _, row in top_events.iterrows()}
 
     print(f"Generating trajectory visualization for Top {top_n} Events...")
+    ranked_ids = list(top_events['scene_id'].values)
 
-    # Handle input type: Load dataset if it is a path string
-    if isinstance(dataset_input, str):
-        dataset = tf.data.TFRecordDataset(dataset_input, compression_type='')
-    else:
-        dataset = dataset_input
+    if isinstance(thumbnail_cache, str):
+        thumbnail_cache = ThumbnailCache(thumbnail_cache)
+    # Events seen before: trajectory and decoded tiles straight from the cache
+    cached = {}
+    if thumbnail_cache is not None:
+        for scene_id in ranked_ids:
+            event = cached_event(thumbnail_cache, scene_id)
+            if event is not None:
+                cached[scene_id] = event
+    missing = [scene_id for scene_id in ranked_ids if scene_id not in cached]
 
-    dataset_iter = dataset.as_numpy_iterator()
-    found_count = 0
+    # --- 2. Read the events that are not cached ---
+    frames = {}
+    if missing:
+        if record_index is not None:
+            # Seek straight to the target records
+            dataset_iter = (record for _, record in read_indexed_records(record_index, missing))
+        else:
+            # Handle input type: TFRecord path (read without TensorFlow) or tf.data.Dataset
+            dataset_iter = record_iterator(dataset_input)
 
-    # --- 2. Iterate through dataset to find target scenes ---
-    for bytes_example in dataset_iter:
-        data = wod_e2ed_pb2.E2EDFrame()
-        data.ParseFromString(bytes_example)
-        curr_id = data.frame.context.name
-
-        # Check if current frame is one of our targets
-        if curr_id in target_ids:
-            row = event_map[curr_id]
-            found_count += 1
-            print(f"Found Event {found_count}/{top_n}: {curr_id} (Score: {row['interaction_score']:.2f})")
-
-            # --- 3. Setup Figure Layout ---
-            # High resolution figure
-            fig = plt.figure(figsize=(24, 12), dpi=100)
-
-            # Layout: Left column for Trajectory, Right columns for Cameras
-            num_cams = len(data.frame.images)
-            cam_cols = 4 
-            cam_rows = (num_cams + cam_cols - 1) // cam_cols
-
-            # GridSpec: Trajectory column is 2.5x wider than a single camera column
-            gs = gridspec.GridSpec(cam_rows, cam_cols + 1, width_ratios=[2.5] + [1]*cam_cols)
-            gs.update(wspace=0.1, hspace=0.2)
-
-            # =========================================================
-            # PANEL 1: EGO TRAJECTORY (Left Side)
-            # =========================================================
-            ax_traj = fig.add_subplot(gs[:, 0])
-
-            # Extract Physics Data
-            pos_x = np.array(data.past_states.pos_x)
-            pos_y = np.array(data.past_states.pos_y)
-            vel_x = np.array(data.past_states.vel_x)
-            vel_y = np.array(data.past_states.vel_y)
-
-            # Calculate Heading and Rotate Coordinates
-            headings = np.arctan2(vel_y, vel_x + 1e-6)
-            lat_x, long_y = rotate_to_vertical(pos_x, pos_y, headings)
-
-            # Plot: Reference Lines (Assuming 3.7m Lane Width)
-            ax_traj.axvline(0, color='black', linestyle='-', alpha=0.1, linewidth=1)
-            ax_traj.axvline(-1.85, color='gray', linestyle=':', alpha=0.4, label='Lane Width (+/- 1.85m)')
-            ax_traj.axvline(1.85, color='gray', linestyle=':', alpha=0.4)
-
-            # Plot: Actual Trajectory
-            ax_traj.plot(lat_x, long_y, color='#007ACC', linewidth=5, alpha=0.8, label='Actual Path')
-
-            # Plot: Start and End points
-            ax_traj.scatter(lat_x[0], long_y[0], c='green', s=200, edgecolors='white', linewidth=2, zorder=5, label='Start')
-            ax_traj.scatter(lat_x[-1], long_y[-1], c='red', s=200, edgecolors='white', linewidth=2, zorder=5, label='End')
-
-            # Info Box (Scorecard)
-            stats_text = (
-                f"SCENARIO    : {row['scenario']}\n"
-                f"RISK SCORE  : {row['interaction_score']:.2f}\n"
-                f"-----------------------------\n"
-                f"Speed       : {row['avg_speed_ms']:.1f} m/s\n"
-                f"Max Brake   : {row['max_braking']:.2f} m/s²\n"
-                f"Max Lat G   : {row['max_lateral_accel']:.2f} m/s²\n"
-                f"Net Move    : {row['net_lateral_dist_m']:.2f} m"
-            )
-            ax_traj.text(0.05, 0.02, stats_text, transform=ax_traj.transAxes,
-                         verticalalignment='bottom', fontsize=12, fontfamily='monospace', weight='bold',
-                         bbox=dict(boxstyle='round,pad=0.5', facecolor='#f8f9fa', alpha=0.95, edgecolor='#cccccc'))
-
-            # Styling
-            ax_traj.set_title(f"EVENT #{found_count}: EGO-MOTION ANALYSIS", fontsize=16, fontweight='bold', pad=20)
-            ax_traj.set_xlabel("Lateral Deviation (meters)", fontsize=12)
-            ax_traj.set_ylabel("Longitudinal Distance (meters)", fontsize=12)
-            ax_traj.axis('equal')
-            ax_traj.set_xlim(-8, 8) # Fixed X-axis to clearly show swerving
-            ax_traj.grid(True, linestyle='--', alpha=0.5)
-            ax_traj.legend(loc='upper right', fontsize=10, frameon=True)
-
-            # =========================================================
-            # PANEL 2: SURROUND CAMERAS (Right Side)
-            # =========================================================
-            cam_labels = {
-                1: 'FRONT', 2: 'FRONT_LEFT', 3: 'FRONT_RIGHT',
-                4: 'SIDE_LEFT', 5: 'SIDE_RIGHT',
-                6: 'BACK_LEFT', 7: 'BACK', 8: 'BACK_RIGHT'
-            }
+        pending = set(missing)
+        for bytes_example in dataset_iter:
+            data = wod_e2ed_pb2.E2EDFrame()
+            data.ParseFromString(bytes_example)
+            curr_id = data.frame.context.name
 
-            sorted_images = sorted(data.frame.images, key=lambda x: x.name)
+            # Check if current frame is one of our targets
+            if curr_id in pending:
+                frames[curr_id] = data
+                pending.remove(curr_id)
+                if not pending: break
 
-            for i, img_data in enumerate(sorted_images):
-                row_idx = i // cam_cols
-                col_idx = i % cam_cols
+    # --- 3. Render in score order ---
+    found_count = 0
+    for scene_id in ranked_ids:
+        row = event_map[scene_id]
+        if scene_id in cached:
+            data, camera_names = cached[scene_id]
+            source = ", cached"
+        elif scene_id in frames:
+            data, camera_names = frames.pop(scene_id), None
+            source = ""
+        else:
+            continue
+        found_count += 1
+        print(f"Found Event {found_count}/{top_n}: {scene_id} (Score: {row['interaction_score']:.2f}{source})")
 
-                # Add subplot
-                ax_cam = fig.add_subplot(gs[row_idx, col_idx + 1])
+        fig = render_event_figure(data, row, found_count, decode_workers, thumbnail_cache, camera_names)
+        plt.show()
+        plt.close(fig)
 
-                try:
-                    img = Image.open(io.BytesIO(img_data.image))
-                    ax_cam.imshow(img)
+    if found_count == 0:
+        print("Warning: No matching scene IDs found in the provided TFRecord file. Please check if the file matches the CSV data.")
 
-                    # Camera Label
-                    label_text = cam_labels.get(img_data.name, f"CAM {img_data.name}")
-                    ax_cam.text(0.5, 0.95, label_text, transform=ax_cam.transAxes,
-                                ha='center', va='top', fontsize=11, fontweight='bold',
-                                color='white', bbox=dict(facecolor='black', alpha=0.7, boxstyle='round,pad=0.2'))
+def warm_thumbnail_cache(events, thumbnail_cache, decode_workers=8):
+    """
+    Fills the thumbnail cache ahead of time (e.g. for the current top-K events), so that
+    their first view is already served from it.
 
-                    # Remove ticks
-                    ax_cam.set_xticks([])
-                    ax_cam.set_yticks([])
-                except:
-                    ax_cam.text(0.5, 0.5, "IMAGE ERROR", ha='center')
-                    ax_cam.axis('off')
+    :param events: TopKEvents, or list of event dicts with 'scene_id' and 'location'
+                   (see src.batch_render.events_from_metrics)
+    :param thumbnail_cache: ThumbnailCache or its directory
+    :param decode_workers: Number of threads decoding the camera images of an event
+    :return: Number of events added (already cached events are skipped)
+    """
+    # Full parse (the camera images are needed), only imported when rendering
+    from waymo_open_dataset.protos import end_to_end_driving_data_pb2 as wod_e2ed_pb2
 
-            plt.show()
+    if isinstance(events, TopKEvents):
+        events = events.events()
+    if isinstance(thumbnail_cache, str):
+        thumbnail_cache = ThumbnailCache(thumbnail_cache)
 
-            # Remove from target list and check if done
-            target_ids.remove(curr_id)
-            if found_count >= top_n: break
-            
-    if found_count == 0:
-        print("Warning: No matching scene IDs found in the provided TFRecord file. Please check if the file matches the CSV data.")
\ No newline at end of file
+    added = 0
+    files = {}
+    try:
+        for event in events:
+            scene_id, location = event['scene_id'], event['location']
+            if location is None or cached_event(thumbnail_cache, scene_id) is not None:
+                continue
+            shard, offset, length = location
+            if shard not in files:
+                files[shard] = open(shard, 'rb')
+            data = wod_e2ed_pb2.E2EDFrame()
+            data.ParseFromString(read_record(files[shard], offset, length))
+
+            sorted_images = sorted(data.frame.images, key=lambda x: x.name)
+            camera_names = [img_data.name for img_data in sorted_images]
+            camera_tiles(scene_id, camera_names, sorted_images, camera_cell_size(len(camera_names)),
+                         decode_workers, thumbnail_cache)
+            thumbnail_cache.put_frame(data, camera_names)
+            added += 1
+    finally:
+        for f in files.values():
+            f.close()
+    return added
@@ -0,0 +1,243 @@
+### ECE143 Final Project Group 4
+### Waymo E2E Driving Analysis - What-If Sweeps of Score Weights and Scenario Thresholds
+
+# interaction_score is a weighted sum of four per-frame components and classify_scenario is a
+# threshold rule table, so neither needs the TFRecords to be re-read to try other settings.
+# WhatIfSweep extracts the components and rule inputs from the metrics rows once; a grid of k
+# settings is then scored as one (k, 4) @ (4, n) product and classified by comparing every
+# metric column against a (k, 1) column of thresholds, evaluating the rules for all settings at once.
+
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from data.metrics_table import as_frame
+from data.scenario_classification import RULE_OPERATORS, SCENARIO_RULES, SCORE_WEIGHTS, UNMATCHED_CODE
+from data.scenario_classification import score_components as _frame_score_components
+
+# Cap on the elements of one (settings, rows) block, to bound the memory of large grids
+_BLOCK_ELEMENTS = 1 << 24
+
+def score_components(all_metrics):
+    """
+    Per-frame components of interaction_score (the terms before weighting).
+
+    :param all_metrics: List of metrics dicts, DataFrame or MetricsTable
+    :return: (n, 4) float64 array: significant braking, speed-weighted lateral accel
+             (with the unexpected-motion penalty), max longitudinal jerk, lateral event count
+    """
+    df = as_frame(all_metrics)
+    components = _frame_score_components(
+        df['max_braking'].to_numpy(np.float64), df['max_lateral_accel'].to_numpy(np.float64),
+        df['max_long_jerk'].to_numpy(np.float64), df['num_lateral_frames'].to_numpy(np.float64),
+        df['avg_speed_ms'].to_numpy(np.float64), df['intent'].to_numpy())
+    return np.column_stack(components).astype(np.float64)
+
+def weight_grid(**values):
+    """
+    All combinations of the given score weights; unlisted weights keep their default.
+
+        weight_grid(braking=[3, 5, 7], lateral=[2, 4, 6])   # 9 settings
+
+    :param values: SCORE_WEIGHTS name -> list of values
+    :return: pd.DataFrame, one row per setting, one column per weight
+    """
+    unknown = set(values) - set(SCORE_WEIGHTS)
+    if unknown:
+        raise ValueError(f"Unknown score weights {sorted(unknown)}, expected {list(SCORE_WEIGHTS)}")
+    axes = [values.get(name, [default]) for name, default in SCORE_WEIGHTS.items()]
+    return pd.DataFrame(list(itertools.product(*axes)), columns=list(SCORE_WEIGHTS), dtype=np.float64)
+
+def threshold_grid(values, rules=SCENARIO_RULES):
+    """
+    All combinations of the given rule thresholds; unlisted conditions keep their threshold.
+
+        threshold_grid({('EMERGENCY BRAKING', 'max_braking'): [-5.0, -4.5, -4.0],
+                        ('Erratic / Jerky Driving', 'max_long_jerk'): [3.0, 4.0]})   # 6 settings
+
+    :param values: (rule label, metric) -> list of thresholds
+    :param rules: Rule table, defaults to SCENARIO_RULES
+    :return: pd.DataFrame, one row per setting, one (label, metric) column per swept condition
+    """
+    conditions = {(rule['label'], name): op for rule in rules for name, op, _ in rule['conditions']}
+    for key in values:
+        if key not in conditions:
+            raise ValueError(f"No condition {key} in the rule table")
+        if conditions[key] == 'in':
+            raise ValueError(f"Condition {key} is a set membership test and cannot be swept")
+    keys = list(values)
+    grid = pd.DataFrame(list(itertools.product(*(values[key] for key in keys))), dtype=np.float64)
+    grid.columns = pd.MultiIndex.from_tuples(keys, names=['rule', 'metric']) if keys else grid.columns
+    return grid
+
+class WhatIfSweep:
+    """
+    Scores and classifies the same frames under many weight / threshold settings.
+
+        sweep = WhatIfSweep(all_metrics)
+        result = sweep.run(weight_grid(braking=[3, 5, 7]),
+                           threshold_grid({('EMERGENCY BRAKING', 'max_braking'): [-5, -4.5, -4]}))
+        result['scenario_counts'], result['top_events']
+    """
+
+    def __init__(self, all_metrics, rules=SCENARIO_RULES):
+        """
+        :param all_metrics: List of metrics dicts, DataFrame or MetricsTable
+        :param rules: Rule table the thresholds refer to, defaults to SCENARIO_RULES
+        """
+        df = as_frame(all_metrics)
+        self.rules = rules
+        self.labels = [rule['label'] for rule in rules]
+        self.scene_ids = df['scene_id'].to_numpy()
+        self.components = score_components(df)
+        names = {name for rule in rules for name, _, _ in rule['conditions']}
+        self.columns = {name: df[name].to_numpy() for name in names}
+
+    def __len__(self):
+        return len(self.scene_ids)
+
+    def scores(self, weights=None):
+        """
+        interaction_score of every frame under every weight setting.
+
+        :param weights: DataFrame from weight_grid, (k, 4) array or None for the default weights
+        :return: (k, n) float64 array
+        """
+        return _weight_matrix(weights) @ self.components.T
+
+    def classify(self, thresholds=None):
+        """
+        Scenario codes of every frame under every threshold setting (same first-match-wins
+        semantics as classify_scenarios, evaluated for all settings at once).
+
+        :param thresholds: DataFrame from threshold_grid, or None for the rule table as is
+        :return: (k, n) uint8 array of rule indices (UNMATCHED_CODE if no rule matched)
+        """
+        swept = {} if thresholds is None or thresholds.shape[1] == 0 else {
+            key: thresholds[key].to_numpy(np.float64)[:, None] for key in thresholds.columns}
+        k = len(thresholds) if swept else 1
+        n = len(self)
+        codes = np.full((k, n), UNMATCHED_CODE, dtype=np.uint8)
+
+        step = max(1, _BLOCK_ELEMENTS // k)
+        for start in range(0, n, step):
+            rows = slice(start, min(start + step, n))
+            unassigned = np.ones((k, rows.stop - rows.start), dtype=bool)
+            for code, rule in enumerate(self.rules):
+                match = unassigned.copy()
+                for name, op, threshold in rule['conditions']:
+                    # (k, 1) thresholds broadcast against the (n,) column
+                    match &= RULE_OPERATORS[op](self.columns[name][rows], swept.get((rule['label'], name), threshold))
+                codes[:, rows][match] = code
+                unassigned &= ~match
+        return codes
+
+    def top_events(self, weights=None, top_n=100):
+        """
+        Row indices of the top_n frames by score under every weight setting.
+
+        :param weights: See scores()
+        :param top_n: Number of events per setting
+        :return: (k, top_n) int array, highest score first
+        """
+        matrix = _weight_matrix(weights)
+        top_n = min(top_n, len(self))
+        top = np.zeros((len(matrix), top_n), dtype=np.int64)
+        if top_n == 0:
+            return top
+
+        step = max(1, _BLOCK_ELEMENTS // max(len(self), 1))
+        for start in range(0, len(matrix), step):
+            block = matrix[start:start + step] @ self.components.T
+            part = np.argpartition(-block, top_n - 1, axis=1)[:, :top_n]
+            order = np.argsort(-np.take_along_axis(block, part, axis=1), axis=1, kind='stable')
+            top[start:start + step] = np.take_along_axis(part, order, axis=1)
+        return top
+
+    def run(self, weights=None, thresholds=None, top_n=100):
+        """
+        Scenario distribution per threshold setting and top-event changes per weight setting,
+        both relative to the current (default) settings.
+
+        :param weights: DataFrame from weight_grid (None = default weights only)
+        :param thresholds: DataFrame from threshold_grid (None = rule table only)
+        :param top_n: Size of the top-event set compared across weight settings
+        :return: dict with
+                 'scenario_counts': thresholds settings x scenario, frame counts
+                 'scenario_delta': same, change against the default thresholds
+                 'top_events': weight settings with 'score_at_top_n', 'overlap' (share of the default
+                               top_n kept), 'entered' / 'dropped' (scene_ids)
+                 'top_scenarios': (weight setting, threshold setting) x scenario counts among the top_n events
+        """
+        weights = weight_grid() if weights is None else weights
+        thresholds = threshold_grid({}, self.rules) if thresholds is None else thresholds
+
+        codes = self.classify(thresholds)
+        base_codes = self.classify()
+        num_codes = len(self.labels) + 1
+        labels = self.labels + ['(unmatched)']
+
+        counts = _count_codes(codes, num_codes, labels)
+        base_counts = _count_codes(base_codes, num_codes, labels).iloc[0]
+        # Scenarios that never occur are left out
+        used = [label for label in labels if counts[label].any() or base_counts[label]]
+        scenario_counts = _with_settings(thresholds, counts[used])
+        scenario_delta = _with_settings(thresholds, counts[used] - base_counts[used])
+
+        top = self.top_events(weights, top_n)
+        base_top = self.top_events(None, top_n)[0]
+        base_set = set(base_top.tolist())
+        matrix = _weight_matrix(weights)
+        rows = []
+        for i, events in enumerate(top):
+            events_set = set(events.tolist())
+            last = events[-1] if len(events) else None
+            rows.append({
+                'score_at_top_n': float(matrix[i] @ self.components[last]) if last is not None else np.nan,
+                'overlap': len(events_set & base_set) / len(base_set) if base_set else np.nan,
+                'entered': self.scene_ids[sorted(events_set - base_set)].tolist(),
+                'dropped': self.scene_ids[sorted(base_set - events_set)].tolist(),
+            })
+        top_events = pd.concat([_settings_frame(weights).reset_index(drop=True), pd.DataFrame(rows)], axis=1)
+
+        # Scenario mix of the top events for every (weights, thresholds) pair: (kt, kw, top_n) codes
+        top_codes = codes[:, top].reshape(len(codes) * len(top), -1)
+        top_scenarios = _count_codes(top_codes, num_codes, labels)[used]
+        top_scenarios.index = pd.MultiIndex.from_product([range(len(codes)), range(len(top))],
+                                                         names=['threshold_setting', 'weight_setting'])
+        top_scenarios = top_scenarios.swaplevel().sort_index()
+
+        return {
+            'scenario_counts': scenario_counts,
+            'scenario_delta': scenario_delta,
+            'top_events': top_events,
+            'top_scenarios': top_scenarios,
+        }
+
+def _weight_matrix(weights):
+    if weights is None:
+        return np.array([list(SCORE_WEIGHTS.values())])
+    if isinstance(weights, pd.DataFrame):
+        return weights[list(SCORE_WEIGHTS)].to_numpy(np.float64)
+    return np.atleast_2d(np.asarray(weights, dtype=np.float64))
+
+def _settings_frame(settings):
+    if isinstance(settings, pd.DataFrame):
+        return settings
+    return pd.DataFrame(_weight_matrix(settings), columns=list(SCORE_WEIGHTS))
+
+def _count_codes(codes, num_codes, labels):
+    # UNMATCHED_CODE is folded into the last column
+    codes = np.where(codes == UNMATCHED_CODE, num_codes - 1, codes)
+    offsets = np.arange(len(codes))[:, None] * num_codes
+    counts = np.bincount((codes + offsets).ravel(), minlength=len(codes) * num_codes)
+    return pd.DataFrame(counts.reshape(len(codes), num_codes), columns=labels)
+
+def _with_settings(thresholds, counts):
+    # Prefix the counts with the swept thresholds, as "label: metric" columns
+    if thresholds.shape[1] == 0:
+        return counts
+    settings = thresholds.copy()
+    settings.columns = [f"{label}: {metric}" for label, metric in thresholds.columns]
+    return pd.concat([settings.reset_index(drop=True), counts.reset_index(drop=True)], axis=1)
@@ -0,0 +1,9 @@
+### ECE143 Final Project Group 4
+### Waymo E2E Driving Analysis - Test Configuration
+
+# Tests import the project packages (data, src, benchmarks) from the repository root.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,70 @@
+### ECE143 Final Project Group 4
+### Waymo E2E Driving Analysis - Tests for the Resumable Batch Runner
+
+# A run interrupted mid-shard and rerun with the same command must write the same outputs as
+# an uninterrupted run, and a finished shard that was rewritten must be processed again.
+
+import os
+
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic_data import write_synthetic_shards
+from data import batch_runner
+from data.batch_runner import run_batch
+
+OUTPUTS = ['metrics.csv', 'record_index.csv', 'scenario_counts.csv']
+
+@pytest.fixture
+def shards(tmp_path):
+    return write_synthetic_shards(str(tmp_path / 'shards'), 2, 50, frames_per_segment=5)
+
+def read_outputs(out_dir):
+    return {name: pd.read_csv(os.path.join(out_dir, name)) for name in OUTPUTS}
+
+def assert_same_outputs(expected_dir, actual_dir):
+    expected, actual = read_outputs(expected_dir), read_outputs(actual_dir)
+    for name in OUTPUTS:
+        pd.testing.assert_frame_equal(expected[name], actual[name])
+
+def interrupt_after(monkeypatch, num_calls):
+    analyze = batch_runner.analyze_driving_behavior
+    calls = []
+
+    def interrupting_analyze(data):
+        calls.append(data)
+        if len(calls) > num_calls:
+            raise KeyboardInterrupt
+        return analyze(data)
+
+    monkeypatch.setattr(batch_runner, 'analyze_driving_behavior', interrupting_analyze)
+
+def test_interrupted_run_resumes_to_same_outputs(shards, tmp_path, monkeypatch):
+    expected_dir, resumed_dir = str(tmp_path / 'expected'), str(tmp_path / 'resumed')
+    expected = run_batch(shards, expected_dir, num_workers=1, checkpoint_every=7)
+
+    # Interrupted in the second shard, between checkpoints
+    with monkeypatch.context() as patch:
+        interrupt_after(patch, 73)
+        with pytest.raises(KeyboardInterrupt):
+            run_batch(shards, resumed_dir, num_workers=1, checkpoint_every=7)
+    partial = batch_runner.load_run(resumed_dir)
+    assert [result['num_records'] for result in partial] == [50, 23]
+    assert [result['done'] for result in partial] == [True, False]
+
+    resumed = run_batch(shards, resumed_dir, num_workers=1, checkpoint_every=7)
+    assert resumed['num_records'] == expected['num_records'] == 100
+    assert_same_outputs(expected_dir, resumed_dir)
+
+def test_rewritten_shard_is_processed_again(shards, tmp_path):
+    out_dir = str(tmp_path / 'run')
+    run_batch(shards, out_dir, num_workers=1)
+
+    # Same path, different records
+    write_synthetic_shards(os.path.dirname(shards[1]), 2, 30, seed=5, frames_per_segment=5)
+    results = run_batch(shards, out_dir, num_workers=1)
+    assert results['num_records'] == 60
+
+    expected_dir = str(tmp_path / 'expected')
+    run_batch(shards, expected_dir, num_workers=1)
+    assert_same_outputs(expected_dir, out_dir)
@@ -0,0 +1,47 @@
+### ECE143 Final Project Group 4
+### Waymo E2E Driving Analysis - Tests for the Kinematics-Only Parser
+
+# parse_kinematics must extract the same values as E2EDFrame.ParseFromString, with or
+# without the camera images it jumps over.
+
+import numpy as np
+import pytest
+
+from benchmarks.synthetic_data import generate_records
+from data.fast_parse import STATE_FIELD_NUMBERS, parse_kinematics
+
+wod_e2ed_pb2 = pytest.importorskip('waymo_open_dataset.protos.end_to_end_driving_data_pb2')
+
+STATE_NAMES = list(STATE_FIELD_NUMBERS.values())
+
+@pytest.mark.parametrize('image_size', [None, (64, 48)])
+@pytest.mark.parametrize('reserialize', [False, True])
+def test_matches_full_parse(image_size, reserialize):
+    for record in generate_records(20, seed=3, frames_per_segment=4, image_size=image_size):
+        expected = wod_e2ed_pb2.E2EDFrame()
+        expected.ParseFromString(record)
+        if reserialize:
+            # The encoding of the protobuf library itself (packed or unpacked floats, as the .proto says)
+            record = expected.SerializeToString()
+        data = parse_kinematics(record)
+
+        assert data.frame.context.name == expected.frame.context.name
+        assert data.frame.timestamp_micros == expected.frame.timestamp_micros
+        assert data.intent == expected.intent
+        for states, expected_states in [(data.past_states, expected.past_states),
+                                        (data.future_states, expected.future_states)]:
+            for name in STATE_NAMES:
+                values = getattr(states, name)
+                assert values.dtype == np.float32
+                np.testing.assert_array_equal(values, np.array(getattr(expected_states, name), dtype=np.float32))
+
+def test_skips_future_states():
+    record = next(generate_records(1))
+    data = parse_kinematics(memoryview(record), include_future=False)
+    assert len(data.past_states.pos_x) == 16
+    assert all(len(getattr(data.future_states, name)) == 0 for name in STATE_NAMES)
+
+def test_truncated_record_raises():
+    record = next(generate_records(1))
+    with pytest.raises(ValueError):
+        parse_kinematics(record[:len(record) - 5])
@@ -0,0 +1,59 @@
+### ECE143 Final Project Group 4
+### Waymo E2E Driving Analysis - Tests for the Incremental Per-Segment Analyzer
+
+# IncrementalAnalyzer must return exactly what analyze_driving_behavior returns, bit for bit,
+# whether a frame extends the previous window of its segment or is recomputed in full.
+
+import numpy as np
+import pytest
+
+from benchmarks.synthetic_data import generate_records
+from data.fast_parse import parse_kinematics
+from data.incremental_analysis import IncrementalAnalyzer
+from data.scenario_classification import STATE_FIELDS, analyze_driving_behavior
+
+def sliding_frames(num_records=300, stride=1, seed=0, dtype=np.float32):
+    frames = [parse_kinematics(record, include_future=False)
+              for record in generate_records(num_records, seed, frames_per_segment=30, stride=stride)]
+    for data in frames:
+        for name in STATE_FIELDS:
+            setattr(data.past_states, name, getattr(data.past_states, name).astype(dtype))
+    return frames
+
+def same_bits(expected, actual):
+    # Float values compared by their bytes (NaN == NaN, 0.0 != -0.0)
+    if expected is None or actual is None:
+        return expected is actual
+    return expected.keys() == actual.keys() and all(
+        np.float64(value).tobytes() == np.float64(actual[key]).tobytes() if isinstance(value, float)
+        else value == actual[key] for key, value in expected.items())
+
+def assert_matches_full(frames):
+    analyzer = IncrementalAnalyzer()
+    for data in frames:
+        assert same_bits(analyze_driving_behavior(data), analyzer.analyze(data)), data.frame.context.name
+    return analyzer
+
+@pytest.mark.parametrize('dtype', [np.float32, np.float64])
+@pytest.mark.parametrize('stride', [1, 3])
+def test_sliding_windows_match_full(dtype, stride):
+    analyzer = assert_matches_full(sliding_frames(stride=stride, dtype=dtype))
+    assert analyzer.stats['incremental'] > analyzer.stats['full']
+    assert analyzer.stats['reused_steps'] > analyzer.stats['computed_steps']
+
+def test_unrelated_and_shortened_windows_match_full():
+    rng = np.random.default_rng(1)
+    frames = sliding_frames(seed=1)
+    for data in frames:
+        length = int(rng.integers(2, 17))
+        for name in STATE_FIELDS:
+            setattr(data.past_states, name, getattr(data.past_states, name)[-length:])
+    assert_matches_full(list(rng.permutation(frames)))
+
+def test_non_finite_values_match_full():
+    rng = np.random.default_rng(2)
+    frames = sliding_frames(seed=2)
+    for data, value in zip(rng.choice(frames, 20, replace=False), [np.nan, np.inf] * 10):
+        getattr(data.past_states, rng.choice(STATE_FIELDS))[rng.integers(0, 16)] = value
+    with np.errstate(invalid='ignore'):
+        assert_matches_full(frames)
@@ -0,0 +1,84 @@
+### ECE143 Final Project Group 4
+### Waymo E2E Driving Analysis - Tests for the Persistent Metrics Cache
+
+# A cached shard must come back exactly as process_shard returned it, and an entry must
+# stop matching as soon as its shard, record limit or analysis version changes.
+
+import os
+
+import pytest
+
+from benchmarks.synthetic_data import generate_records, write_synthetic_shards
+from data import ingestion
+from data.ingestion import ingest_shards, process_shard
+from data.metrics_cache import (
+    cache_info, evict_cache, invalidate_cache, load_cached_shard, store_cached_shard,
+)
+from data.tfrecord import write_records
+
+CACHED_FIELDS = ['all_metrics', 'scenario_counts', 'record_index', 'num_records', 'num_errors']
+
+@pytest.fixture
+def shards(tmp_path):
+    return write_synthetic_shards(str(tmp_path / 'shards'), 2, 40, frames_per_segment=5)
+
+def test_hit_returns_stored_result(shards, tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    assert load_cached_shard(cache_dir, shards[0]) is None
+
+    result = process_shard(shards[0])
+    store_cached_shard(cache_dir, result)
+    cached = load_cached_shard(cache_dir, shards[0])
+    for name in CACHED_FIELDS:
+        assert cached[name] == result[name], name
+
+def test_miss_on_other_limit_version_or_shard(shards, tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    store_cached_shard(cache_dir, process_shard(shards[0], num_samples=20), num_samples=20)
+    assert load_cached_shard(cache_dir, shards[0], num_samples=20) is not None
+    assert load_cached_shard(cache_dir, shards[0]) is None
+    assert load_cached_shard(cache_dir, shards[0], num_samples=20, version='other') is None
+    assert load_cached_shard(cache_dir, shards[1], num_samples=20) is None
+
+    # Rewriting the shard invalidates its entry
+    write_records(shards[0], generate_records(30, seed=7))
+    assert load_cached_shard(cache_dir, shards[0], num_samples=20) is None
+    assert [entry['valid'] for entry in cache_info(cache_dir)] == [False]
+    assert invalidate_cache(cache_dir, stale_only=True) == 1
+    assert cache_info(cache_dir) == []
+
+def test_store_replaces_older_entry_of_shard(shards, tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    store_cached_shard(cache_dir, process_shard(shards[0]), version='old')
+    store_cached_shard(cache_dir, process_shard(shards[0]))
+    entries = cache_info(cache_dir)
+    assert len(entries) == 1 and entries[0]['valid']
+    assert sorted(os.listdir(cache_dir)) == sorted([entries[0]['file'], 'manifest.json'])
+
+def test_evict_least_recently_used(shards, tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    for path in shards:
+        store_cached_shard(cache_dir, process_shard(path))
+    old, recent = cache_info(cache_dir)
+    os.utime(os.path.join(cache_dir, old['file']), (1, 1))
+    os.utime(os.path.join(cache_dir, recent['file']), (2, 2))
+    # A hit makes the entry the most recently used
+    load_cached_shard(cache_dir, old['shard'])
+
+    assert evict_cache(cache_dir, old['bytes']) == 1
+    assert [entry['shard'] for entry in cache_info(cache_dir)] == [old['shard']]
+
+def test_ingest_shards_reads_cache(shards, tmp_path, monkeypatch):
+    cache_dir = str(tmp_path / 'cache')
+    expected = ingest_shards(shards, num_workers=1)
+    first = ingest_shards(shards, num_workers=1, cache_dir=cache_dir)
+
+    def no_processing(path, **kwargs):
+        raise AssertionError(f"{path} was processed although it is cached")
+
+    monkeypatch.setattr(ingestion, 'process_shard', no_processing)
+    second = ingest_shards(shards, num_workers=1, cache_dir=cache_dir)
+    for results in (first, second):
+        assert results['all_metrics'] == expected['all_metrics']
+        assert results['record_index'] == expected['record_index']
+        assert dict(results['scenario_counts']) == dict(expected['scenario_counts'])
@@ -0,0 +1,68 @@
+### ECE143 Final Project Group 4
+### Waymo E2E Driving Analysis - Tests for Index-Driven Sampling
+
+# Every sampled record carries the number of records it stands for: the weights of a sample
+# must add up to the catalog (and, when stratified, to every stratum), or weighted
+# statistics over the sample are biased.
+
+import numpy as np
+import pytest
+
+from benchmarks.synthetic_data import write_synthetic_shards
+from data.sampling import STRATA, RecordCatalog, _allocate, reservoir_sample_records, sample_records
+
+@pytest.fixture(scope='module')
+def catalog(tmp_path_factory):
+    # 3 shards of 200 records in segments of 10 frames: 60 segments
+    shards = write_synthetic_shards(str(tmp_path_factory.mktemp('shards')), 3, 200, frames_per_segment=10)
+    return RecordCatalog.build(shards)
+
+def test_uniform_weights_sum_to_catalog(catalog):
+    for size in (1, 37, 600, 1000):
+        sample = sample_records(catalog, size)
+        assert len(sample) == min(size, len(catalog))
+        assert sample['weight'].sum() == pytest.approx(len(catalog))
+
+@pytest.mark.parametrize('by', STRATA)
+@pytest.mark.parametrize('allocation', ['proportional', 'equal'])
+@pytest.mark.parametrize('size', [60, 61, 100, 500, 600])
+def test_stratified_weights_sum_to_every_stratum(catalog, by, allocation, size):
+    sample = sample_records(catalog, size, mode='stratified', by=by, allocation=allocation, seed=size)
+    assert len(sample) == size
+    assert not sample.duplicated(['shard', 'offset']).any()
+    assert sample['weight'].sum() == pytest.approx(len(catalog))
+    stratum_sizes = catalog.frame[by].value_counts()
+    stratum_weights = sample.groupby(by)['weight'].sum()
+    np.testing.assert_allclose(stratum_weights[stratum_sizes.index], stratum_sizes)
+
+@pytest.mark.parametrize('allocation', ['proportional', 'equal'])
+def test_small_strata_keep_their_weight(catalog, allocation):
+    # Segments of 1 to 10 records: proportional quotas below one record round up, not to zero
+    frame = catalog.frame
+    position = frame.groupby('segment').cumcount()
+    segment_length = frame['segment'].rank(method='dense').astype(int) % 10 + 1
+    uneven = RecordCatalog(frame[position < segment_length], catalog.shard_stats)
+    for size in (60, 70, 100):
+        sample = sample_records(uneven, size, mode='stratified', by='segment', allocation=allocation)
+        assert sample['segment'].nunique() == 60
+        assert sample['weight'].sum() == pytest.approx(len(uneven))
+
+def test_stratified_needs_a_record_per_stratum(catalog):
+    num_segments = catalog.frame['segment'].nunique()
+    assert num_segments == 60
+    with pytest.raises(ValueError, match='needs size >= 60'):
+        sample_records(catalog, num_segments - 1, mode='stratified', by='segment')
+
+def test_allocate_hand_computed():
+    rng = np.random.default_rng(0)
+    # Quotas 0.5 / 2.5 / 7.0: the small stratum is raised to 1, the 2.5 one gives up its remainder
+    np.testing.assert_array_equal(_allocate([10, 50, 140], 10, 'proportional', rng), [1, 2, 7])
+    np.testing.assert_array_equal(_allocate([1, 599], 50, 'proportional', rng), [1, 49])
+    np.testing.assert_array_equal(_allocate([3, 3, 3], 9, 'proportional', rng), [3, 3, 3])
+    # Equal shares; the 2-record stratum is taken whole and the rest redistributed
+    np.testing.assert_array_equal(_allocate([2, 50, 50], 12, 'equal', rng), [2, 5, 5])
+
+def test_reservoir_weights_sum_to_records(catalog):
+    sample = reservoir_sample_records(catalog.shards, 50)
+    assert len(sample) == 50
+    assert sample['weight'].sum() == pytest.approx(len(catalog))
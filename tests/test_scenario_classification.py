@@ -0,0 +1,150 @@
+### ECE143 Final Project Group 4
+### Waymo E2E Driving Analysis - Tests for the Batch Metrics and Rule-Table Classifier
+
+# analyze_driving_behavior_batch and classify_scenarios must reproduce the per-frame
+# analyze_driving_behavior / classify_scenario exactly, so every frame is classified the
+# same way whichever path ingested it.
+# Both paths share reduce_window, so a few small windows are also checked against metrics
+# worked out by hand.
+
+import numpy as np
+import pytest
+
+from data.fast_parse import KinematicsFrame
+from data.scenario_classification import (
+    INT_METRICS, SCENARIO_RULES, STATE_FIELDS, UNMATCHED_CODE, analyze_driving_behavior,
+    analyze_driving_behavior_batch, batch_to_records, classify_scenario, classify_scenarios,
+    stack_past_states,
+)
+
+def make_frame(rng, i, length, dtype, stationary=False):
+    data = KinematicsFrame()
+    data.frame.context.name = f"scene-{i:04d}"
+    data.frame.timestamp_micros = 1000 * i
+    data.intent = int(rng.integers(0, 4))
+    scale = 0.3 if stationary else 12.0
+    heading = rng.uniform(-np.pi, np.pi)
+    speed = np.abs(rng.normal(scale, scale / 3, length))
+    values = {
+        'vel_x': speed * np.cos(heading),
+        'vel_y': speed * np.sin(heading),
+        'accel_x': rng.normal(0.0, 2.5, length),
+        'accel_y': rng.normal(0.0, 2.5, length),
+    }
+    values['pos_x'] = np.cumsum(values['vel_x']) * 0.25
+    values['pos_y'] = np.cumsum(values['vel_y']) * 0.25
+    for name in STATE_FIELDS:
+        setattr(data.past_states, name, values[name].astype(dtype))
+    return data
+
+def make_frames(dtype, seed=0):
+    rng = np.random.default_rng(seed)
+    lengths = [2, 3, 5, 10, 16, 16, 16, 7, 2, 16]
+    frames = [make_frame(rng, i, length, dtype) for i, length in enumerate(lengths * 10)]
+    frames += [make_frame(rng, len(frames) + i, 16, dtype, stationary=True) for i in range(10)]
+    return frames
+
+@pytest.mark.parametrize('dtype', [np.float32, np.float64])
+def test_batch_matches_per_frame(dtype):
+    frames = make_frames(dtype)
+    expected = [analyze_driving_behavior(data) for data in frames]
+    actual = batch_to_records(analyze_driving_behavior_batch(**stack_past_states(frames)))
+    assert actual == expected
+
+def hand_frame(name, intent, **states):
+    data = KinematicsFrame()
+    data.frame.context.name = name
+    data.intent = intent
+    for field in STATE_FIELDS:
+        setattr(data.past_states, field, np.array(states[field], dtype=np.float64))
+    return data
+
+# Small windows with their metrics worked out by hand, independent of reduce_window
+HAND_COMPUTED = [
+    # Driving along +x: long/lat accel are accel_x/accel_y, lateral moves are dy.
+    # Speed factor 0.9 and a 2x penalty (GO_STRAIGHT, lat accel 2 > 1.5):
+    # score = 4 * 5 + (2 * 0.9 * 2) * 4 + 16 * 0.5 + 1 * 2 = 44.4
+    (hand_frame('along-x', 1, pos_x=[0, 2.5, 5, 7], pos_y=[0, 0, 0.5, 0.5], vel_x=[10, 10, 8, 8],
+                vel_y=[0, 0, 0, 0], accel_x=[0, -2, -4, 0], accel_y=[0, 1, 2, 0.5]),
+     {'avg_speed_ms': 9.0, 'num_decelerations': 2, 'num_accelerations': 0, 'num_lateral_frames': 1,
+      'max_braking': -4.0, 'max_acceleration': 0.0, 'max_lateral_accel': 2.0, 'max_long_jerk': 16.0,
+      'max_lat_jerk': 6.0, 'total_lateral_dist_m': 0.5, 'net_lateral_dist_m': 0.5, 'interaction_score': 44.4}),
+    # Driving along +y: long accel is accel_y, lat accel is -accel_x, lateral moves are -dx.
+    # Speed factor clipped to 0.5, no penalty: score = 2 * 5 + (1.5 * 0.5) * 4 + 12 * 0.5 + 1 * 2 = 21
+    (hand_frame('along-y', 0, pos_x=[0, 0.3, 0.3], pos_y=[0, 1, 2], vel_x=[0, 0, 0], vel_y=[4, 4, 4],
+                accel_x=[1, -1.5, 0], accel_y=[-2, 0, 3]),
+     {'avg_speed_ms': 4.0, 'num_decelerations': 1, 'num_accelerations': 1, 'num_lateral_frames': 1,
+      'max_braking': -2.0, 'max_acceleration': 3.0, 'max_lateral_accel': 1.5, 'max_long_jerk': 12.0,
+      'max_lat_jerk': 10.0, 'total_lateral_dist_m': 0.3, 'net_lateral_dist_m': 0.3, 'interaction_score': 21.0}),
+    # Below 1 m/s nothing is projected: no accel, jerk or lateral moves, score 0
+    (hand_frame('creeping', 1, pos_x=[0, 0.1], pos_y=[0, 0], vel_x=[0.5, 0], vel_y=[0, 0],
+                accel_x=[3, -3], accel_y=[1, 1]),
+     {'avg_speed_ms': 0.25, 'num_decelerations': 0, 'num_accelerations': 0, 'num_lateral_frames': 0,
+      'max_braking': 0.0, 'max_acceleration': 0.0, 'max_lateral_accel': 0.0, 'max_long_jerk': 0.0,
+      'max_lat_jerk': 0.0, 'total_lateral_dist_m': 0.0, 'net_lateral_dist_m': 0.0, 'interaction_score': 0.0}),
+]
+
+@pytest.mark.parametrize('path', ['per_frame', 'batch'])
+def test_hand_computed_metrics(path):
+    frames = [data for data, _ in HAND_COMPUTED]
+    if path == 'per_frame':
+        records = [analyze_driving_behavior(data) for data in frames]
+    else:
+        records = batch_to_records(analyze_driving_behavior_batch(**stack_past_states(frames)))
+    for record, (data, expected) in zip(records, HAND_COMPUTED):
+        assert record['scene_id'] == data.frame.context.name
+        assert record['intent'] == data.intent
+        for name, value in expected.items():
+            assert record[name] == pytest.approx(value, abs=1e-12), (data.frame.context.name, name)
+
+def test_stationary_frames_have_no_projected_accel():
+    frames = [make_frame(np.random.default_rng(1), i, 16, np.float32, stationary=True) for i in range(5)]
+    batch = analyze_driving_behavior_batch(**stack_past_states(frames))
+    assert np.all(batch['avg_speed_ms'] < 1.0)
+    for name in ['max_braking', 'max_acceleration', 'max_lateral_accel', 'max_long_jerk', 'max_lat_jerk']:
+        assert np.all(batch[name] == 0.0)
+    assert batch_to_records(batch) == [analyze_driving_behavior(data) for data in frames]
+
+def test_short_histories_are_invalid():
+    rng = np.random.default_rng(2)
+    frames = [make_frame(rng, 0, 1, np.float32), make_frame(rng, 1, 4, np.float32)]
+    batch = analyze_driving_behavior_batch(**stack_past_states(frames))
+    assert batch['valid'].tolist() == [False, True]
+    assert analyze_driving_behavior(frames[0]) is None
+    assert batch_to_records(batch) == [analyze_driving_behavior(frames[1])]
+
+@pytest.mark.parametrize('dtype', [np.float32, np.float64])
+def test_classify_scenarios_matches_classify_scenario(dtype):
+    records = batch_to_records(analyze_driving_behavior_batch(**stack_past_states(make_frames(dtype))))
+    columns = {name: np.array([row[name] for row in records]) for name in records[0] if name != 'scene_id'}
+    codes, labels = classify_scenarios(columns)
+    assert [labels[code] for code in codes] == [classify_scenario(row) for row in records]
+
+def test_classify_scenarios_covers_every_rule():
+    # One synthetic row per tier boundary, including ones the random frames rarely reach
+    base = {'avg_speed_ms': 10.0, 'intent': 0, 'max_braking': 0.0, 'max_acceleration': 0.0,
+            'max_lateral_accel': 0.0, 'max_long_jerk': 0.0, 'num_decelerations': 0,
+            'num_lateral_frames': 0}
+    overrides = [
+        {'max_braking': -5.0}, {'intent': 1, 'max_lateral_accel': 2.1}, {'intent': 2, 'max_lateral_accel': 2.6},
+        {'max_long_jerk': 4.1}, {'max_acceleration': 3.1}, {'num_decelerations': 3, 'avg_speed_ms': 8.0},
+        {'intent': 1, 'num_lateral_frames': 2}, {'intent': 3, 'num_lateral_frames': 1},
+        {'avg_speed_ms': 0.5}, {'avg_speed_ms': 6.0}, {'avg_speed_ms': 15.0}, {'avg_speed_ms': 20.0},
+        {'avg_speed_ms': 30.0},
+    ]
+    rows = [dict(base, **override) for override in overrides]
+    columns = {name: np.array([row[name] for row in rows]) for name in base}
+    codes, labels = classify_scenarios(columns)
+    assert [labels[code] for code in codes] == [classify_scenario(row) for row in rows]
+    assert sorted(set(codes.tolist())) == list(range(len(SCENARIO_RULES)))
+
+def test_classify_scenarios_unmatched_rows():
+    rules = [{'tier': 1, 'label': 'Fast', 'conditions': [('avg_speed_ms', '>', 10.0)]}]
+    codes, labels = classify_scenarios({'avg_speed_ms': np.array([5.0, 15.0])}, rules)
+    assert codes.tolist() == [UNMATCHED_CODE, 0]
+    assert labels == ['Fast']
+
+def test_classify_scenarios_rejects_too_many_rules():
+    rules = [{'tier': 4, 'label': f"rule {i}", 'conditions': []} for i in range(UNMATCHED_CODE)]
+    with pytest.raises(ValueError):
+        classify_scenarios({name: np.zeros(1) for name in INT_METRICS}, rules)
@@ -0,0 +1,35 @@
+### ECE143 Final Project Group 4
+### Waymo E2E Driving Analysis - Tests for the Per-Timestep Series Store
+
+# The series written during ingestion come out of the analysis pass itself; they must equal
+# frame_series of every frame and leave the metrics unchanged.
+
+import numpy as np
+import pytest
+
+from benchmarks.synthetic_data import write_synthetic_shards
+from data.fast_parse import parse_kinematics
+from data.ingestion import process_shard
+from data.series_store import PAIR_SERIES, STEP_SERIES, frame_series, open_series_store
+from data.tfrecord import iter_records
+
+@pytest.fixture(scope='module')
+def shard(tmp_path_factory):
+    return write_synthetic_shards(str(tmp_path_factory.mktemp('shards')), 1, 120, frames_per_segment=10)[0]
+
+@pytest.mark.parametrize('incremental', [False, True])
+def test_ingested_series_match_frame_series(shard, tmp_path, incremental):
+    expected_rows = process_shard(shard)['all_metrics']
+    result = process_shard(shard, series_dir=str(tmp_path), incremental=incremental)
+    assert result['all_metrics'] == expected_rows
+
+    store = open_series_store(str(tmp_path))
+    assert len(store) == len(expected_rows)
+    for _, record in iter_records(shard):
+        data = parse_kinematics(record, include_future=False)
+        steps, pairs = frame_series(data)
+        stored = store[data.frame.context.name]
+        for name, values in zip(STEP_SERIES, steps):
+            np.testing.assert_array_equal(stored[name], values.astype(np.float32))
+        for name, values in zip(PAIR_SERIES, pairs):
+            np.testing.assert_array_equal(stored[name], values.astype(np.float32))
@@ -0,0 +1,52 @@
+### ECE143 Final Project Group 4
+### Waymo E2E Driving Analysis - Tests for the Trajectory Similarity Index
+
+# Queries must return the exact nearest neighbours in the scaled feature space, and shards
+# without a valid frame must give an empty index instead of failing to build one.
+
+import numpy as np
+import pytest
+
+from benchmarks.synthetic_data import write_synthetic_shards
+from data.tfrecord import write_records
+from src.similarity import TrajectorySimilarityIndex, build_similarity_index
+
+@pytest.fixture(scope='module')
+def shards(tmp_path_factory):
+    return write_synthetic_shards(str(tmp_path_factory.mktemp('shards')), 2, 150, frames_per_segment=5)
+
+@pytest.mark.parametrize('num_components', [None, 16])
+def test_query_returns_nearest_neighbours(shards, num_components):
+    index = build_similarity_index(shards, num_components=num_components)
+    assert len(index) == 300
+
+    for row in (0, 77, 299):
+        scene_id = index.scene_ids[row]
+        result = index.query(scene_id, k=5)
+        distances = np.sqrt(((index.features.astype(np.float64) - index.features[row])**2).sum(axis=1))
+        distances[row] = np.inf
+        expected = np.sort(distances)[:5]
+        assert scene_id not in result['scene_id'].tolist()
+        assert result['rank'].tolist() == [1, 2, 3, 4, 5]
+        np.testing.assert_allclose(result['distance'], expected, rtol=1e-5)
+
+def test_save_and_load(shards, tmp_path):
+    index = build_similarity_index(shards)
+    path = str(tmp_path / 'index.pkl')
+    index.save(path)
+    loaded = TrajectorySimilarityIndex.load(path)
+    scene_id = index.scene_ids[10]
+    assert loaded.query(scene_id).equals(index.query(scene_id))
+
+def test_empty_index(tmp_path):
+    path = str(tmp_path / 'empty.tfrecord-00000-of-00001')
+    write_records(path, [])
+    index = build_similarity_index([path])
+    assert len(index) == 0
+    with pytest.raises(KeyError):
+        index.query('missing')
+    distances, rows = index.query_features(np.zeros(index.features.shape[1]), k=3)
+    assert distances.shape == rows.shape == (1, 0)
+
+    index.save(str(tmp_path / 'index.pkl'))
+    assert len(TrajectorySimilarityIndex.load(str(tmp_path / 'index.pkl'))) == 0
@@ -0,0 +1,106 @@
+### ECE143 Final Project Group 4
+### Waymo E2E Driving Analysis - Tests for the Streaming Score Statistics
+
+# KLL quantiles must stay within their rank error bound (also after merging per-worker
+# sketches), and merged TopKEvents must hold exactly the global top K in any merge order.
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.streaming_stats import KLLSketch, ScoreSummary, TopKEvents
+
+QUANTILES = np.linspace(0.01, 0.99, 99)
+
+def rank_error(sketch, values):
+    # Distance of q from the range of ranks the estimate has in the data (0 if inside)
+    values = np.sort(values)
+    estimates = sketch.quantile(QUANTILES)
+    low = np.searchsorted(values, estimates, side='left') / len(values)
+    high = np.searchsorted(values, estimates, side='right') / len(values)
+    return np.maximum(low - QUANTILES, QUANTILES - high).max()
+
+def test_exact_before_first_compaction():
+    values = np.random.default_rng(0).normal(size=8)
+    sketch = KLLSketch(k=200)
+    sketch.update(values)
+    assert len(sketch.levels) == 1
+    np.testing.assert_array_equal(sketch.quantile(QUANTILES), np.quantile(values, QUANTILES))
+    assert np.isnan(KLLSketch().quantile(0.5))
+
+@pytest.mark.parametrize('k', [100, 200, 400])
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_rank_error_bound(k, seed):
+    values = np.random.default_rng(seed).lognormal(0.0, 1.0, 50_000)
+    sketch = KLLSketch(k, seed)
+    sketch.update(values)
+    assert rank_error(sketch, values) <= 4.0 / k
+    assert (sketch.min, sketch.max) == (values.min(), values.max())
+    assert sketch.num_retained() < 3 * k
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_merged_sketches_rank_error_bound(seed):
+    values = np.random.default_rng(seed).lognormal(0.0, 1.0, 50_000)
+    sketches = []
+    for i, part in enumerate(np.array_split(values, 7)):
+        sketches.append(KLLSketch(200, seed + i))
+        sketches[-1].update(part)
+    merged = sketches[0]
+    for sketch in sketches[1:]:
+        merged.merge(sketch)
+    assert merged.count == len(values)
+    assert rank_error(merged, values) <= 4.0 / 200
+
+def test_array_update_matches_scalar_updates():
+    values = np.random.default_rng(3).random(3000)
+    batch, scalar = KLLSketch(50, seed=4), KLLSketch(50, seed=4)
+    batch.update(values)
+    for value in values:
+        scalar.update(value)
+    assert len(batch.levels) == len(scalar.levels)
+    for batch_level, scalar_level in zip(batch.levels, scalar.levels):
+        np.testing.assert_array_equal(batch_level, scalar_level)
+
+def test_score_summary_batch_matches_rows():
+    rng = np.random.default_rng(5)
+    scenarios = rng.choice(['a', 'b', 'c'], 2000)
+    values = rng.random(2000)
+    by_row, by_batch = ScoreSummary(k=50), ScoreSummary(k=50)
+    for scenario, value in zip(scenarios, values):
+        by_row.update({'scenario': scenario, 'interaction_score': value})
+    by_batch.update_batch(scenarios, values)
+    assert by_batch.scenario_counts == by_row.scenario_counts == pd.Series(scenarios).value_counts().to_dict()
+    pd.testing.assert_frame_equal(by_batch.stats_table(), by_row.stats_table())
+
+def make_rows(rng, num_rows):
+    # Rounded scores, so there are ties to break by scene_id
+    scores = np.round(rng.random(num_rows), 2)
+    return [{'scene_id': f"scene-{i:05d}", 'interaction_score': float(score)} for i, score in enumerate(scores)]
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_top_k_merge_is_global_top_k(seed):
+    rng = np.random.default_rng(seed)
+    rows = make_rows(rng, 2000)
+    expected = sorted(rows, key=lambda row: (row['interaction_score'], row['scene_id']), reverse=True)[:25]
+
+    parts = []
+    for chunk in np.array_split(rng.permutation(len(rows)), 6):
+        part = TopKEvents(k=25)
+        for i in chunk:
+            part.push(rows[i], location=('shard', int(i), 1))
+        parts.append(part)
+
+    for order in (range(6), rng.permutation(6)):
+        merged = TopKEvents(k=25)
+        for i in order:
+            merged.merge(parts[i])
+        assert merged.metrics_rows() == expected
+        assert list(merged.record_index()) == [row['scene_id'] for row in expected]
+
+def test_top_k_keeps_all_below_k():
+    top = TopKEvents(k=10)
+    rows = make_rows(np.random.default_rng(6), 4)
+    for row in rows:
+        top.push(row)
+    assert len(top) == 4
+    assert top.record_index() == {}
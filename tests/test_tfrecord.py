@@ -0,0 +1,68 @@
+### ECE143 Final Project Group 4
+### Waymo E2E Driving Analysis - Tests for the TFRecord Reader / Writer
+
+# Records written by write_records must come back unchanged (at the offsets it returned)
+# from both readers, resuming at start_offset must continue with the next record, and
+# check_crc must catch a corrupted record.
+
+import pytest
+
+from data.tfrecord import (
+    FOOTER_SIZE, HEADER_SIZE, iter_records, iter_records_buffered, read_record, write_records,
+)
+
+RECORDS = [b'', b'a', bytes(range(256)) * 3, b'\x00' * 1000, b'last record']
+
+@pytest.fixture
+def shard(tmp_path):
+    path = str(tmp_path / 'records.tfrecord')
+    return path, write_records(path, RECORDS)
+
+@pytest.mark.parametrize('reader', [iter_records, iter_records_buffered])
+def test_round_trip(shard, reader):
+    path, locations = shard
+    read = [(offset, bytes(record)) for offset, record in reader(path, check_crc=True)]
+    assert [record for _, record in read] == RECORDS
+    assert [offset for offset, _ in read] == [offset for offset, _ in locations]
+    assert [bytes(record) for _, record in reader(path, num_records=2)] == RECORDS[:2]
+
+def test_read_record_at_offset(shard):
+    path, locations = shard
+    with open(path, 'rb') as f:
+        for (offset, length), expected in zip(locations, RECORDS):
+            assert read_record(f, offset, length) == expected
+            assert read_record(f, offset) == expected
+
+def test_start_offset_resumes_after_record(shard):
+    path, locations = shard
+    offset, length = locations[2]
+    next_offset = offset + HEADER_SIZE + length + FOOTER_SIZE
+    assert next_offset == locations[3][0]
+    assert [bytes(record) for _, record in iter_records(path, start_offset=next_offset)] == RECORDS[3:]
+    assert list(iter_records(path, start_offset=locations[-1][0] + HEADER_SIZE + len(RECORDS[-1]) + FOOTER_SIZE)) == []
+
+@pytest.mark.parametrize('reader', [iter_records, iter_records_buffered])
+@pytest.mark.parametrize('where', ['length', 'data'])
+def test_corrupted_crc_is_detected(shard, reader, where):
+    path, locations = shard
+    offset, _ = locations[2]
+    position = offset + 3 if where == 'length' else offset + HEADER_SIZE + 10
+    with open(path, 'r+b') as f:
+        f.seek(position)
+        byte = f.read(1)
+        f.seek(position)
+        f.write(bytes([byte[0] ^ 0x01]))
+
+    with pytest.raises(ValueError, match=f"Corrupted record {where} at byte {offset}"):
+        list(reader(path, check_crc=True))
+    if where == 'data':
+        # Without check_crc the changed bytes are returned as they are
+        assert len(list(reader(path))) == len(RECORDS)
+
+@pytest.mark.parametrize('reader', [iter_records, iter_records_buffered])
+def test_truncated_file_raises(shard, reader):
+    path, locations = shard
+    with open(path, 'r+b') as f:
+        f.truncate(locations[-1][0] + HEADER_SIZE + 2)
+    with pytest.raises(ValueError, match='Truncated record'):
+        list(reader(path))
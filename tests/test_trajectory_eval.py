@@ -0,0 +1,94 @@
+### ECE143 Final Project Group 4
+### Waymo E2E Driving Analysis - Tests for the Predicted Trajectory Evaluation
+
+# ADE/FDE and the lateral/longitudinal errors of hand-built trajectories against a straight
+# ground-truth path, and the comfort metrics of a perfect prediction against its gt_ values.
+
+import numpy as np
+import pytest
+
+from data.trajectory_eval import COMFORT_METRICS, evaluate_predictions, evaluate_trajectories
+
+DT = 0.25
+STEPS = 8
+
+def ground_truth(num_frames, speed=10.0):
+    # Straight drive along +x from the origin at constant speed (left = +y)
+    steps = np.arange(1, STEPS + 1) * DT
+    pos_x = np.tile(speed * steps, (num_frames, 1))
+    pos_y = np.zeros_like(pos_x)
+    return {
+        'scene_id': np.array([f"scene-{i}" for i in range(num_frames)], dtype=object),
+        'pos_x': pos_x.astype(np.float32),
+        'pos_y': pos_y.astype(np.float32),
+        'vel_x': np.full_like(pos_x, speed, dtype=np.float32),
+        'vel_y': np.zeros_like(pos_x, dtype=np.float32),
+        'accel_x': np.zeros_like(pos_x, dtype=np.float32),
+        'accel_y': np.zeros_like(pos_x, dtype=np.float32),
+        'lengths': np.full(num_frames, STEPS, dtype=np.int64),
+        'current_x': np.zeros(num_frames, dtype=np.float32),
+        'current_y': np.zeros(num_frames, dtype=np.float32),
+        'heading': np.zeros(num_frames, dtype=np.float32),
+        'intent': np.zeros(num_frames, dtype=np.int64),
+        'scenario': np.array(['Cruising'] * num_frames, dtype=object),
+    }
+
+def predictions(scene_ids, pos_x, pos_y, lengths=None):
+    pos_x = np.asarray(pos_x, dtype=np.float32)
+    lengths = np.full(len(pos_x), pos_x.shape[1]) if lengths is None else lengths
+    return {'scene_id': np.array(scene_ids, dtype=object), 'pos_x': pos_x,
+            'pos_y': np.asarray(pos_y, dtype=np.float32), 'lengths': np.asarray(lengths, dtype=np.int64)}
+
+def test_displacement_of_hand_built_trajectories():
+    truth = ground_truth(3)
+    gx = truth['pos_x'][0]
+    lag = 0.5 * np.arange(1, STEPS + 1)
+    result = evaluate_trajectories(predictions(
+        truth['scene_id'],
+        [gx, gx - lag, gx + 3.0],
+        [np.full(STEPS, 1.0), np.zeros(STEPS), np.full(STEPS, -4.0)],
+        lengths=[STEPS, STEPS, 4],
+    ), truth).set_index('scene_id')
+
+    # 1 m to the left at every step
+    left = result.loc['scene-0']
+    assert (left['horizon'], left['ade'], left['fde']) == (STEPS, pytest.approx(1.0), pytest.approx(1.0))
+    assert (left['lat_error'], left['long_error']) == (pytest.approx(1.0), pytest.approx(0.0))
+    assert left['final_lat_error'] == pytest.approx(1.0)
+
+    # Falling behind by 0.5 m per step: errors 0.5, 1.0, ..., 4.0
+    behind = result.loc['scene-1']
+    assert behind['ade'] == pytest.approx(lag.mean())
+    assert behind['fde'] == pytest.approx(4.0)
+    assert (behind['lat_error'], behind['long_error']) == (pytest.approx(0.0), pytest.approx(lag.mean()))
+    assert behind['final_long_error'] == pytest.approx(-4.0)
+
+    # 3 m ahead and 4 m to the right, 4 waypoints predicted: compared over those 4 only
+    short = result.loc['scene-2']
+    assert (short['horizon'], short['ade'], short['fde']) == (4, pytest.approx(5.0), pytest.approx(5.0))
+    assert (short['final_lat_error'], short['final_long_error']) == (pytest.approx(-4.0), pytest.approx(3.0))
+
+def test_perfect_prediction_reproduces_ground_truth_comfort():
+    rng = np.random.default_rng(0)
+    truth = ground_truth(5)
+    # Curved, accelerating paths, so the comfort peaks are not zero
+    truth['pos_x'] += rng.normal(0.0, 0.3, truth['pos_x'].shape).astype(np.float32)
+    truth['pos_y'] += np.cumsum(rng.normal(0.0, 0.2, truth['pos_y'].shape), axis=1).astype(np.float32)
+
+    result = evaluate_trajectories(predictions(truth['scene_id'], truth['pos_x'], truth['pos_y']), truth)
+    assert (result['ade'] == 0.0).all() and (result['fde'] == 0.0).all()
+    for name in COMFORT_METRICS:
+        np.testing.assert_array_equal(result[name], result['gt_' + name])
+        assert result[name].abs().max() > 0.0
+        # The recorded states (constant velocity here) are reported separately
+        np.testing.assert_array_equal(result['rec_' + name], 0.0)
+
+def test_frames_without_ground_truth_are_skipped(capsys):
+    truth = ground_truth(2)
+    prediction = predictions(['scene-1', 'unknown'], truth['pos_x'], truth['pos_y'])
+    result = evaluate_predictions(prediction, truth)
+    assert 'Warning: 1 predicted frames have no ground truth' in capsys.readouterr().out
+    assert result['per_frame']['scene_id'].tolist() == ['scene-1']
+    summary = result['by_scenario'].set_index('scenario')
+    assert summary.loc['ALL', 'frames'] == 1
+    assert summary.loc['ALL', 'miss_rate'] == 0.0